@@ -0,0 +1,35 @@
+"""add launchpad_to_github_work batch_uuid
+
+Revision ID: 3e8b5f0c6a21
+Revises: 7c1e4d2a9f03
+Create Date: 2026-10-19 14:03:27.514962
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8b5f0c6a21'
+down_revision: Union[str, None] = '7c1e4d2a9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "launchpad_to_github_work",
+        sa.Column("batch_uuid", sa.String(64), nullable=True),
+    )
+    op.create_index(
+        "ix_launchpad_to_github_work_batch_uuid",
+        "launchpad_to_github_work",
+        ["batch_uuid"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_launchpad_to_github_work_batch_uuid", "launchpad_to_github_work")
+    op.drop_column("launchpad_to_github_work", "batch_uuid")
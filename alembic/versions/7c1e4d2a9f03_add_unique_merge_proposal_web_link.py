@@ -0,0 +1,33 @@
+"""add unique merge_proposal web_link
+
+Revision ID: 7c1e4d2a9f03
+Revises: baf5839e8fee
+Create Date: 2026-10-19 09:12:41.208133
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4d2a9f03'
+down_revision: Union[str, None] = 'baf5839e8fee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Previous crawler runs could store the same MP more than once: keep the oldest row.
+    op.execute(
+        "DELETE FROM merge_proposal a USING merge_proposal b "
+        "WHERE a.web_link = b.web_link AND a.id > b.id"
+    )
+    op.create_unique_constraint(
+        "merge_proposal_web_link_key", "merge_proposal", ["web_link"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("merge_proposal_web_link_key", "merge_proposal")
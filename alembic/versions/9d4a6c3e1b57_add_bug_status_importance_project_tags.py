@@ -0,0 +1,34 @@
+"""add bug status, importance, project and tags
+
+Revision ID: 9d4a6c3e1b57
+Revises: 3e8b5f0c6a21
+Create Date: 2026-10-19 16:41:08.730215
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4a6c3e1b57'
+down_revision: Union[str, None] = '3e8b5f0c6a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in by the next crawl of each bug
+    op.add_column("bug", sa.Column("status", sa.String(64), nullable=True))
+    op.add_column("bug", sa.Column("importance", sa.String(64), nullable=True))
+    op.add_column("bug", sa.Column("project", sa.String(255), nullable=True))
+    op.add_column("bug", sa.Column("tags", postgresql.ARRAY(sa.Text), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("bug", "tags")
+    op.drop_column("bug", "project")
+    op.drop_column("bug", "importance")
+    op.drop_column("bug", "status")
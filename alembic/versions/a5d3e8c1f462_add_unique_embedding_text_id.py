@@ -0,0 +1,33 @@
+"""add unique embedding text_id
+
+Revision ID: a5d3e8c1f462
+Revises: e41c8d7f2a95
+Create Date: 2026-10-19 22:41:07.318524
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5d3e8c1f462'
+down_revision: Union[str, None] = 'e41c8d7f2a95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A text has one embedding: keep the most recent one if it was generated more than once.
+    op.execute(
+        "DELETE FROM embedding a USING embedding b "
+        "WHERE a.text_id = b.text_id AND a.id < b.id"
+    )
+    op.create_unique_constraint(
+        "embedding_text_id_key", "embedding", ["text_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("embedding_text_id_key", "embedding")
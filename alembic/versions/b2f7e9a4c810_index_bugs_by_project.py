@@ -0,0 +1,30 @@
+"""index bugs by project
+
+Revision ID: b2f7e9a4c810
+Revises: 9d4a6c3e1b57
+Create Date: 2026-10-19 18:02:51.403117
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2f7e9a4c810'
+down_revision: Union[str, None] = '9d4a6c3e1b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # All the bugs crawled so far come from the MAAS project
+    op.execute("UPDATE bug SET project = 'maas' WHERE project IS NULL")
+    op.alter_column("bug", "project", existing_type=sa.String(255), nullable=False)
+    op.create_index("ix_bug_project", "bug", ["project"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_bug_project", "bug")
+    op.alter_column("bug", "project", existing_type=sa.String(255), nullable=True)
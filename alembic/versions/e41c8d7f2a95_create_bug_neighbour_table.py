@@ -0,0 +1,37 @@
+"""create bug_neighbour table
+
+Revision ID: e41c8d7f2a95
+Revises: b2f7e9a4c810
+Create Date: 2026-10-19 19:27:14.862035
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41c8d7f2a95'
+down_revision: Union[str, None] = 'b2f7e9a4c810'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL: the neighbours of all the existing bugs are computed by the next refresh
+    op.add_column("bug", sa.Column("neighbours_updated", sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        "bug_neighbour",
+        sa.Column("bug_id", sa.Integer, sa.ForeignKey("bug.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("rank", sa.Integer, primary_key=True),
+        sa.Column("neighbour_id", sa.Integer, sa.ForeignKey("bug.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("score", sa.Float, nullable=False),
+    )
+    op.create_index("ix_bug_neighbour_neighbour_id", "bug_neighbour", ["neighbour_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_bug_neighbour_neighbour_id", "bug_neighbour")
+    op.drop_table("bug_neighbour")
+    op.drop_column("bug", "neighbours_updated")
@@ -16,6 +16,11 @@ setup(
         'console_scripts': [
             'spaghettihubtraining=spaghettihub.training.main:main',
             'spaghettihubmergeproposals=spaghettihub.training.merge_proposals:main',
+            'spaghettihubduplicates=spaghettihub.training.duplicates:main',
+            'spaghettihubneighbours=spaghettihub.training.neighbours:main',
+            'spaghettihubinsertbenchmark=spaghettihub.training.insert_benchmark:main',
+            'spaghettihubloadtest=spaghettihub.training.load_test:main',
+            'spaghettihubservicesbenchmark=spaghettihub.training.services_benchmark:main',
             'spaghettihubserver=spaghettihub.server.main:run',
             'spaghettihubworker=spaghettihub.worker.main:run'
         ],
@@ -0,0 +1,78 @@
+from collections import deque
+from typing import Deque, List
+
+from sqlalchemy import Sequence, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from spaghettihub.common.db.sequences import (BugCommentSequence,
+                                              EmbeddingSequence,
+                                              LaunchpadToGithubWorkSequence,
+                                              MergeProposalsSequence,
+                                              MyTextSequence, UsersSequence)
+
+DEFAULT_BLOCK_SIZE = 64
+
+
+class SequenceIdAllocator:
+    """
+    Hands out ids of a sequence from a local pool, reserving them from the database in blocks with a single
+    `SELECT nextval(...) FROM generate_series(1, n)` round trip.
+
+    Sequence values are never rolled back by postgres, so ids reserved by a transaction that is later rolled back are
+    simply lost (as they would be with a plain `nextval`). The ids are not guaranteed to be contiguous.
+    """
+
+    def __init__(self, sequence: Sequence, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.sequence = sequence
+        self.block_size = block_size
+        self._ids: Deque[int] = deque()
+
+    async def _reserve(self, connection: AsyncConnection, size: int) -> List[int]:
+        stmt = select(self.sequence.next_value()).select_from(
+            func.generate_series(1, size))
+        return list((await connection.execute(stmt)).scalars().all())
+
+    async def next_id(self, connection: AsyncConnection) -> int:
+        if not self._ids:
+            self._ids.extend(await self._reserve(connection, self.block_size))
+        return self._ids.popleft()
+
+    async def next_ids(self, connection: AsyncConnection, size: int) -> List[int]:
+        ids = [self._ids.popleft() for _ in range(min(size, len(self._ids)))]
+        missing = size - len(ids)
+        if missing > 0:
+            reserved = await self._reserve(connection, max(missing, self.block_size))
+            ids.extend(reserved[:missing])
+            self._ids.extend(reserved[missing:])
+        return ids
+
+    async def reserve_ids(self, connection: AsyncConnection, size: int) -> List[int]:
+        """
+        Reserve `size` new ids straight from the sequence, bypassing the local pool. Unlike `next_ids`, the statement is
+        always executed, so the transaction of `connection` has begun when it returns.
+        """
+        return await self._reserve(connection, size)
+
+    async def fill_ids(self, connection: AsyncConnection, ids: List[int | None]) -> List[int]:
+        """
+        Replace the `None`s in `ids` with newly allocated ids.
+        """
+        allocated = iter(await self.next_ids(connection, ids.count(None)))
+        return [next(allocated) if id is None else id for id in ids]
+
+
+def id_or_next_value(id: int | None, sequence: Sequence):
+    """
+    Use `id` if the caller allocated it, otherwise let the INSERT itself draw the id from `sequence` so that it can
+    be read back with RETURNING.
+    """
+    return sequence.next_value() if id is None else id
+
+
+MyTextIdAllocator = SequenceIdAllocator(MyTextSequence)
+BugCommentIdAllocator = SequenceIdAllocator(BugCommentSequence)
+EmbeddingIdAllocator = SequenceIdAllocator(EmbeddingSequence)
+MergeProposalsIdAllocator = SequenceIdAllocator(MergeProposalsSequence)
+LaunchpadToGithubWorkIdAllocator = SequenceIdAllocator(
+    LaunchpadToGithubWorkSequence)
+UsersIdAllocator = SequenceIdAllocator(UsersSequence)
@@ -1,11 +1,88 @@
-from dataclasses import dataclass
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
 
 from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncTransaction
+
+
+class LazyConnection:
+    """
+    Stand-in for an `AsyncConnection` that checks out a connection from the pool and begins the transaction only when
+    the first statement is executed, so that requests not touching the database do not hold a connection.
+    """
+
+    def __init__(self, engine: AsyncEngine, read_only: bool = False):
+        self.engine = engine
+        self.read_only = read_only
+        self._conn: AsyncConnection | None = None
+        self._transaction: AsyncTransaction | None = None
+
+    async def get_connection(self) -> AsyncConnection:
+        if self._conn is None:
+            conn = await self.engine.connect()
+            try:
+                if self.read_only:
+                    await conn.execution_options(isolation_level="READ COMMITTED", postgresql_readonly=True)
+                self._transaction = await conn.begin()
+            except BaseException:
+                await conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    async def execute(self, *args, **kwargs):
+        return await (await self.get_connection()).execute(*args, **kwargs)
+
+    async def close(self, commit: bool = True) -> None:
+        """
+        Commit (or rollback) the transaction, if any was started, and give the connection back to the pool. A
+        statement executed afterwards runs in a new transaction.
+        """
+        if self._conn is None:
+            return
+        conn, transaction = self._conn, self._transaction
+        self._conn, self._transaction = None, None
+        try:
+            if commit:
+                await transaction.commit()
+            else:
+                await transaction.rollback()
+        finally:
+            await conn.close()
 
 
-@dataclass
 class ConnectionProvider:
-    current_connection: Connection | None
+    """
+    Gives the repositories the connection of the current asyncio task (or thread), so that a single long-lived
+    provider, and the services using it, can be shared by concurrent requests.
+
+    The context variable is created once, with the class: all the providers of a task share its connection.
+    """
+
+    _current_connection: ContextVar[Connection | LazyConnection | None] = ContextVar(
+        "current_connection", default=None)
+
+    def __init__(self, current_connection: Connection | LazyConnection | None = None):
+        if current_connection is not None:
+            self._current_connection.set(current_connection)
+
+    @property
+    def current_connection(self) -> Connection | LazyConnection | None:
+        return self._current_connection.get()
+
+    @current_connection.setter
+    def current_connection(self, connection: Connection | LazyConnection | None) -> None:
+        self._current_connection.set(connection)
+
+    @contextmanager
+    def bind(self, connection: Connection | LazyConnection) -> Iterator[None]:
+        """Use `connection` within the block, restoring the previous one on exit."""
+        token = self._current_connection.set(connection)
+        try:
+            yield
+        finally:
+            self._current_connection.reset(token)
 
     def get_current_connection(self) -> Connection:
         return self.current_connection
@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import bindparam, delete, func, insert, select
+
+from spaghettihub.common.db.repository import BaseRepository
+from spaghettihub.common.db.tables import BugNeighbourTable
+from spaghettihub.common.models.base import ListResult
+from spaghettihub.common.models.bugs import BugNeighbour
+
+# Built once, with bind parameters: see spaghettihub.common.db.bugs
+INSERT_NEIGHBOURS = insert(BugNeighbourTable)
+
+FIND_NEIGHBOURS = (
+    select(BugNeighbourTable)
+    .where(BugNeighbourTable.c.bug_id == bindparam("bug_id"))
+    .order_by(BugNeighbourTable.c.rank)
+)
+
+FIND_THRESHOLDS = (
+    select(BugNeighbourTable.c.bug_id, func.min(BugNeighbourTable.c.score))
+    .group_by(BugNeighbourTable.c.bug_id)
+    .having(func.count() >= bindparam("size"))
+)
+
+FIND_BUGS_LISTING = (
+    select(BugNeighbourTable.c.bug_id)
+    .where(BugNeighbourTable.c.neighbour_id.in_(bindparam("neighbour_ids", expanding=True)))
+    .distinct()
+)
+
+DELETE_NEIGHBOURS = delete(BugNeighbourTable).where(
+    BugNeighbourTable.c.bug_id.in_(bindparam("bug_ids", expanding=True)))
+
+
+class BugNeighboursRepository(BaseRepository[BugNeighbour]):
+    async def get_next_id(self) -> int:
+        raise Exception("not implemented")
+
+    async def create(self, entity: BugNeighbour) -> BugNeighbour:
+        await self.connection_provider.get_current_connection().execute(INSERT_NEIGHBOURS, entity.dict())
+        return entity
+
+    async def find_by_id(self, id: int) -> Optional[BugNeighbour]:
+        raise Exception("not implemented")
+
+    async def find_by_bug_id(self, bug_id: int) -> List[BugNeighbour]:
+        """The neighbours of the bug, the most similar first."""
+        result = await self.connection_provider.get_current_connection().execute(FIND_NEIGHBOURS, {"bug_id": bug_id})
+        return [BugNeighbour(**row._asdict()) for row in result.all()]
+
+    async def find_thresholds(self, size: int) -> Dict[int, float]:
+        """
+        For every bug with `size` neighbours or more, the score of its least similar neighbour: the score another bug
+        must beat to become one of its neighbours.
+        """
+        result = await self.connection_provider.get_current_connection().execute(FIND_THRESHOLDS, {"size": size})
+        return {bug_id: score for bug_id, score in result.all()}
+
+    async def find_bugs_listing(self, neighbour_ids: Sequence[int]) -> List[int]:
+        """The ids of the bugs having one of `neighbour_ids` among their neighbours."""
+        if not neighbour_ids:
+            return []
+        result = await self.connection_provider.get_current_connection().execute(
+            FIND_BUGS_LISTING, {"neighbour_ids": list(neighbour_ids)}
+        )
+        return list(result.scalars().all())
+
+    async def replace_many(self, bug_ids: Sequence[int], entities: Sequence[BugNeighbour]) -> None:
+        """Replace the neighbours of the bugs `bug_ids` with `entities`."""
+        if not bug_ids:
+            return
+        connection = self.connection_provider.get_current_connection()
+        await connection.execute(DELETE_NEIGHBOURS, {"bug_ids": list(bug_ids)})
+        if entities:
+            await connection.execute(INSERT_NEIGHBOURS, [entity.dict() for entity in entities])
+
+    async def list(self, size: int, page: int) -> ListResult[BugNeighbour]:
+        pass
+
+    async def update(self, entity: BugNeighbour) -> BugNeighbour:
+        pass
+
+    async def delete(self, id: int) -> None:
+        """Delete the neighbours of the bug `id`."""
+        await self.connection_provider.get_current_connection().execute(DELETE_NEIGHBOURS, {"bug_ids": [id]})
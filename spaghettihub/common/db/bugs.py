@@ -1,48 +1,210 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
 
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import (CompoundSelect, bindparam, delete, func, insert,
+                        literal, select, union_all, update)
 from sqlalchemy.sql.operators import eq, or_
 
+from spaghettihub.common.db.allocator import BugCommentIdAllocator
 from spaghettihub.common.db.repository import BaseRepository
-from spaghettihub.common.db.sequences import BugCommentSequence
 from spaghettihub.common.db.tables import (BugCommentTable, BugTable,
                                            MyTextTable)
 from spaghettihub.common.models.base import ListResult, OneToOne
-from spaghettihub.common.models.bugs import Bug, BugComment
+from spaghettihub.common.models.bugs import (Bug, BugComment, BugCommentRow,
+                                             BugRow, BugTextKind)
 from spaghettihub.common.models.texts import MyText
 
 
+def bug_text_owners(project: str | None = None) -> CompoundSelect:
+    """
+    The (text_id, bug_id, kind) of the title, the description and the comments of the bugs of `project`, or of all the
+    bugs.
+    """
+    titles = select(BugTable.c.title_id.label("text_id"), BugTable.c.id.label("bug_id"),
+                    literal(BugTextKind.TITLE.value).label("kind"))
+    descriptions = select(BugTable.c.description_id, BugTable.c.id, literal(BugTextKind.DESCRIPTION.value))
+    comments = select(BugCommentTable.c.text_id, BugCommentTable.c.bug_id, literal(BugTextKind.COMMENT.value))
+    if project is not None:
+        titles = titles.where(BugTable.c.project == project)
+        descriptions = descriptions.where(BugTable.c.project == project)
+        comments = comments.join(BugTable, BugTable.c.id == BugCommentTable.c.bug_id).where(
+            BugTable.c.project == project)
+    return union_all(titles, descriptions, comments)
+
+
+# The statements of the repository are built once, with bind parameters: they are neither built again nor given a new
+# cache key on every call, and SQLAlchemy compiles each of them once per engine.
+INSERT_BUG = insert(BugTable).returning(
+    BugTable.c.id,
+    BugTable.c.date_created,
+    BugTable.c.date_last_updated,
+    BugTable.c.web_link,
+    BugTable.c.title_id,
+    BugTable.c.description_id,
+    BugTable.c.status,
+    BugTable.c.importance,
+    BugTable.c.project,
+    BugTable.c.tags,
+)
+
+FIND_BUG_BY_ID = select(BugTable).where(BugTable.c.id == bindparam("id"))
+
+DELETE_BUG = delete(BugTable).where(BugTable.c.id == bindparam("id"))
+
+INSERT_BUG_COMMENT = insert(BugCommentTable).returning(
+    BugCommentTable.c.id,
+    BugCommentTable.c.text_id,
+    BugCommentTable.c.bug_id,
+)
+
+INSERT_BUG_COMMENTS = insert(BugCommentTable)
+
+FIND_TEXT_OWNERS = bug_text_owners()
+
+FIND_PROJECT_TEXT_OWNERS = bug_text_owners(bindparam("project"))
+
+FIND_SEARCH_ATTRIBUTES = select(
+    BugTable.c.id,
+    BugTable.c.status,
+    BugTable.c.importance,
+    BugTable.c.project,
+    BugTable.c.tags,
+    BugTable.c.date_created,
+).select_from(BugTable)
+
+FIND_PROJECT_SEARCH_ATTRIBUTES = FIND_SEARCH_ATTRIBUTES.where(BugTable.c.project == bindparam("project"))
+
+_title_cte = (
+    select(
+        BugTable.c.id,
+        BugTable.c.title_id,
+        MyTextTable.c.content
+    )
+    .select_from(BugTable)
+    .join(
+        MyTextTable,
+        MyTextTable.c.id == BugTable.c.title_id,
+    )
+).cte("title_cte")
+
+_description_cte = (
+    select(
+        BugTable.c.id,
+        BugTable.c.description_id,
+        MyTextTable.c.content
+    )
+    .select_from(BugTable)
+    .join(
+        MyTextTable,
+        MyTextTable.c.id == BugTable.c.description_id,
+    )
+).cte("description_cte")
+
+FIND_BUG_BY_TEXT_ID = (
+    select(
+        BugTable.c.id,
+        BugTable.c.date_created,
+        BugTable.c.date_last_updated,
+        BugTable.c.web_link,
+        BugTable.c.title_id,
+        _title_cte.c.content.label("title_content"),
+        BugTable.c.description_id,
+        _description_cte.c.content.label("description_content"),
+        BugTable.c.status,
+        BugTable.c.importance,
+        BugTable.c.project,
+        BugTable.c.tags,
+    )
+    .select_from(BugTable)
+    .join(BugCommentTable,
+          BugCommentTable.c.bug_id == BugTable.c.id,
+          isouter=True)
+    .join(
+        _title_cte,
+        _title_cte.c.id == BugTable.c.id, isouter=True
+    )
+    .join(
+        _description_cte,
+        _description_cte.c.id == BugTable.c.id, isouter=True
+    )
+    .where(
+        (BugTable.c.title_id == bindparam("text_id")) |
+        (BugTable.c.description_id == bindparam("text_id")) |
+        (BugCommentTable.c.text_id == bindparam("text_id"))
+    )
+)
+
+# Sets the columns given as parameters, besides `bug_id`
+UPDATE_BUG = update(BugTable).where(BugTable.c.id == bindparam("bug_id"))
+
+DELETE_BUG_COMMENTS = delete(BugCommentTable).where(BugCommentTable.c.bug_id == bindparam("bug_id"))
+
+FIND_BUG_COMMENTS = (
+    select(
+        BugCommentTable.c.id,
+        BugCommentTable.c.text_id,
+        BugCommentTable.c.bug_id,
+        MyTextTable.c.content
+    )
+    .select_from(BugCommentTable)
+    .join(
+        MyTextTable,
+        MyTextTable.c.id == BugCommentTable.c.text_id
+    )
+    .where(BugCommentTable.c.bug_id == bindparam("bug_id"))
+)
+
+FIND_BUG_COMMENTS_BY_TEXT_IDS = FIND_BUG_COMMENTS.where(
+    BugCommentTable.c.text_id.in_(bindparam("text_ids", expanding=True)))
+
+# In the order they were posted
+FIND_BUG_COMMENTS_PAGE = (
+    FIND_BUG_COMMENTS
+    .order_by(BugCommentTable.c.id)
+    .offset(bindparam("offset"))
+    .limit(bindparam("limit"))
+)
+
+COUNT_BUG_COMMENTS = (
+    select(func.count())
+    .select_from(BugCommentTable)
+    .where(BugCommentTable.c.bug_id == bindparam("bug_id"))
+)
+
+FIND_STALE_NEIGHBOURS = select(BugTable.c.id).where(BugTable.c.neighbours_updated.is_(None))
+
+SET_NEIGHBOURS_UPDATED = (
+    update(BugTable)
+    .where(BugTable.c.id.in_(bindparam("ids", expanding=True)))
+    .values(neighbours_updated=bindparam("time"))
+)
+
+FIND_PROJECTS = select(BugTable.c.project).distinct().order_by(BugTable.c.project)
+
+
 class BugsRepository(BaseRepository[Bug]):
     async def get_next_id(self) -> int:
         raise Exception("not implemented")
 
     async def get_next_comment_id(self) -> int:
-        stmt = select(BugCommentSequence.next_value())
-        return (
-            await self.connection_provider.get_current_connection().execute(stmt)
-        ).scalar()
+        return await BugCommentIdAllocator.next_id(self.connection_provider.get_current_connection())
 
     async def create(self, entity: Bug) -> Bug:
-        stmt = (
-            insert(BugTable)
-            .returning(
-                BugTable.c.id,
-                BugTable.c.date_created,
-                BugTable.c.date_last_updated,
-                BugTable.c.web_link,
-                BugTable.c.title_id,
-                BugTable.c.description_id,
-            )
-            .values(
-                id=entity.id,
-                date_created=entity.date_created,
-                date_last_updated=entity.date_last_updated,
-                web_link=entity.web_link,
-                title_id=entity.title.id,
-                description_id=entity.description.id,
-            )
+        result = await self.connection_provider.get_current_connection().execute(
+            INSERT_BUG,
+            {
+                "id": entity.id,
+                "date_created": entity.date_created,
+                "date_last_updated": entity.date_last_updated,
+                "web_link": entity.web_link,
+                "title_id": entity.title.id,
+                "description_id": entity.description.id,
+                "status": entity.status,
+                "importance": entity.importance,
+                "project": entity.project,
+                "tags": entity.tags,
+            }
         )
-        result = await self.connection_provider.get_current_connection().execute(stmt)
         bug = result.one()
         return Bug(
             title=OneToOne[MyText](id=entity.title.id),
@@ -51,8 +213,7 @@ class BugsRepository(BaseRepository[Bug]):
         )
 
     async def find_by_id(self, id: int) -> Optional[Bug]:
-        stmt = select("*").select_from(BugTable).where(BugTable.c.id == id)
-        result = await self.connection_provider.get_current_connection().execute(stmt)
+        result = await self.connection_provider.get_current_connection().execute(FIND_BUG_BY_ID, {"id": id})
         bug = result.first()
         if not bug:
             return None
@@ -62,139 +223,133 @@ class BugsRepository(BaseRepository[Bug]):
             **bug._asdict()
         )
 
-    async def find_by_text_id(self, id: int) -> Optional[Bug]:
-        title_cte = (
-            select(
-                BugTable.c.id,
-                BugTable.c.title_id,
-                MyTextTable.c.content
-            )
-            .select_from(BugTable)
-            .join(
-                MyTextTable,
-                MyTextTable.c.id == BugTable.c.title_id,
-            )
-        ).cte("title_cte")
-
-        description_cte = (
-            select(
-                BugTable.c.id,
-                BugTable.c.description_id,
-                MyTextTable.c.content
-            )
-            .select_from(BugTable)
-            .join(
-                MyTextTable,
-                MyTextTable.c.id == BugTable.c.description_id,
-            )
-        ).cte("description_cte")
-
-        stmt = (select(
-            BugTable.c.id,
-            BugTable.c.date_created,
-            BugTable.c.date_last_updated,
-            BugTable.c.web_link,
-            BugTable.c.title_id,
-            title_cte.c.content.label("title_content"),
-            BugTable.c.description_id,
-            description_cte.c.content.label("description_content")
-        )
-            .select_from(BugTable)
-            .join(BugCommentTable,
-                  BugCommentTable.c.bug_id == BugTable.c.id,
-                  isouter=True)
-            .join(
-            title_cte,
-            title_cte.c.id == BugTable.c.id, isouter=True
-        )
-            .join(
-            description_cte,
-            description_cte.c.id == BugTable.c.id, isouter=True
-        )
-            .where(
-            (BugTable.c.title_id == id) |
-            (BugTable.c.description_id == id) |
-            (BugCommentTable.c.text_id == id)
-        )
-        )
-        result = await self.connection_provider.get_current_connection().execute(stmt)
+    async def find_by_text_id(self, id: int) -> Optional[BugRow]:
+        result = await self.connection_provider.get_current_connection().execute(FIND_BUG_BY_TEXT_ID, {"text_id": id})
         bug = result.first()
         if not bug:
             return None
-        return Bug(
-            title=OneToOne[MyText](id=bug.title_id, ref=MyText(
-                id=bug.title_id, content=bug.title_content)),
-            description=OneToOne[MyText](id=bug.description_id, ref=MyText(
-                id=bug.description_id, content=bug.description_content)),
-            **bug._asdict()
-        )
+        return BugRow._make(bug)
 
     async def list(self, size: int, page: int) -> ListResult[Bug]:
         pass
 
     async def update(self, entity: Bug) -> Bug:
-        stmt = (
-            update(BugTable)
-            .where(BugTable.c.id == entity.id)
-            .values(
-                title_id=entity.title.id,
-                description_id=entity.description.id,
-                date_last_updated=entity.date_last_updated,
-                web_link=entity.web_link
-            )
+        # The columns to set are the parameters other than the bug id
+        await self.connection_provider.get_current_connection().execute(
+            UPDATE_BUG,
+            {
+                "bug_id": entity.id,
+                "title_id": entity.title.id,
+                "description_id": entity.description.id,
+                "date_last_updated": entity.date_last_updated,
+                "web_link": entity.web_link,
+                "status": entity.status,
+                "importance": entity.importance,
+                "project": entity.project,
+                "tags": entity.tags,
+            }
         )
-        await self.connection_provider.get_current_connection().execute(stmt)
         return entity
 
     async def delete(self, id: int) -> None:
-        await self.connection_provider.get_current_connection().execute(
-            delete(BugTable).where(BugTable.c.id == id)
-        )
+        await self.connection_provider.get_current_connection().execute(DELETE_BUG, {"id": id})
 
     async def delete_comments(self, id: int) -> None:
         # embeddings and texts are cascaded
-        await self.connection_provider.get_current_connection().execute(
-            delete(BugCommentTable).where(BugCommentTable.c.bug_id == id)
-        )
+        await self.connection_provider.get_current_connection().execute(DELETE_BUG_COMMENTS, {"bug_id": id})
 
     async def add_comment(self, entity: BugComment) -> BugComment:
-        stmt = (
-            insert(BugCommentTable)
-            .returning(
-                BugCommentTable.c.id,
-                BugCommentTable.c.text_id,
-                BugCommentTable.c.bug_id,
-            )
-            .values(
-                id=entity.id,
-                text_id=entity.text.id,
-                bug_id=entity.bug.id,
-            )
+        connection = self.connection_provider.get_current_connection()
+        id = entity.id if entity.id is not None else await BugCommentIdAllocator.next_id(connection)
+        result = await connection.execute(
+            INSERT_BUG_COMMENT, {"id": id, "text_id": entity.text.id, "bug_id": entity.bug.id}
         )
-        await self.connection_provider.get_current_connection().execute(stmt)
-        return entity
+        bug_comment = result.one()
+        return BugComment(
+            id=bug_comment.id,
+            text=OneToOne[MyText](id=bug_comment.text_id),
+            bug=OneToOne[Bug](id=bug_comment.bug_id),
+        )
+
+    async def add_comments(self, entities: Sequence[BugCommentRow]) -> List[BugCommentRow]:
+        if not entities:
+            return []
+        connection = self.connection_provider.get_current_connection()
+        ids = await BugCommentIdAllocator.fill_ids(connection, [entity.id for entity in entities])
+        comments = [entity._replace(id=id) for id, entity in zip(ids, entities)]
+        await connection.execute(
+            INSERT_BUG_COMMENTS,
+            [{"id": comment.id, "text_id": comment.text_id, "bug_id": comment.bug_id} for comment in comments]
+        )
+        return comments
 
-    async def find_bug_comments(self, bug_id: int) -> List[BugComment]:
-        stmt = (select(
-            BugCommentTable.c.id,
-            BugCommentTable.c.text_id,
-            BugCommentTable.c.bug_id,
-            MyTextTable.c.content
+    async def find_text_owners(self, project: str | None = None) -> List[Tuple[int, int, BugTextKind]]:
+        """
+        The (text id, bug id, kind) of the title, the description and the comments of the bugs of `project`, or of
+        every bug.
+        """
+        if project is None:
+            result = await self.connection_provider.get_current_connection().execute(FIND_TEXT_OWNERS)
+        else:
+            result = await self.connection_provider.get_current_connection().execute(
+                FIND_PROJECT_TEXT_OWNERS, {"project": project}
+            )
+        return [(text_id, bug_id, BugTextKind(kind)) for text_id, bug_id, kind in result.all()]
+
+    async def find_stale_neighbours(self) -> List[int]:
+        """The ids of the bugs whose neighbours were never computed, or not since their texts changed."""
+        result = await self.connection_provider.get_current_connection().execute(FIND_STALE_NEIGHBOURS)
+        return list(result.scalars().all())
+
+    async def set_neighbours_updated(self, ids: Sequence[int], time: datetime | None) -> None:
+        if not ids:
+            return
+        await self.connection_provider.get_current_connection().execute(
+            SET_NEIGHBOURS_UPDATED, {"ids": list(ids), "time": time}
         )
-            .select_from(BugCommentTable)
-            .join(
-                MyTextTable,
-                MyTextTable.c.id == BugCommentTable.c.text_id
+
+    async def find_projects(self) -> List[str]:
+        result = await self.connection_provider.get_current_connection().execute(FIND_PROJECTS)
+        return list(result.scalars().all())
+
+    async def find_search_attributes(
+            self, project: str | None = None) -> List[Tuple[int, str | None, str | None, str, List[str] | None, datetime]]:
+        """
+        The (id, status, importance, project, tags, creation date) of the bugs of `project`, or of every bug: the
+        attributes a search can filter on.
+        """
+        if project is None:
+            result = await self.connection_provider.get_current_connection().execute(FIND_SEARCH_ATTRIBUTES)
+        else:
+            result = await self.connection_provider.get_current_connection().execute(
+                FIND_PROJECT_SEARCH_ATTRIBUTES, {"project": project}
+            )
+        return [tuple(row) for row in result.all()]
+
+    async def find_bug_comments(self, bug_id: int) -> List[BugCommentRow]:
+        result = await self.connection_provider.get_current_connection().execute(FIND_BUG_COMMENTS, {"bug_id": bug_id})
+        return [BugCommentRow._make(bug_comment) for bug_comment in result.all()]
+
+    async def find_bug_comments_by_text_ids(self, bug_id: int, text_ids: Sequence[int]) -> List[BugCommentRow]:
+        """The comments of the bug whose text is one of `text_ids`, in no particular order."""
+        if not text_ids:
+            return []
+        result = await self.connection_provider.get_current_connection().execute(
+            FIND_BUG_COMMENTS_BY_TEXT_IDS, {"bug_id": bug_id, "text_ids": list(text_ids)}
         )
-            .where(
-                BugCommentTable.c.bug_id == bug_id,
+        return [BugCommentRow._make(bug_comment) for bug_comment in result.all()]
+
+    async def count_bug_comments(self, bug_id: int) -> int:
+        result = await self.connection_provider.get_current_connection().execute(COUNT_BUG_COMMENTS, {"bug_id": bug_id})
+        return result.scalar()
+
+    async def find_bug_comments_page(self, bug_id: int, size: int, page: int) -> ListResult[BugCommentRow]:
+        """The `page`-th (from 1) `size` comments of the bug, in the order they were posted."""
+        total = await self.count_bug_comments(bug_id)
+        result = await self.connection_provider.get_current_connection().execute(
+            FIND_BUG_COMMENTS_PAGE, {"bug_id": bug_id, "offset": (page - 1) * size, "limit": size}
         )
+        return ListResult[BugCommentRow](
+            items=[BugCommentRow._make(bug_comment) for bug_comment in result.all()],
+            total=total
         )
-        result = await self.connection_provider.get_current_connection().execute(stmt)
-        return [BugComment(
-            text=OneToOne[MyText](id=bug_comment.text_id, ref=MyText(id=bug_comment.text_id,
-                                                                     content=bug_comment.content)),
-            bug=OneToOne[Bug](id=bug_comment.bug_id),
-            **bug_comment._asdict()
-        ) for bug_comment in result.all()
-        ]
@@ -1,23 +1,64 @@
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
-from sqlalchemy import Select, delete, desc, insert, select
+from sqlalchemy import Select, bindparam, delete, desc, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.sql.functions import count
 from sqlalchemy.sql.operators import eq
 
+from spaghettihub.common.db.allocator import (EmbeddingIdAllocator,
+                                              id_or_next_value)
+from spaghettihub.common.db.base import LazyConnection
+from spaghettihub.common.db.bugs import bug_text_owners
 from spaghettihub.common.db.repository import BaseRepository
 from spaghettihub.common.db.sequences import EmbeddingSequence
 from spaghettihub.common.db.tables import EmbeddingTable
 from spaghettihub.common.models.base import ListResult, OneToOne
-from spaghettihub.common.models.embeddings import Embedding
+from spaghettihub.common.models.embeddings import Embedding, EmbeddingRow
 from spaghettihub.common.models.texts import MyText
 
 
+# Built once, with bind parameters: see spaghettihub.common.db.bugs
+INSERT_EMBEDDINGS = insert(EmbeddingTable)
+
+# A text has one embedding: a new embedding of a text replaces the stored one. Only the ids are sent back, in the
+# order of the parameters, as the stored id of a replaced embedding is not the one allocated for it
+_upsert = pg_insert(EmbeddingTable)
+UPSERT_EMBEDDINGS = _upsert.on_conflict_do_update(
+    index_elements=[EmbeddingTable.c.text_id],
+    set_={"embedding": _upsert.excluded.embedding}
+).returning(EmbeddingTable.c.id, sort_by_parameter_order=True)
+
+FIND_EMBEDDING_BY_ID = select(EmbeddingTable).where(EmbeddingTable.c.id == bindparam("id"))
+
+COUNT_EMBEDDINGS = select(count()).select_from(EmbeddingTable)
+
+LIST_EMBEDDINGS = (
+    select(EmbeddingTable)
+    .order_by(desc(EmbeddingTable.c.id))
+    .offset(bindparam("offset"))
+    .limit(bindparam("limit"))
+)
+
+_project_owners = bug_text_owners(bindparam("project")).subquery()
+
+FIND_PROJECT_TEXT_IDS = (
+    select(EmbeddingTable.c.text_id)
+    .join(_project_owners, EmbeddingTable.c.text_id == _project_owners.c.text_id)
+)
+
+FIND_PROJECT_EMBEDDINGS = (
+    select(EmbeddingTable.c.text_id, EmbeddingTable.c.embedding)
+    .join(_project_owners, EmbeddingTable.c.text_id == _project_owners.c.text_id)
+)
+
+DELETE_EMBEDDING = delete(EmbeddingTable).where(EmbeddingTable.c.id == bindparam("id"))
+
+DELETE_EMBEDDINGS = delete(EmbeddingTable).where(EmbeddingTable.c.id.in_(bindparam("ids", expanding=True)))
+
+
 class EmbeddingsRepository(BaseRepository[Embedding]):
     async def get_next_id(self) -> int:
-        stmt = select(EmbeddingSequence.next_value())
-        return (
-            await self.connection_provider.get_current_connection().execute(stmt)
-        ).scalar()
+        return await EmbeddingIdAllocator.next_id(self.connection_provider.get_current_connection())
 
     async def create(self, entity: Embedding) -> Embedding:
         stmt = (
@@ -27,7 +68,7 @@ class EmbeddingsRepository(BaseRepository[Embedding]):
                 EmbeddingTable.c.text_id,
                 EmbeddingTable.c.embedding,
             )
-            .values(id=entity.id, text_id=entity.text.id, embedding=entity.embedding)
+            .values(id=id_or_next_value(entity.id, EmbeddingSequence), text_id=entity.text.id, embedding=entity.embedding)
         )
         result = await self.connection_provider.get_current_connection().execute(stmt)
         embedding = result.one()
@@ -36,10 +77,54 @@ class EmbeddingsRepository(BaseRepository[Embedding]):
             **embedding._asdict()
         )
 
+    async def _fill_ids(self, entities: Sequence[EmbeddingRow]) -> List[EmbeddingRow]:
+        ids = await EmbeddingIdAllocator.fill_ids(
+            self.connection_provider.get_current_connection(), [entity.id for entity in entities])
+        return [entity._replace(id=id) for id, entity in zip(ids, entities)]
+
+    async def create_many(self, entities: Sequence[EmbeddingRow]) -> List[EmbeddingRow]:
+        # The vectors are not sent back with RETURNING: the ids are allocated upfront instead.
+        if not entities:
+            return []
+        embeddings = await self._fill_ids(entities)
+        await self.connection_provider.get_current_connection().execute(
+            INSERT_EMBEDDINGS, [embedding._asdict() for embedding in embeddings]
+        )
+        return embeddings
+
+    async def copy_many(self, entities: Sequence[EmbeddingRow]) -> List[EmbeddingRow]:
+        """
+        Same as `create_many`, with a binary COPY instead of an INSERT: the fastest way to load many vectors. The COPY
+        runs on the driver connection, in the transaction of the current connection.
+        """
+        if not entities:
+            return []
+        connection = self.connection_provider.get_current_connection()
+        if isinstance(connection, LazyConnection):
+            connection = await connection.get_connection()
+        # The COPY is not executed by SQLAlchemy, which begins the transaction with the first statement it executes:
+        # reserving the ids with a statement makes sure it has begun
+        reserved = iter(await EmbeddingIdAllocator.reserve_ids(
+            connection, sum(entity.id is None for entity in entities)))
+        embeddings = [entity._replace(id=next(reserved)) if entity.id is None else entity for entity in entities]
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            EmbeddingTable.name, records=embeddings, columns=list(EmbeddingRow._fields)
+        )
+        return embeddings
+
+    async def upsert_many(self, entities: Sequence[EmbeddingRow]) -> List[EmbeddingRow]:
+        """Store the embeddings, replacing the stored embeddings of the same texts."""
+        if not entities:
+            return []
+        embeddings = await self._fill_ids(entities)
+        result = await self.connection_provider.get_current_connection().execute(
+            UPSERT_EMBEDDINGS, [embedding._asdict() for embedding in embeddings]
+        )
+        return [embedding._replace(id=id) for embedding, id in zip(embeddings, result.scalars().all())]
+
     async def find_by_id(self, id: int) -> Optional[Embedding]:
-        stmt = select(
-            "*").select_from(EmbeddingTable).where(EmbeddingTable.c.id == id)
-        result = await self.connection_provider.get_current_connection().execute(stmt)
+        result = await self.connection_provider.get_current_connection().execute(FIND_EMBEDDING_BY_ID, {"id": id})
         embedding = result.first()
         if not embedding:
             return None
@@ -49,18 +134,10 @@ class EmbeddingsRepository(BaseRepository[Embedding]):
         )
 
     async def list(self, size: int, page: int) -> ListResult[Embedding]:
-        total_stmt = select(count()).select_from(EmbeddingTable)
-        total = (await self.connection_provider.get_current_connection().execute(total_stmt)).scalar()
-
-        stmt = (
-            select("*")
-            .select_from(EmbeddingTable)
-            .order_by(desc(EmbeddingTable.c.id))
-            .offset((page - 1) * size)
-            .limit(size)
+        total = (await self.connection_provider.get_current_connection().execute(COUNT_EMBEDDINGS)).scalar()
+        result = await self.connection_provider.get_current_connection().execute(
+            LIST_EMBEDDINGS, {"offset": (page - 1) * size, "limit": size}
         )
-
-        result = await self.connection_provider.get_current_connection().execute(stmt)
         return ListResult[Embedding](
             items=[
                 Embedding(
@@ -72,10 +149,33 @@ class EmbeddingsRepository(BaseRepository[Embedding]):
             total=total
         )
 
+    async def find_text_ids(self, project: str) -> List[int]:
+        """The ids of the titles, descriptions and comments of the bugs of `project` having an embedding."""
+        result = await self.connection_provider.get_current_connection().execute(
+            FIND_PROJECT_TEXT_IDS, {"project": project}
+        )
+        return list(result.scalars().all())
+
+    async def stream_by_project(
+        self, project: str, batch_size: int
+    ) -> AsyncIterator[Sequence[Tuple[int, bytes]]]:
+        """
+        The (text id, embedding) of the titles, descriptions and comments of the bugs of `project`, `batch_size` rows
+        at a time. The rows are read through a server-side cursor: only one batch is in memory at once.
+        """
+        result = await self.connection_provider.get_current_connection().stream(
+            FIND_PROJECT_EMBEDDINGS, {"project": project}, execution_options={"yield_per": batch_size}
+        )
+        async for rows in result.partitions():
+            yield rows
+
     async def update(self, entity: Embedding) -> Embedding:
         pass
 
     async def delete(self, id: int) -> None:
-        await self.connection_provider.get_current_connection().execute(
-            delete(EmbeddingTable).where(EmbeddingTable.c.id == id)
-        )
+        await self.connection_provider.get_current_connection().execute(DELETE_EMBEDDING, {"id": id})
+
+    async def delete_many(self, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        await self.connection_provider.get_current_connection().execute(DELETE_EMBEDDINGS, {"ids": list(ids)})
@@ -1,8 +1,12 @@
-from typing import List, Optional
+import json
+from typing import List, Optional, Sequence
 
 from sqlalchemy import delete, insert, select, update
 from sqlalchemy.sql.operators import eq, or_
 
+from spaghettihub.common.db.allocator import (
+    LaunchpadToGithubWorkIdAllocator, id_or_next_value)
+from spaghettihub.common.db.notifications import notify
 from spaghettihub.common.db.repository import BaseRepository
 from spaghettihub.common.db.sequences import (BugCommentSequence,
                                               LaunchpadToGithubWorkSequence)
@@ -14,13 +18,19 @@ from spaghettihub.common.models.bugs import Bug, BugComment
 from spaghettihub.common.models.github import LaunchpadToGithubWork
 from spaghettihub.common.models.texts import MyText
 
+# Channel on which the status changes of the requests are notified
+LAUNCHPAD_TO_GITHUB_WORK_CHANNEL = "launchpad_to_github_work"
+
+
+def launchpad_to_github_work_notification_keys(payload: str) -> List[str]:
+    """The request, and the batch if any, a notification is about."""
+    event = json.loads(payload)
+    return [key for key in (event["request_uuid"], event["batch_uuid"]) if key]
+
 
 class LaunchpadToGithubWorkRepository(BaseRepository[LaunchpadToGithubWork]):
     async def get_next_id(self) -> int:
-        stmt = select(LaunchpadToGithubWorkSequence.next_value())
-        return (
-            await self.connection_provider.get_current_connection().execute(stmt)
-        ).scalar()
+        return await LaunchpadToGithubWorkIdAllocator.next_id(self.connection_provider.get_current_connection())
 
     async def create(self, entity: LaunchpadToGithubWork) -> LaunchpadToGithubWork:
         stmt = (
@@ -34,22 +44,34 @@ class LaunchpadToGithubWorkRepository(BaseRepository[LaunchpadToGithubWork]):
                 LaunchpadToGithubWorkTable.c.status,
                 LaunchpadToGithubWorkTable.c.github_url,
                 LaunchpadToGithubWorkTable.c.launchpad_url,
+                LaunchpadToGithubWorkTable.c.batch_uuid,
             )
             .values(
-                id=entity.id,
+                id=id_or_next_value(entity.id, LaunchpadToGithubWorkSequence),
                 requested_at=entity.requested_at,
                 updated_at=entity.updated_at,
                 completed_at=entity.completed_at,
                 request_uuid=entity.request_uuid,
                 status=entity.status,
                 github_url=entity.github_url,
-                launchpad_url=entity.launchpad_url
+                launchpad_url=entity.launchpad_url,
+                batch_uuid=entity.batch_uuid
             )
         )
         result = await self.connection_provider.get_current_connection().execute(stmt)
         row = result.one()
         return LaunchpadToGithubWork(**row._asdict())
 
+    async def create_many(self, entities: Sequence[LaunchpadToGithubWork]) -> List[LaunchpadToGithubWork]:
+        if not entities:
+            return []
+        connection = self.connection_provider.get_current_connection()
+        ids = await LaunchpadToGithubWorkIdAllocator.fill_ids(connection, [entity.id for entity in entities])
+        works = [entity.copy(update={"id": id})
+                 for id, entity in zip(ids, entities)]
+        await connection.execute(insert(LaunchpadToGithubWorkTable), [work.dict() for work in works])
+        return works
+
     async def find_by_id(self, id: int) -> Optional[LaunchpadToGithubWork]:
         stmt = select(
             "*").select_from(LaunchpadToGithubWorkTable).where(LaunchpadToGithubWorkTable.c.id == id)
@@ -68,6 +90,16 @@ class LaunchpadToGithubWorkRepository(BaseRepository[LaunchpadToGithubWork]):
             return None
         return LaunchpadToGithubWork(**work._asdict())
 
+    async def find_by_batch_uuid(self, batch_uuid: str) -> List[LaunchpadToGithubWork]:
+        stmt = (
+            select("*")
+            .select_from(LaunchpadToGithubWorkTable)
+            .where(LaunchpadToGithubWorkTable.c.batch_uuid == batch_uuid)
+            .order_by(LaunchpadToGithubWorkTable.c.id)
+        )
+        result = await self.connection_provider.get_current_connection().execute(stmt)
+        return [LaunchpadToGithubWork(**row._asdict()) for row in result.all()]
+
     async def list(self, size: int, page: int) -> ListResult[LaunchpadToGithubWork]:
         pass
 
@@ -80,6 +112,13 @@ class LaunchpadToGithubWorkRepository(BaseRepository[LaunchpadToGithubWork]):
         await self.connection_provider.get_current_connection().execute(stmt)
         return entity
 
+    async def notify(self, entity: LaunchpadToGithubWork) -> None:
+        await notify(
+            self.connection_provider.get_current_connection(),
+            LAUNCHPAD_TO_GITHUB_WORK_CHANNEL,
+            entity.json(include={"request_uuid", "batch_uuid", "status", "github_url"})
+        )
+
     async def delete(self, id: str) -> None:
         await self.connection_provider.get_current_connection().execute(
             delete(LaunchpadToGithubWorkTable).where(
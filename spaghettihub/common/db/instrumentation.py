@@ -0,0 +1,67 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+_COMPILE_START = "spaghettihub_compile_start"
+_EXECUTE_START = "spaghettihub_execute_start"
+
+
+@dataclass
+class StatementTimings:
+    """The number of executions of a statement, and the time spent compiling and executing it, in seconds."""
+    executions: int = 0
+    # Times the compiled form was not found in the cache of the engine
+    compilations: int = 0
+    compile_time: float = 0.0
+    execute_time: float = 0.0
+
+
+@dataclass
+class QueryProfiler:
+    """
+    Times every statement executed by an engine, split in:
+
+    - the compile time, from the execution of the statement to its cursor execution: the generation of its cache key,
+      the lookup of its compiled form and its compilation on a cache miss, and the processing of its parameters;
+    - the execute time, the round trip to the database.
+
+    The timings are logged and summed per SQL string in `timings`.
+    """
+    timings: Dict[str, StatementTimings] = field(default_factory=dict)
+
+    def attach(self, engine: AsyncEngine | Engine) -> None:
+        sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        event.listen(sync_engine, "before_execute", self._before_execute)
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_execute(self, conn, clauseelement, multiparams, params, execution_options):
+        conn.info[_COMPILE_START] = time.perf_counter()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info[_EXECUTE_START] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        end = time.perf_counter()
+        execute_start = conn.info.pop(_EXECUTE_START, end)
+        # exec_driver_sql and the statements of the dialect are not compiled
+        compile_start = conn.info.pop(_COMPILE_START, execute_start)
+        cache_miss = context is not None and context.cache_hit is CacheStats.CACHE_MISS
+
+        timings = self.timings.setdefault(statement, StatementTimings())
+        timings.executions += 1
+        timings.compilations += cache_miss
+        timings.compile_time += execute_start - compile_start
+        timings.execute_time += end - execute_start
+        logger.info(
+            f"compile {(execute_start - compile_start) * 1000:.3f} ms{' (cache miss)' if cache_miss else ''}, "
+            f"execute {(end - execute_start) * 1000:.3f} ms: {' '.join(statement.split())[:200]}"
+        )
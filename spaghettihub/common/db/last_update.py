@@ -1,6 +1,6 @@
 from typing import Optional
 
-from sqlalchemy import delete, insert, select
+from sqlalchemy import delete, insert, select, update
 
 from spaghettihub.common.db.repository import BaseRepository
 from spaghettihub.common.db.tables import LastUpdateTable
@@ -36,7 +36,13 @@ class LastUpdateRepository(BaseRepository[LastUpdate]):
         pass
 
     async def update(self, entity: LastUpdate) -> LastUpdate:
-        pass
+        stmt = (
+            update(LastUpdateTable)
+            .where(LastUpdateTable.c.id == entity.id)
+            .values(last_updated=entity.last_updated)
+        )
+        await self.connection_provider.get_current_connection().execute(stmt)
+        return entity
 
     async def delete(self, id: int) -> None:
         await self.connection_provider.get_current_connection().execute(
@@ -1,9 +1,12 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 from sqlalchemy import Select, delete, desc, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.sql.functions import count
 from sqlalchemy.sql.operators import eq
 
+from spaghettihub.common.db.allocator import (MergeProposalsIdAllocator,
+                                              id_or_next_value)
 from spaghettihub.common.db.repository import BaseRepository
 from spaghettihub.common.db.sequences import (MergeProposalsSequence,
                                               MyTextSequence)
@@ -13,13 +16,21 @@ from spaghettihub.common.models.base import ListResult
 from spaghettihub.common.models.merge_proposals import MergeProposal
 from spaghettihub.common.models.texts import MyText
 
+# The stored id of an updated merge proposal is not the one allocated for it: the ids are sent back, in the order of
+# the parameters
+_upsert = pg_insert(MergeProposalTable)
+UPSERT_MERGE_PROPOSALS = _upsert.on_conflict_do_update(
+    index_elements=[MergeProposalTable.c.web_link],
+    set_={
+        column.name: _upsert.excluded[column.name]
+        for column in MergeProposalTable.c if column.name not in ("id", "web_link")
+    }
+).returning(MergeProposalTable.c.id, sort_by_parameter_order=True)
+
 
 class MergeProposalsRepository(BaseRepository[MergeProposal]):
     async def get_next_id(self) -> int:
-        stmt = select(MergeProposalsSequence.next_value())
-        return (
-            await self.connection_provider.get_current_connection().execute(stmt)
-        ).scalar()
+        return await MergeProposalsIdAllocator.next_id(self.connection_provider.get_current_connection())
 
     async def create(self, entity: MergeProposal) -> MergeProposal:
         stmt = (
@@ -34,7 +45,7 @@ class MergeProposalsRepository(BaseRepository[MergeProposal]):
                 MergeProposalTable.c.web_link,
             )
             .values(
-                id=entity.id,
+                id=id_or_next_value(entity.id, MergeProposalsSequence),
                 commit_message=entity.commit_message,
                 date_merged=entity.date_merged,
                 source_git_path=entity.source_git_path,
@@ -47,6 +58,48 @@ class MergeProposalsRepository(BaseRepository[MergeProposal]):
         text = result.one()
         return MergeProposal(**text._asdict())
 
+    async def _fill_ids(self, entities: Sequence[MergeProposal]) -> List[MergeProposal]:
+        ids = await MergeProposalsIdAllocator.fill_ids(
+            self.connection_provider.get_current_connection(), [entity.id for entity in entities])
+        return [entity.copy(update={"id": id}) for id, entity in zip(ids, entities)]
+
+    async def create_many(self, entities: Sequence[MergeProposal]) -> List[MergeProposal]:
+        if not entities:
+            return []
+        merge_proposals = await self._fill_ids(entities)
+        await self.connection_provider.get_current_connection().execute(
+            insert(MergeProposalTable), [
+                merge_proposal.dict() for merge_proposal in merge_proposals]
+        )
+        return merge_proposals
+
+    async def upsert_many(self, entities: Sequence[MergeProposal]) -> List[MergeProposal]:
+        """Store the merge proposals, updating the stored ones with the same `web_link`."""
+        if not entities:
+            return []
+        merge_proposals = await self._fill_ids(entities)
+        result = await self.connection_provider.get_current_connection().execute(
+            UPSERT_MERGE_PROPOSALS, [merge_proposal.dict() for merge_proposal in merge_proposals]
+        )
+        return [
+            merge_proposal.copy(update={"id": id})
+            for merge_proposal, id in zip(merge_proposals, result.scalars().all())
+        ]
+
+    async def create_many_ignore_existing(self, entities: Sequence[MergeProposal]) -> None:
+        """
+        Insert the merge proposals, skipping the ones whose `web_link` is already stored.
+        """
+        if not entities:
+            return
+        merge_proposals = await self._fill_ids(entities)
+        stmt = pg_insert(MergeProposalTable).on_conflict_do_nothing(
+            index_elements=[MergeProposalTable.c.web_link]
+        )
+        await self.connection_provider.get_current_connection().execute(
+            stmt, [merge_proposal.dict() for merge_proposal in merge_proposals]
+        )
+
     async def find_by_id(self, id: int) -> Optional[MergeProposal]:
         stmt = select(
             "*").select_from(MergeProposalTable).where(MergeProposalTable.c.id == id)
@@ -90,3 +143,10 @@ class MergeProposalsRepository(BaseRepository[MergeProposal]):
         await self.connection_provider.get_current_connection().execute(
             delete(MergeProposalTable).where(MergeProposalTable.c.id == id)
         )
+
+    async def delete_many(self, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        await self.connection_provider.get_current_connection().execute(
+            delete(MergeProposalTable).where(MergeProposalTable.c.id.in_(ids))
+        )
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+
+async def notify(connection: AsyncConnection, channel: str, payload: str) -> None:
+    """Send `payload` on `channel`. As for every NOTIFY, it is delivered only when the transaction commits."""
+    await connection.execute(select(func.pg_notify(channel, payload)))
+
+
+class Subscription:
+    """Queue of the payloads received for a key, until `close` is called."""
+
+    def __init__(self, listener: "NotificationListener", key: str):
+        self.listener = listener
+        self.key = key
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+
+    async def get(self, timeout: float) -> str | None:
+        """Wait for the next payload, returning None if none arrives within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.listener.unsubscribe(self)
+
+
+class NotificationListener:
+    """
+    Dispatches the notifications of a Postgres channel to the subscribers of this process. A single connection
+    listens on the channel, however many subscribers are waiting; `keys` tells which subscribers a payload is for.
+    """
+
+    def __init__(self, engine: AsyncEngine, channel: str, keys: Callable[[str], Iterable[str]]):
+        self.engine = engine
+        self.channel = channel
+        self.keys = keys
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._connection: AsyncConnection | None = None
+        self._driver_connection = None
+        self._lock = asyncio.Lock()
+
+    def _dispatch(self, driver_connection, pid: int, channel: str, payload: str) -> None:
+        for key in self.keys(payload):
+            for subscription in self._subscriptions.get(key, ()):
+                subscription.queue.put_nowait(payload)
+
+    async def _listen(self) -> None:
+        async with self._lock:
+            if self._driver_connection is not None and not self._driver_connection.is_closed():
+                return
+            # The previous connection was lost: the notifications sent in the meantime are lost as well
+            await self._release()
+            connection = await self.engine.connect()
+            try:
+                raw_connection = await connection.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                await driver_connection.add_listener(self.channel, self._dispatch)
+            except BaseException:
+                await connection.close()
+                raise
+            self._connection, self._driver_connection = connection, driver_connection
+
+    async def subscribe(self, key: str) -> Subscription:
+        """
+        Start receiving the payloads for `key`. Subscribe before reading the current state from the database, so
+        that no change is missed in between.
+        """
+        subscription = Subscription(self, key)
+        self._subscriptions.setdefault(key, set()).add(subscription)
+        try:
+            await self._listen()
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.key)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.key]
+
+    async def _release(self) -> None:
+        if self._connection is None:
+            return
+        connection = self._connection
+        self._connection, self._driver_connection = None, None
+        try:
+            # Do not give a connection with a listener back to the pool
+            await connection.invalidate()
+        except Exception:
+            logger.exception(f"Could not release the connection listening on {self.channel}")
+        finally:
+            await connection.close()
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._release()
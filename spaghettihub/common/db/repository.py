@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Generic, Optional, TypeVar
+from typing import Generic, List, Optional, Sequence, TypeVar
 
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.models.base import ListResult
@@ -19,6 +19,27 @@ class BaseRepository(ABC, Generic[T]):
     async def create(self, entity: T) -> T:
         pass
 
+    async def create_many(self, entities: Sequence[T]) -> List[T]:
+        """
+        Create all the entities, returning them in the same order. Repositories on bulk paths override this with a
+        single multi-row INSERT.
+        """
+        return [await self.create(entity) for entity in entities]
+
+    async def upsert_many(self, entities: Sequence[T]) -> List[T]:
+        """
+        Update the entities already stored with the same id and create the others, returning them in the same order.
+        Repositories whose entities have a natural key (i.e. the web link of a merge proposal) override this with a
+        single `INSERT ... ON CONFLICT` on that key.
+        """
+        upserted = []
+        for entity in entities:
+            if entity.id is not None and await self.find_by_id(entity.id) is not None:
+                upserted.append(await self.update(entity))
+            else:
+                upserted.append(await self.create(entity))
+        return upserted
+
     @abstractmethod
     async def find_by_id(self, id: int) -> Optional[T]:
         pass
@@ -36,3 +57,10 @@ class BaseRepository(ABC, Generic[T]):
         """
         If no resource with such `id` is found, silently ignore it and return `None` in any case.
         """
+
+    async def delete_many(self, ids: Sequence[int]) -> None:
+        """
+        Same as `delete`, for all the `ids`.
+        """
+        for id in ids:
+            await self.delete(id)
@@ -1,5 +1,6 @@
-from sqlalchemy import (Column, DateTime, ForeignKey, Integer, LargeBinary,
-                        MetaData, String, Table, Text)
+from sqlalchemy import (Column, DateTime, Float, ForeignKey, Integer,
+                        LargeBinary, MetaData, String, Table, Text)
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from spaghettihub.common.db.sequences import (BugCommentSequence,
                                               EmbeddingSequence,
@@ -20,7 +21,7 @@ EmbeddingTable = Table(
     "embedding",
     METADATA,
     Column("id", Integer, EmbeddingSequence, primary_key=True),
-    Column("text_id", Integer, ForeignKey("text.id", ondelete="CASCADE")),
+    Column("text_id", Integer, ForeignKey("text.id", ondelete="CASCADE"), unique=True),
     Column("embedding", LargeBinary, nullable=False),
 )
 
@@ -34,6 +35,25 @@ BugTable = Table(
     Column("title_id", Integer, ForeignKey("text.id", ondelete="CASCADE")),
     Column("description_id", Integer, ForeignKey(
         "text.id", ondelete="CASCADE")),
+    # The status and importance of the Launchpad bug task
+    Column("status", String(64), nullable=True),
+    Column("importance", String(64), nullable=True),
+    # The Launchpad project the bug was crawled from. The bugs of every project are indexed separately.
+    Column("project", String(255), nullable=False, index=True),
+    Column("tags", ARRAY(Text), nullable=True),
+    # When the neighbours of the bug were computed, NULL once its texts change
+    Column("neighbours_updated", DateTime(timezone=True), nullable=True),
+)
+
+# The most similar bugs of every bug
+BugNeighbourTable = Table(
+    "bug_neighbour",
+    METADATA,
+    Column("bug_id", Integer, ForeignKey("bug.id", ondelete="CASCADE"), primary_key=True),
+    # 0 for the most similar bug
+    Column("rank", Integer, primary_key=True),
+    Column("neighbour_id", Integer, ForeignKey("bug.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("score", Float, nullable=False),
 )
 
 BugCommentTable = Table(
@@ -60,7 +80,7 @@ MergeProposalTable = Table(
     Column("source_git_path", Text, nullable=True),
     Column("target_git_path", Text, nullable=True),
     Column("registrant_name", Text, nullable=False),
-    Column("web_link", Text, nullable=False),
+    Column("web_link", Text, nullable=False, unique=True),
 )
 
 LaunchpadToGithubWorkTable = Table(
@@ -74,6 +94,8 @@ LaunchpadToGithubWorkTable = Table(
     Column("status", String(64), nullable=False),
     Column("github_url", Text, nullable=True),
     Column("launchpad_url", Text, nullable=True),
+    # Set on the requests submitted together through the batch endpoint
+    Column("batch_uuid", String(64), nullable=True, index=True),
 )
 
 UserTable = Table(
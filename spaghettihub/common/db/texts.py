@@ -1,62 +1,102 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
-from sqlalchemy import delete, insert, select
+from sqlalchemy import bindparam, delete, insert, select, update
 from sqlalchemy.sql.operators import eq
 
+from spaghettihub.common.db.allocator import (MyTextIdAllocator,
+                                              id_or_next_value)
+from spaghettihub.common.db.bugs import bug_text_owners
 from spaghettihub.common.db.repository import BaseRepository
 from spaghettihub.common.db.sequences import MyTextSequence
 from spaghettihub.common.db.tables import EmbeddingTable, MyTextTable
 from spaghettihub.common.models.base import ListResult
-from spaghettihub.common.models.texts import MyText
+from spaghettihub.common.models.texts import MyText, TextRow
+
+
+# Built once, with bind parameters: see spaghettihub.common.db.bugs
+INSERT_TEXTS = insert(MyTextTable)
+
+FIND_TEXT_BY_ID = select(MyTextTable).where(MyTextTable.c.id == bindparam("id"))
+
+UPDATE_TEXT = update(MyTextTable).where(MyTextTable.c.id == bindparam("text_id"))
+
+_project_owners = bug_text_owners(bindparam("project")).subquery()
+
+FIND_PROJECT_TEXTS = (
+    select(MyTextTable.c.id, MyTextTable.c.content)
+    .join(_project_owners, MyTextTable.c.id == _project_owners.c.text_id)
+)
+
+DELETE_TEXT = delete(MyTextTable).where(MyTextTable.c.id == bindparam("id"))
+
+DELETE_TEXTS = delete(MyTextTable).where(MyTextTable.c.id.in_(bindparam("ids", expanding=True)))
+
+FIND_TEXTS_WITHOUT_EMBEDDINGS = (
+    select(MyTextTable.c.id, MyTextTable.c.content)
+    .select_from(MyTextTable)
+    .join(
+        EmbeddingTable,
+        eq(EmbeddingTable.c.text_id, MyTextTable.c.id),
+        isouter=True,
+    )
+    .where(eq(EmbeddingTable.c.text_id, None))
+)
 
 
 class TextsRepository(BaseRepository[MyText]):
     async def get_next_id(self) -> int:
-        stmt = select(MyTextSequence.next_value())
-        return (
-            await self.connection_provider.get_current_connection().execute(stmt)
-        ).scalar()
+        return await MyTextIdAllocator.next_id(self.connection_provider.get_current_connection())
 
     async def create(self, entity: MyText) -> MyText:
         stmt = (
             insert(MyTextTable)
             .returning(MyTextTable.c.id, MyTextTable.c.content)
-            .values(id=entity.id, content=entity.content)
+            .values(id=id_or_next_value(entity.id, MyTextSequence), content=entity.content)
         )
         result = await self.connection_provider.get_current_connection().execute(stmt)
         text = result.one()
         return MyText(**text._asdict())
 
+    async def create_many(self, entities: Sequence[MyText | TextRow]) -> List[TextRow]:
+        if not entities:
+            return []
+        connection = self.connection_provider.get_current_connection()
+        ids = await MyTextIdAllocator.fill_ids(connection, [entity.id for entity in entities])
+        texts = [TextRow(id, entity.content) for id, entity in zip(ids, entities)]
+        await connection.execute(INSERT_TEXTS, [text._asdict() for text in texts])
+        return texts
+
     async def find_by_id(self, id: int) -> Optional[MyText]:
-        stmt = select(
-            "*").select_from(MyTextTable).where(MyTextTable.c.id == id)
-        result = await self.connection_provider.get_current_connection().execute(stmt)
+        result = await self.connection_provider.get_current_connection().execute(FIND_TEXT_BY_ID, {"id": id})
         text = result.first()
         if not text:
             return None
         return MyText(**text._asdict())
 
+    async def find_by_project(self, project: str) -> List[TextRow]:
+        """The titles, descriptions and comments of the bugs of `project`."""
+        result = await self.connection_provider.get_current_connection().execute(
+            FIND_PROJECT_TEXTS, {"project": project}
+        )
+        return [TextRow._make(row) for row in result.all()]
+
     async def list(self, size: int, page: int) -> ListResult[MyText]:
         pass
 
     async def update(self, entity: MyText) -> MyText:
-        pass
-
-    async def delete(self, id: int) -> None:
         await self.connection_provider.get_current_connection().execute(
-            delete(MyTextTable).where(MyTextTable.c.id == id)
+            UPDATE_TEXT, {"text_id": entity.id, "content": entity.content}
         )
+        return entity
 
-    async def find_texts_without_embeddings(self) -> List[MyText]:
-        stmt = (
-            select(MyTextTable.c.id, MyTextTable.c.content)
-            .select_from(MyTextTable)
-            .join(
-                EmbeddingTable,
-                eq(EmbeddingTable.c.text_id, MyTextTable.c.id),
-                isouter=True,
-            )
-            .where(eq(EmbeddingTable.c.text_id, None))
-        )
-        result = await self.connection_provider.get_current_connection().execute(stmt)
-        return [MyText(**row._asdict()) for row in result.all()]
+    async def delete(self, id: int) -> None:
+        await self.connection_provider.get_current_connection().execute(DELETE_TEXT, {"id": id})
+
+    async def delete_many(self, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        await self.connection_provider.get_current_connection().execute(DELETE_TEXTS, {"ids": list(ids)})
+
+    async def find_texts_without_embeddings(self) -> List[TextRow]:
+        result = await self.connection_provider.get_current_connection().execute(FIND_TEXTS_WITHOUT_EMBEDDINGS)
+        return [TextRow._make(row) for row in result.all()]
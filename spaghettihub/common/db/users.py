@@ -3,6 +3,7 @@ from typing import List, Optional
 from sqlalchemy import delete, insert, select, update
 from sqlalchemy.sql.operators import eq, or_
 
+from spaghettihub.common.db.allocator import UsersIdAllocator
 from spaghettihub.common.db.repository import BaseRepository
 from spaghettihub.common.db.sequences import (BugCommentSequence,
                                               LaunchpadToGithubWorkSequence,
@@ -19,10 +20,7 @@ from spaghettihub.common.models.users import User
 
 class UsersRepository(BaseRepository[User]):
     async def get_next_id(self) -> int:
-        stmt = select(UsersSequence.next_value())
-        return (
-            await self.connection_provider.get_current_connection().execute(stmt)
-        ).scalar()
+        return await UsersIdAllocator.next_id(self.connection_provider.get_current_connection())
 
     async def create(self, entity: User) -> User:
         stmt = (
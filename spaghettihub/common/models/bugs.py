@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import List
+from enum import IntEnum
+from typing import List, NamedTuple
 
 from pydantic import BaseModel
 
@@ -7,6 +8,16 @@ from spaghettihub.common.models.base import OneToMany, OneToOne
 from spaghettihub.common.models.texts import MyText
 
 
+class BugTextKind(IntEnum):
+    TITLE = 0
+    DESCRIPTION = 1
+    COMMENT = 2
+
+
+# The Launchpad project of the bugs crawled before the projects were tracked
+DEFAULT_PROJECT = "maas"
+
+
 class Bug(BaseModel):
     id: int
     date_created: datetime
@@ -15,14 +26,83 @@ class Bug(BaseModel):
     title: OneToOne[MyText]
     description: OneToOne[MyText]
     comments: OneToMany["BugComment"] | None = None
+    status: str | None = None
+    importance: str | None = None
+    project: str = DEFAULT_PROJECT
+    tags: List[str] | None = None
+
+
+class BugFilter(BaseModel):
+    """
+    Restricts a search to the bugs matching all the given criteria. A list matches a bug if any of its values does.
+    """
+    statuses: List[str] | None = None
+    importances: List[str] | None = None
+    projects: List[str] | None = None
+    tags: List[str] | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
 
 
 class BugComment(BaseModel):
-    id: int
+    id: int | None = None
     text: OneToOne[MyText]
     bug: OneToOne[Bug]
 
 
+class BugRow(NamedTuple):
+    """
+    A bug with the contents of its title and description, as read by the repositories in the search path: a plain
+    tuple, converted to a `Bug` only when returned by the API.
+    """
+    id: int
+    date_created: datetime
+    date_last_updated: datetime
+    web_link: str
+    title_id: int
+    title_content: str
+    description_id: int
+    description_content: str
+    status: str | None
+    importance: str | None
+    project: str
+    tags: List[str] | None
+
+    def to_model(self) -> Bug:
+        return Bug(
+            id=self.id,
+            date_created=self.date_created,
+            date_last_updated=self.date_last_updated,
+            web_link=self.web_link,
+            title=OneToOne[MyText](id=self.title_id, ref=MyText(id=self.title_id, content=self.title_content)),
+            description=OneToOne[MyText](id=self.description_id,
+                                         ref=MyText(id=self.description_id, content=self.description_content)),
+            status=self.status,
+            importance=self.importance,
+            project=self.project,
+            tags=self.tags,
+        )
+
+
+class BugCommentRow(NamedTuple):
+    """
+    A comment, with its content when read, as read or written by the repositories in the search and ingestion paths:
+    a plain tuple, converted to a `BugComment` only when returned by the API.
+    """
+    id: int | None
+    text_id: int
+    bug_id: int
+    content: str | None = None
+
+    def to_model(self) -> BugComment:
+        return BugComment(
+            id=self.id,
+            text=OneToOne[MyText](id=self.text_id, ref=MyText(id=self.text_id, content=self.content))
+            if self.content is not None else OneToOne[MyText](id=self.text_id),
+            bug=OneToOne[Bug](id=self.bug_id),
+        )
+
+
 class BugCommentWithScore(BaseModel):
     bug_comment: BugComment
     score: float
@@ -30,6 +110,29 @@ class BugCommentWithScore(BaseModel):
 
 class BugWithCommentsAndScores(BaseModel):
     bug: Bug
+    # The best score among the texts of the bug
+    score: float | None = None
     title_score: float
     description_score: float
     comments: List[BugCommentWithScore]
+    # The number of comments of the bug, when only the best scored ones are in `comments`
+    comments_count: int | None = None
+
+
+class SimilarBug(BaseModel):
+    bug_id: int
+    score: float
+
+
+class BugNeighbour(BaseModel):
+    bug_id: int
+    neighbour_id: int
+    # 0 for the most similar bug
+    rank: int
+    score: float
+
+
+class NearDuplicateBugs(BaseModel):
+    bug_id: int
+    other_bug_id: int
+    score: float
@@ -1,3 +1,5 @@
+from typing import NamedTuple
+
 from pydantic import BaseModel
 
 from spaghettihub.common.models.base import OneToOne
@@ -5,6 +7,16 @@ from spaghettihub.common.models.texts import MyText
 
 
 class Embedding(BaseModel):
-    id: int
+    id: int | None = None
     embedding: bytes
     text: OneToOne[MyText]
+
+
+class EmbeddingRow(NamedTuple):
+    """An embedding as written by the repositories in bulk: a plain tuple, without the validation of `Embedding`."""
+    id: int | None
+    text_id: int
+    embedding: bytes
+
+    def to_model(self) -> Embedding:
+        return Embedding(id=self.id, text=OneToOne[MyText](id=self.text_id), embedding=self.embedding)
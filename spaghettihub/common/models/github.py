@@ -7,7 +7,7 @@ from spaghettihub.common.models.texts import MyText
 
 
 class LaunchpadToGithubWork(BaseModel):
-    id: int
+    id: int | None = None
     requested_at: datetime
     updated_at: datetime
     completed_at: datetime | None = None
@@ -15,3 +15,4 @@ class LaunchpadToGithubWork(BaseModel):
     status: str
     github_url: str | None = None
     launchpad_url: str
+    batch_uuid: str | None = None
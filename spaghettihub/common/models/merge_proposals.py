@@ -4,7 +4,7 @@ from pydantic import BaseModel
 
 
 class MergeProposal(BaseModel):
-    id: int
+    id: int | None = None
     commit_message: str | None
     date_merged: datetime
     source_git_path: str | None  # blz not working otherwise
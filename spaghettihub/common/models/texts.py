@@ -1,6 +1,20 @@
+from typing import NamedTuple
+
 from pydantic import BaseModel
 
 
 class MyText(BaseModel):
-    id: int
+    id: int | None = None
     content: str
+
+
+class TextRow(NamedTuple):
+    """
+    A text as read or written by the repositories in the bulk paths (ingestion, indexing): a plain tuple, without the
+    validation of `MyText`.
+    """
+    id: int | None
+    content: str
+
+    def to_model(self) -> MyText:
+        return MyText(id=self.id, content=self.content)
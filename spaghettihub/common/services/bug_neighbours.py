@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+
+from spaghettihub.common.db.base import ConnectionProvider
+from spaghettihub.common.db.bug_neighbours import BugNeighboursRepository
+from spaghettihub.common.models.bugs import BugNeighbour
+from spaghettihub.common.services.base import Service
+from spaghettihub.common.services.bugs import BugsService
+from spaghettihub.common.services.embeddings import EmbeddingsService
+from spaghettihub.common.services.embeddings_index import (
+    NEIGHBOURS_BLOCK_SIZE, max_scores, top_neighbours)
+
+logger = logging.getLogger(__name__)
+
+# Neighbours stored for every bug
+NEIGHBOURS_PER_BUG = 20
+
+
+class BugNeighboursService(Service):
+    """
+    Precomputes the most similar bugs of every bug, comparing the embeddings of their titles and descriptions, so that
+    they are served with a single lookup.
+    """
+
+    def __init__(
+        self,
+        connection_provider: ConnectionProvider,
+        bug_neighbours_repository: BugNeighboursRepository,
+        bugs_service: BugsService,
+        embeddings_service: EmbeddingsService,
+    ):
+        super().__init__(connection_provider)
+        self.bug_neighbours_repository = bug_neighbours_repository
+        self.bugs_service = bugs_service
+        self.embeddings_service = embeddings_service
+
+    async def get_neighbours(self, bug_id: int) -> List[BugNeighbour]:
+        return await self.bug_neighbours_repository.find_by_bug_id(bug_id)
+
+    async def _store(self, bug_ids: np.ndarray, vectors: np.ndarray, rows: np.ndarray) -> None:
+        """Compute and store the neighbours of the bugs at the given `rows`, `NEIGHBOURS_BLOCK_SIZE` at a time."""
+        for start in range(0, len(rows), NEIGHBOURS_BLOCK_SIZE):
+            block = rows[start:start + NEIGHBOURS_BLOCK_SIZE]
+            # CPU bound: do not block the event loop
+            neighbours, scores = await asyncio.to_thread(top_neighbours, vectors, block, NEIGHBOURS_PER_BUG)
+            await self.bug_neighbours_repository.replace_many(
+                [int(bug_id) for bug_id in bug_ids[block]],
+                [
+                    BugNeighbour(bug_id=int(bug_ids[row]), neighbour_id=int(bug_ids[neighbour]), rank=rank,
+                                 score=float(score))
+                    for row, row_neighbours, row_scores in zip(block, neighbours, scores)
+                    for rank, (neighbour, score) in enumerate(zip(row_neighbours, row_scores))
+                ]
+            )
+
+    async def refresh_all(self) -> int:
+        """Recompute the neighbours of every bug. Return the number of bugs refreshed."""
+        bug_ids, vectors = await self.embeddings_service.get_bug_vectors()
+        await self._store(bug_ids, vectors, np.arange(len(bug_ids)))
+        await self.bugs_service.set_neighbours_updated(
+            [int(bug_id) for bug_id in bug_ids], datetime.now(timezone.utc))
+        return len(bug_ids)
+
+    async def refresh_stale(self) -> int:
+        """
+        Recompute the neighbours of the bugs whose texts changed since their neighbours were computed, and of the
+        bugs whose neighbours they are or could become. Return the number of bugs refreshed.
+        """
+        stale_ids = await self.bugs_service.find_stale_neighbours()
+        if not stale_ids:
+            return 0
+        bug_ids, vectors = await self.embeddings_service.get_bug_vectors()
+        positions = {int(bug_id): row for row, bug_id in enumerate(bug_ids)}
+        # The bugs without embeddings yet stay stale until they get them
+        stale_ids = [bug_id for bug_id in stale_ids if bug_id in positions]
+        if not stale_ids:
+            return 0
+        stale = np.array([positions[bug_id] for bug_id in stale_ids], dtype=np.int64)
+        if len(stale) * 2 >= len(bug_ids):
+            # Most bugs changed (i.e. the first run): as cheap to refresh all of them
+            return await self.refresh_all()
+
+        # A stale bug enters the neighbours of a bug if it scores more than its least similar neighbour. The bugs with
+        # less than NEIGHBOURS_PER_BUG neighbours (i.e. new bugs) are always refreshed.
+        thresholds = np.full(len(bug_ids), -np.inf, dtype=np.float32)
+        for bug_id, score in (await self.bug_neighbours_repository.find_thresholds(NEIGHBOURS_PER_BUG)).items():
+            if bug_id in positions:
+                thresholds[positions[bug_id]] = score
+        best_stale_scores = await asyncio.to_thread(max_scores, vectors, stale)
+        entering = np.flatnonzero(best_stale_scores > thresholds)
+        # The score of a stale bug with the bugs listing it might have dropped
+        listing = [positions[bug_id] for bug_id in await self.bug_neighbours_repository.find_bugs_listing(stale_ids)
+                   if bug_id in positions]
+
+        rows = np.unique(np.concatenate([stale, entering, np.array(listing, dtype=np.int64)]))
+        logger.info(f"Refreshing the neighbours of {len(rows)} bugs, {len(stale)} of them changed")
+        await self._store(bug_ids, vectors, rows)
+        await self.bugs_service.set_neighbours_updated(stale_ids, datetime.now(timezone.utc))
+        return len(rows)
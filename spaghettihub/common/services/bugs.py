@@ -1,9 +1,12 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
 
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.db.bugs import BugsRepository
-from spaghettihub.common.models.base import OneToOne
-from spaghettihub.common.models.bugs import Bug, BugComment
+from spaghettihub.common.models.base import ListResult, OneToOne
+from spaghettihub.common.models.bugs import (DEFAULT_PROJECT, Bug, BugComment,
+                                             BugCommentRow, BugRow,
+                                             BugTextKind)
 from spaghettihub.common.models.texts import MyText
 from spaghettihub.common.services.base import Service
 from spaghettihub.common.services.texts import TextsService
@@ -21,11 +24,18 @@ class BugsService(Service):
         self.bugs_repository = bugs_repository
         self.texts_service = texts_service
 
-    async def process_launchpad_bug(self, b) -> Optional[Bug]:
+    async def process_launchpad_bug(self, b, project: str = DEFAULT_PROJECT) -> Optional[Bug]:
+        """
+        Store the Launchpad bug task `b` of `project`. A bug with tasks in several projects stays in the project it was
+        first crawled from.
+        """
         bug = await self.bugs_repository.find_by_id(b.bug.id)
         if not bug or bug.date_last_updated < b.bug.date_last_updated:
-            title_text = await self.texts_service.create(b.bug.title)
-            description_text = await self.texts_service.create(b.bug.description)
+            # skip the first message, always equal to the description
+            comments = [m.content for m in b.bug.messages][1:]
+            title_text, description_text, *comment_texts = await self.texts_service.create_many(
+                [b.bug.title, b.bug.description, *comments]
+            )
             if not bug:
                 # bug is new
                 await self.bugs_repository.create(
@@ -36,6 +46,10 @@ class BugsService(Service):
                         web_link=b.bug.web_link,
                         title=OneToOne[MyText](id=title_text.id),
                         description=OneToOne[MyText](id=description_text.id),
+                        status=b.status,
+                        importance=b.importance,
+                        project=project,
+                        tags=list(b.bug.tags),
                     )
                 )
             else:
@@ -45,18 +59,18 @@ class BugsService(Service):
                 bug.title.set_id(title_text.id)
                 bug.description.set_id(description_text.id)
                 bug.date_last_updated = b.bug.date_last_updated
+                bug.status = b.status
+                bug.importance = b.importance
+                bug.tags = list(b.bug.tags)
                 await self.bugs_repository.update(bug)
-                await self.texts_service.delete(old_text_id)
-                await self.texts_service.delete(old_description_id)
+                # The neighbours of the bug are computed again by the next refresh
+                await self.bugs_repository.set_neighbours_updated([bug.id], None)
+                await self.texts_service.delete_many([old_text_id, old_description_id])
 
             await self.delete_comments(b.bug.id)
-            # skip the first, always equal to the description
-            first = True
-            for m in b.bug.messages:
-                if first:
-                    first = False
-                    continue
-                await self.add_comment(b.bug.id, m.content)
+            await self.bugs_repository.add_comments(
+                [BugCommentRow(None, comment_text.id, b.bug.id) for comment_text in comment_texts]
+            )
 
     async def delete_comments(self, bug_id: int) -> None:
         # embeddings and texts are cascaded
@@ -66,14 +80,41 @@ class BugsService(Service):
         comment_text = await self.texts_service.create(content)
         return await self.bugs_repository.add_comment(
             BugComment(
-                id=await self.bugs_repository.get_next_comment_id(),
                 bug=OneToOne[Bug](id=bug_id),
                 text=OneToOne[MyText](id=comment_text.id),
             )
         )
 
-    async def find_bug_by_text_id(self, text_id: int) -> Optional[Bug]:
+    async def find_bug_by_id(self, bug_id: int) -> Optional[Bug]:
+        return await self.bugs_repository.find_by_id(bug_id)
+
+    async def find_bug_by_text_id(self, text_id: int) -> Optional[BugRow]:
         return await self.bugs_repository.find_by_text_id(text_id)
 
-    async def get_bug_comments(self, bug_id: int) -> List[BugComment]:
+    async def find_text_owners(self, project: str | None = None) -> List[Tuple[int, int, BugTextKind]]:
+        return await self.bugs_repository.find_text_owners(project)
+
+    async def find_stale_neighbours(self) -> List[int]:
+        return await self.bugs_repository.find_stale_neighbours()
+
+    async def set_neighbours_updated(self, ids: List[int], time: datetime | None) -> None:
+        await self.bugs_repository.set_neighbours_updated(ids, time)
+
+    async def find_projects(self) -> List[str]:
+        return await self.bugs_repository.find_projects()
+
+    async def find_search_attributes(
+            self, project: str | None = None) -> List[Tuple[int, str | None, str | None, str, List[str] | None, datetime]]:
+        return await self.bugs_repository.find_search_attributes(project)
+
+    async def get_bug_comments(self, bug_id: int) -> List[BugCommentRow]:
         return await self.bugs_repository.find_bug_comments(bug_id)
+
+    async def get_bug_comments_by_text_ids(self, bug_id: int, text_ids: Sequence[int]) -> List[BugCommentRow]:
+        return await self.bugs_repository.find_bug_comments_by_text_ids(bug_id, text_ids)
+
+    async def count_bug_comments(self, bug_id: int) -> int:
+        return await self.bugs_repository.count_bug_comments(bug_id)
+
+    async def get_bug_comments_page(self, bug_id: int, size: int, page: int) -> ListResult[BugCommentRow]:
+        return await self.bugs_repository.find_bug_comments_page(bug_id, size, page)
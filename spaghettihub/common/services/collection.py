@@ -1,12 +1,15 @@
 
 from spaghettihub.common.db.base import ConnectionProvider
+from spaghettihub.common.db.bug_neighbours import BugNeighboursRepository
 from spaghettihub.common.db.bugs import BugsRepository
 from spaghettihub.common.db.embeddings import EmbeddingsRepository
 from spaghettihub.common.db.github import LaunchpadToGithubWorkRepository
 from spaghettihub.common.db.last_update import LastUpdateRepository
 from spaghettihub.common.db.merge_proposals import MergeProposalsRepository
+from spaghettihub.common.db.notifications import NotificationListener
 from spaghettihub.common.db.texts import TextsRepository
 from spaghettihub.common.db.users import UsersRepository
+from spaghettihub.common.services.bug_neighbours import BugNeighboursService
 from spaghettihub.common.services.bugs import BugsService
 from spaghettihub.common.services.embeddings import (EmbeddingsCache,
                                                      EmbeddingsService)
@@ -15,20 +18,52 @@ from spaghettihub.common.services.last_update import LastUpdateService
 from spaghettihub.common.services.merge_proposals import MergeProposalsService
 from spaghettihub.common.services.texts import TextsService
 from spaghettihub.common.services.users import UsersService
+from spaghettihub.common.workflows.client import TemporalClientProvider
 
 
 class ServiceCollection:
+    """
+    The services, wired together. A single collection is shared by all the requests: it is read-only once produced.
+    """
+
+    __slots__ = (
+        "last_update_service",
+        "bugs_service",
+        "texts_service",
+        "embeddings_service",
+        "bug_neighbours_service",
+        "merge_proposals_service",
+        "launchpad_to_github_work_service",
+        "users_service",
+        "_frozen",
+    )
+
     last_update_service: LastUpdateService
     bugs_service: BugsService
     texts_service: TextsService
     embeddings_service: EmbeddingsService
+    bug_neighbours_service: BugNeighboursService
     merge_proposals_service: MergeProposalsService
     launchpad_to_github_work_service: LaunchpadToGithubWorkService
     users_service: UsersService
 
+    def __init__(self):
+        object.__setattr__(self, "_frozen", False)
+
+    def __setattr__(self, name: str, value) -> None:
+        if self._frozen:
+            raise AttributeError(f"The services are shared by all the requests and cannot be replaced: {name}")
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name: str) -> None:
+        if self._frozen:
+            raise AttributeError(f"The services are shared by all the requests and cannot be removed: {name}")
+        super().__delattr__(name)
+
     @classmethod
-    def produce(cls, connection_provider: ConnectionProvider, embeddings_cache: EmbeddingsCache | None = None) -> \
-            "ServiceCollection":
+    def produce(cls, connection_provider: ConnectionProvider, embeddings_cache: EmbeddingsCache | None = None,
+                temporal_client_provider: TemporalClientProvider | None = None,
+                notification_listener: NotificationListener | None = None) -> "ServiceCollection":
         services = cls()
         services.last_update_service = LastUpdateService(
             connection_provider=connection_provider,
@@ -56,6 +91,14 @@ class ServiceCollection:
             bugs_service=services.bugs_service,
             embeddings_cache=embeddings_cache
         )
+        services.bug_neighbours_service = BugNeighboursService(
+            connection_provider=connection_provider,
+            bug_neighbours_repository=BugNeighboursRepository(
+                connection_provider=connection_provider
+            ),
+            bugs_service=services.bugs_service,
+            embeddings_service=services.embeddings_service,
+        )
         services.merge_proposals_service = MergeProposalsService(
             connection_provider=connection_provider,
             merge_proposals_repository=MergeProposalsRepository(
@@ -66,7 +109,9 @@ class ServiceCollection:
             connection_provider=connection_provider,
             launchpad_to_github_work_repository=LaunchpadToGithubWorkRepository(
                 connection_provider=connection_provider
-            )
+            ),
+            temporal_client_provider=temporal_client_provider,
+            notification_listener=notification_listener
         )
         services.users_service = UsersService(
             connection_provider=connection_provider,
@@ -74,4 +119,5 @@ class ServiceCollection:
                 connection_provider=connection_provider
             )
         )
+        object.__setattr__(services, "_frozen", True)
         return services
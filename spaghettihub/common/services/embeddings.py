@@ -1,31 +1,108 @@
-from typing import List
+import asyncio
+import heapq
+from collections import defaultdict
+from itertools import compress
+from typing import AsyncIterator, Dict, List, Sequence, Tuple
 
 import numpy as np
+import torch
 from numpy.linalg import norm
 
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.db.embeddings import EmbeddingsRepository
 from spaghettihub.common.models.base import OneToOne
-from spaghettihub.common.models.bugs import (Bug, BugCommentWithScore,
-                                             BugWithCommentsAndScores)
-from spaghettihub.common.models.embeddings import Embedding
-from spaghettihub.common.models.texts import MyText
+from spaghettihub.common.models.bugs import (Bug, BugCommentWithScore, BugFilter,
+                                             BugTextKind,
+                                             BugWithCommentsAndScores,
+                                             NearDuplicateBugs, SimilarBug)
+from spaghettihub.common.models.embeddings import Embedding, EmbeddingRow
+from spaghettihub.common.models.texts import MyText, TextRow
 from spaghettihub.common.services.base import Service
 from spaghettihub.common.services.bugs import BugsService
+from spaghettihub.common.services.embeddings_index import (EmbeddingsIndex,
+                                                           near_duplicates,
+                                                           owner_arrays)
+from spaghettihub.common.services.lexical_index import reciprocal_rank_fusion
 from spaghettihub.common.services.texts import TextsService
 
 
+# Queries embedded with a single forward pass
+QUERIES_BATCH_SIZE = 32
+# Rows of embeddings read at once from the server-side cursor when an index is loaded
+EMBEDDINGS_STREAM_BATCH_SIZE = 10000
+# A hybrid search fuses the best HYBRID_CANDIDATES_PER_RESULT * limit (at least MIN_HYBRID_CANDIDATES) bugs of the
+# vector and of the lexical search
+HYBRID_CANDIDATES_PER_RESULT = 5
+MIN_HYBRID_CANDIDATES = 50
+
+
+def merge_shard_results(
+    indexes: List[EmbeddingsIndex], shard_results: List[List[Tuple[int, int, float]]], limit: int
+) -> List[Tuple[EmbeddingsIndex, int, int, float]]:
+    """The (index, bug id, text id, score) of the `limit` best of the (bug id, text id, score) results of the shards."""
+    results = [(index, *result) for index, shard in zip(indexes, shard_results) for result in shard]
+    return heapq.nlargest(limit, results, key=lambda result: result[3])
+
+
+@torch.no_grad()
+def embed(tokenizer, model, content: str) -> np.ndarray:
+    """The embedding of `content`: the mean of the last hidden states of its tokens."""
+    inputs = tokenizer(
+        content, return_tensors="pt", truncation=True, padding=True
+    )
+    outputs = model(**inputs)
+    embeddings = outputs.last_hidden_state.mean(dim=1)
+    return embeddings.cpu().numpy()[0]
+
+
+@torch.no_grad()
+def embed_batch(tokenizer, model, contents: List[str]) -> np.ndarray:
+    """The embeddings of `contents`, with a single forward pass. Row `i` is `embed(tokenizer, model, contents[i])`."""
+    inputs = tokenizer(
+        contents, return_tensors="pt", truncation=True, padding=True
+    )
+    outputs = model(**inputs)
+    # Only average the actual tokens, not the padding of the shorter contents
+    mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+    embeddings = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1)
+    return embeddings.cpu().numpy()
+
+
 class EmbeddingsCache:
-    def __init__(self, tokenizer, model):
-        self.cache: dict[int, np.ndarray] | None = None
+    """
+    The tokenizer and the model, and one index (shard) per Launchpad project. The shards are loaded and refreshed
+    independently. Unless `lexical` is unset, they come with the BM25 index of their texts.
+    """
+
+    def __init__(self, tokenizer, model, lexical: bool = True):
+        self.lexical = lexical
+        self.indexes: Dict[str, EmbeddingsIndex] = {}
+        # The projects having bugs, sorted, read from the database on first use
+        self.projects: List[str] | None = None
+        # Held while the index of a project is loaded, so that concurrent searches load it once
+        self.locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
         self.tokenizer = tokenizer
         self.model = model
 
-    def get_cache(self) -> dict[int, np.ndarray] | None:
-        return self.cache
+    def get_index(self, project: str) -> EmbeddingsIndex | None:
+        return self.indexes.get(project)
+
+    def set_index(self, project: str, index: EmbeddingsIndex) -> None:
+        self.indexes[project] = index
 
-    def set_cache(self, cache: dict[int, np.ndarray]) -> None:
-        self.cache = cache
+    def get_lock(self, project: str) -> asyncio.Lock:
+        return self.locks[project]
+
+    def get_projects(self) -> List[str] | None:
+        return self.projects
+
+    def set_projects(self, projects: List[str]) -> None:
+        self.projects = projects
+
+    def add_project(self, project: str) -> None:
+        # Replaced rather than updated in place: the searches in progress keep iterating over the previous list
+        if self.projects is not None and project not in self.projects:
+            self.projects = sorted([*self.projects, project])
 
     def get_tokenizer(self):
         return self.tokenizer
@@ -59,59 +136,302 @@ class EmbeddingsService(Service):
         embedding = await self.generate(tokenizer, model, text.content)
         return await self.embeddings_repository.create(
             Embedding(
-                id=await self.embeddings_repository.get_next_id(),
                 text=OneToOne[MyText](id=text.id),
                 embedding=embedding.tobytes(),
             )
         )
 
-    async def generate(self, tokenizer, model, content) -> np.ndarray:
-        inputs = tokenizer(
-            content, return_tensors="pt", truncation=True, padding=True
+    async def generate_and_store_embeddings(
+        self, tokenizer, model, texts: List[MyText | TextRow]
+    ) -> List[EmbeddingRow]:
+        embeddings = [await self.generate(tokenizer, model, text.content) for text in texts]
+        return await self.embeddings_repository.copy_many(
+            [EmbeddingRow(None, text.id, embedding.tobytes()) for text, embedding in zip(texts, embeddings)]
         )
-        outputs = model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-        return embeddings.cpu().detach().numpy()[0]
 
-    async def find_similar_issues(self, search: str, limit: int) -> List[BugWithCommentsAndScores]:
-        embedding = await self.generate(self.embeddings_cache.get_tokenizer(), self.embeddings_cache.get_model(), search)
-        if not self.embeddings_cache.get_cache():
-            embeddings_cache_size = await self.embeddings_repository.list(1, 1)
-            all_embeddings = await self.embeddings_repository.list(embeddings_cache_size.total, 1)
-            self.embeddings_cache.set_cache(
-                {
-                    x.text.id: np.frombuffer(x.embedding, dtype=np.float32) for x in all_embeddings.items
-                }
+    async def generate(self, tokenizer, model, content) -> np.ndarray:
+        # CPU bound: do not block the event loop
+        return await asyncio.to_thread(embed, tokenizer, model, content)
+
+    async def generate_many(self, tokenizer, model, contents: List[str]) -> np.ndarray:
+        """
+        Embed the contents `QUERIES_BATCH_SIZE` at a time, with one forward pass per batch. Row `i` is the embedding of
+        `contents[i]`, equal to `generate(tokenizer, model, contents[i])`.
+        """
+        embeddings = []
+        for i in range(0, len(contents), QUERIES_BATCH_SIZE):
+            # CPU bound: do not block the event loop
+            embeddings.append(
+                await asyncio.to_thread(embed_batch, tokenizer, model, contents[i:i + QUERIES_BATCH_SIZE])
             )
+        return np.vstack(embeddings)
 
-        scores = sorted(
-            ((self.cosine_similarity(embedding, e), text_id)
-             for text_id, e in self.embeddings_cache.get_cache().items()),
-            reverse=True
+    async def load_index(self, project: str) -> EmbeddingsIndex:
+        """
+        Build the index of the embeddings of the bugs of `project` from the database, along with the BM25 index of
+        their texts.
+        """
+        owners = await self.bugs_service.find_text_owners(project)
+        text_ids, vectors = await self.load_vectors(project, owners)
+        attributes = await self.bugs_service.find_search_attributes(project)
+        texts = await self.texts_service.find_by_project(project) if self.embeddings_cache.lexical else None
+        # CPU bound: do not block the other requests
+        return await asyncio.to_thread(
+            EmbeddingsIndex.build,
+            text_ids,
+            vectors,
+            owners,
+            attributes,
+            ((text.id, text.content) for text in texts) if texts is not None else None,
         )
 
-        unique_bugs = {}
-        for similarity, text_id in scores:
+    async def load_vectors(
+        self, project: str, owners: Sequence[Tuple[int, int, BugTextKind]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The ids of the texts of the bugs of `project` having an embedding, sorted by bug according to the (text id, bug
+        id, kind) `owners`, and the matrix of their embeddings (row `i` for `text_ids[i]`).
+
+        The matrix is allocated once the number of embeddings is known, and the embeddings are streamed from the
+        database and copied straight into their row: neither a model nor an array per embedding, nor a copy of the
+        matrix to sort it.
+        """
+        owner_text_ids, owner_bug_ids, _ = owner_arrays(owners)
+        text_ids = owner_text_ids[np.argsort(owner_bug_ids, kind="stable")]
+        embedded = np.array(await self.embeddings_repository.find_text_ids(project), dtype=np.int64)
+        text_ids = text_ids[np.isin(text_ids, embedded)]
+        # The rows sorted by text id, to find the row of every streamed embedding
+        lookup_order = np.argsort(text_ids)
+        lookup = text_ids[lookup_order]
+
+        vectors = None
+        async for batch in self.embeddings_repository.stream_by_project(project, EMBEDDINGS_STREAM_BATCH_SIZE):
+            if vectors is None:
+                vectors = np.zeros((len(text_ids), len(batch[0][1]) // np.dtype(np.float32).itemsize),
+                                   dtype=np.float32)
+            batch_text_ids = np.fromiter((text_id for text_id, _ in batch), dtype=np.int64, count=len(batch))
+            positions = np.minimum(np.searchsorted(lookup, batch_text_ids), max(len(lookup) - 1, 0))
+            # The embeddings stored after the text ids were read are skipped
+            found = lookup[positions] == batch_text_ids if len(lookup) else np.zeros(len(batch), dtype=bool)
+            for row, (_, embedding) in zip(lookup_order[positions[found]], compress(batch, found)):
+                vectors[row] = np.frombuffer(embedding, dtype=np.float32)
+        if vectors is None:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return text_ids, vectors
+
+    async def get_index(self, project: str) -> EmbeddingsIndex:
+        """The index of the bugs of `project`, loaded on first use."""
+        index = self.embeddings_cache.get_index(project)
+        if index is not None:
+            return index
+        async with self.embeddings_cache.get_lock(project):
+            index = self.embeddings_cache.get_index(project)
+            if index is None:
+                index = await self.load_index(project)
+                self.embeddings_cache.set_index(project, index)
+        return index
+
+    async def refresh_index(self, project: str) -> EmbeddingsIndex:
+        """
+        Reload the index of `project`, i.e. after a crawl. The searches keep using the previous index until the new one
+        is loaded, and the indexes of the other projects are left untouched.
+        """
+        async with self.embeddings_cache.get_lock(project):
+            index = await self.load_index(project)
+            self.embeddings_cache.set_index(project, index)
+            self.embeddings_cache.add_project(project)
+        return index
+
+    async def get_indexes(self, projects: List[str] | None = None) -> Dict[str, EmbeddingsIndex]:
+        """The indexes of the given projects (compared case insensitively), or of all of them."""
+        selected = {project.lower() for project in projects} if projects else set()
+        all_projects = self.embeddings_cache.get_projects()
+        # The list of the projects is only read again from the database when a project is not known yet
+        if all_projects is None or not selected <= {project.lower() for project in all_projects}:
+            all_projects = await self.bugs_service.find_projects()
+            self.embeddings_cache.set_projects(all_projects)
+        if selected:
+            all_projects = [project for project in all_projects if project.lower() in selected]
+        # The shards share the database connection of the request: they are loaded one after the other
+        return {project: await self.get_index(project) for project in all_projects}
+
+    async def search_many(
+        self, embeddings: np.ndarray, limit: int, min_score: float | None = None, exhaustive: bool = False,
+        bug_filter: BugFilter | None = None
+    ) -> List[List[Tuple[EmbeddingsIndex, int, int, float]]]:
+        """
+        Search the indexes of the projects selected by `bug_filter` (all of them by default) in parallel, and merge
+        their results: for each of the `embeddings`, the (index, bug id, id of the best text, score) of the `limit` best
+        bugs, best first.
+        """
+        embeddings = np.atleast_2d(embeddings)
+        indexes = list((await self.get_indexes(bug_filter.projects if bug_filter else None)).values())
+        # numpy releases the GIL while scoring: the shards are searched concurrently
+        shard_results = await asyncio.gather(*(
+            asyncio.to_thread(index.search_many, embeddings, limit, min_score, exhaustive, bug_filter)
+            for index in indexes
+        ))
+        return [
+            merge_shard_results(indexes, [shard[i] for shard in shard_results], limit)
+            for i in range(len(embeddings))
+        ]
+
+    async def hybrid_search(
+        self, embedding: np.ndarray, query: str, limit: int, min_score: float | None = None,
+        bug_filter: BugFilter | None = None
+    ) -> List[Tuple[EmbeddingsIndex, int, int, float]]:
+        """
+        Fuse the vector search of `embedding` (the bugs scoring less than `min_score` are skipped) with the BM25 search
+        of the terms of `query`, by reciprocal rank fusion: the (index, bug id, id of a matching text, fused score) of
+        the `limit` best bugs, best first.
+
+        Both searches are limited to the best `HYBRID_CANDIDATES_PER_RESULT * limit` bugs, and a lexical search to the
+        `MAX_QUERY_TERMS` rarest terms of the query, whatever the size of the corpus.
+        """
+        candidates = max(HYBRID_CANDIDATES_PER_RESULT * limit, MIN_HYBRID_CANDIDATES)
+        indexes = list((await self.get_indexes(bug_filter.projects if bug_filter else None)).values())
+        vector_results, lexical_results = await asyncio.gather(
+            asyncio.gather(*(
+                asyncio.to_thread(index.search, embedding, candidates, min_score, False, bug_filter)
+                for index in indexes
+            )),
+            asyncio.gather(*(
+                asyncio.to_thread(index.lexical_search, query, candidates, bug_filter)
+                for index in indexes
+            )),
+        )
+        rankings = [
+            # Fused by bug id
+            [(bug_id, index, text_id) for index, bug_id, text_id, _ in merge_shard_results(indexes, results, candidates)]
+            for results in (vector_results, lexical_results)
+        ]
+        return [
+            (index, bug_id, text_id, score)
+            for (bug_id, index, text_id), score in reciprocal_rank_fusion(rankings, limit)
+        ]
+
+    async def find_similar_issues(
+        self, search: str, limit: int, bug_filter: BugFilter | None = None, hybrid: bool = False,
+        max_comments: int | None = None
+    ) -> List[BugWithCommentsAndScores]:
+        return [
+            bug async for bug in self.iter_similar_issues(
+                search, limit, max_comments=max_comments, bug_filter=bug_filter, hybrid=hybrid)
+        ]
+
+    async def iter_similar_issues(
+        self, search: str, limit: int, min_score: float | None = None, with_comments: bool = True,
+        max_comments: int | None = None, bug_filter: BugFilter | None = None, hybrid: bool = False
+    ) -> AsyncIterator[BugWithCommentsAndScores]:
+        """
+        Yield the `limit` bugs most similar to `search`, best first, as soon as each of them is loaded: see
+        `search_similar_issues` and `load_similar_issues`.
+        """
+        embedding, results = await self.search_similar_issues(search, limit, min_score, bug_filter, hybrid)
+        async for bug in self.load_similar_issues(embedding, results, with_comments, max_comments):
+            yield bug
+
+    async def search_similar_issues(
+        self, search: str, limit: int, min_score: float | None = None, bug_filter: BugFilter | None = None,
+        hybrid: bool = False
+    ) -> Tuple[np.ndarray, List[Tuple[EmbeddingsIndex, int, int, float]]]:
+        """
+        The embedding of `search`, and the (index, bug id, id of the best text, score) of the `limit` bugs most similar
+        to it, best first. Bugs whose best text scores less than `min_score`, or not matching `bug_filter`, are skipped.
+        With `hybrid`, the bugs containing the terms of `search` are ranked as well, and the score of a bug is its fused
+        score.
+        """
+        embedding = await self.generate(self.embeddings_cache.get_tokenizer(), self.embeddings_cache.get_model(), search)
+        if hybrid:
+            results = await self.hybrid_search(embedding, search, limit, min_score, bug_filter)
+        else:
+            results, = await self.search_many(embedding, limit, min_score, bug_filter=bug_filter)
+        return embedding, results
+
+    async def load_similar_issues(
+        self, embedding: np.ndarray, results: List[Tuple[EmbeddingsIndex, int, int, float]], with_comments: bool = True,
+        max_comments: int | None = None
+    ) -> AsyncIterator[BugWithCommentsAndScores]:
+        """
+        Yield the bugs of the `results` of `search_similar_issues`, in the same order, as soon as each of them is loaded.
+        The bugs deleted since the index was loaded are skipped.
+
+        When `max_comments` is set, only the best scored comments are read and returned, best first, along with the
+        number of comments of the bug: the cost of a result does not grow with its comments.
+        """
+        for index, bug_id, text_id, score in results:
             bug = await self.bugs_service.find_bug_by_text_id(text_id)
-            unique_bugs[bug.id] = bug
-            if len(unique_bugs.keys()) == limit:
-                break
-
-        matching_issues = []
-        text_id_to_score = {text_id: score for score, text_id in scores}
-        for bug in unique_bugs.values():
-            bug_comments = await self.bugs_service.get_bug_comments(bug.id)
-            bug_with_score = BugWithCommentsAndScores(
-                bug=bug,
-                title_score=text_id_to_score[bug.title.id],
-                description_score=text_id_to_score[bug.description.id],
+            if bug is None:
+                continue
+            comments_count = None
+            if not with_comments:
+                bug_comments = []
+            elif max_comments is None:
+                bug_comments = await self.bugs_service.get_bug_comments(bug.id)
+            else:
+                # Scored from the index: only the best comments are read from the database
+                best_comments = index.best_comments(embedding, bug.id, max_comments)
+                bug_comments = await self.bugs_service.get_bug_comments_by_text_ids(
+                    bug.id, [comment_text_id for comment_text_id, _ in best_comments])
+                comments_count = await self.bugs_service.count_bug_comments(bug.id)
+            text_scores = index.text_scores(
+                embedding,
+                [bug.title_id, bug.description_id, *(bug_comment.text_id for bug_comment in bug_comments)]
+            )
+
+            if max_comments is not None:
+                bug_comments = sorted(
+                    bug_comments, key=lambda bug_comment: text_scores[bug_comment.text_id], reverse=True
+                )[:max_comments]
+            # Only the returned rows are converted to models
+            yield BugWithCommentsAndScores(
+                bug=bug.to_model(),
+                score=score,
+                title_score=text_scores[bug.title_id],
+                description_score=text_scores[bug.description_id],
                 comments=[
                     BugCommentWithScore(
-                        bug_comment=bug_comment,
-                        score=text_id_to_score[bug_comment.text.id],
+                        bug_comment=bug_comment.to_model(),
+                        score=text_scores[bug_comment.text_id],
                     )
                     for bug_comment in bug_comments
-                ]
+                ],
+                comments_count=comments_count,
             )
-            matching_issues.append(bug_with_score)
-        return matching_issues
+
+    async def find_duplicates(
+        self, queries: List[str], limit: int, min_score: float | None = None, exhaustive: bool = False
+    ) -> List[List[SimilarBug]]:
+        """
+        The `limit` bugs most similar to each of the queries, best first. All the queries are embedded and scored at
+        once. With `exhaustive`, all the texts are scored instead of the ones of the candidate bugs only.
+        """
+        embeddings = await self.generate_many(
+            self.embeddings_cache.get_tokenizer(), self.embeddings_cache.get_model(), queries)
+        return [
+            [SimilarBug(bug_id=bug_id, score=score) for _, bug_id, _, score in bugs]
+            for bugs in await self.search_many(embeddings, limit, min_score, exhaustive)
+        ]
+
+    async def get_bug_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The ids of the bugs of all the projects and their unit vectors, the mean of the embeddings of their title and
+        description.
+        """
+        shards = [index.bug_vectors() for index in (await self.get_indexes()).values() if len(index)]
+        if not shards:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return np.concatenate([bug_ids for bug_ids, _ in shards]), np.concatenate([vectors for _, vectors in shards])
+
+    async def find_near_duplicates(self, min_score: float, limit: int) -> List[NearDuplicateBugs]:
+        """
+        The `limit` most similar pairs of bugs, best first, comparing their titles and descriptions. The bugs of all the
+        projects are compared with each other.
+        """
+        bug_ids, vectors = await self.get_bug_vectors()
+        # CPU bound: do not block the other requests
+        pairs = await asyncio.to_thread(near_duplicates, bug_ids, vectors, min_score, limit)
+        return [
+            NearDuplicateBugs(bug_id=bug_id, other_bug_id=other_bug_id, score=score)
+            for bug_id, other_bug_id, score in pairs
+        ]
@@ -0,0 +1,399 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from spaghettihub.common.models.bugs import BugFilter, BugTextKind
+from spaghettihub.common.services.lexical_index import LexicalIndex
+
+# The (bug id, status, importance, project, tags, creation date) of a bug
+BugAttributes = Tuple[int, str | None, str | None, str | None, Sequence[str] | None, datetime | None]
+
+# A search scores the texts of this many candidate bugs for each bug it returns, and of at least MIN_CANDIDATES bugs
+CANDIDATES_PER_RESULT = 10
+MIN_CANDIDATES = 100
+# Rows of the bug matrix compared with all the others at once by the near duplicates report and the neighbours
+NEAR_DUPLICATES_BLOCK_SIZE = 1024
+NEIGHBOURS_BLOCK_SIZE = 1024
+
+
+def normalize(vectors: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Scale the vectors (the last axis) to unit length, so that their dot product is the cosine similarity. Pass
+    `out=vectors` to normalize them in place.
+    """
+    # Unlike np.linalg.norm, einsum does not allocate the squares of the whole matrix
+    norms = np.sqrt(np.einsum("...i,...i->...", vectors, vectors))[..., np.newaxis]
+    norms[norms == 0] = 1
+    return np.divide(vectors, norms, out=out)
+
+
+def owner_arrays(owners: Sequence[Tuple[int, int, BugTextKind]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The text ids, bug ids and kinds of the (text id, bug id, kind) `owners`, as three arrays."""
+    rows = np.array(owners, dtype=np.int64).reshape(-1, 3)
+    return rows[:, 0], rows[:, 1], rows[:, 2].astype(np.int8)
+
+
+def to_datetime64(value: datetime | None) -> np.datetime64:
+    if value is None:
+        return np.datetime64("NaT", "s")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "s")
+
+
+def value_masks(values: Iterable[Iterable[str]], size: int) -> Dict[str, np.ndarray]:
+    """For every value, the mask of the positions whose values include it. The values are compared case insensitively."""
+    masks = {}
+    for position, position_values in enumerate(values):
+        for value in position_values:
+            masks.setdefault(value.lower(), np.zeros(size, dtype=bool))[position] = True
+    return masks
+
+
+class EmbeddingsIndex:
+    """
+    The embeddings of the texts of all the bugs, as one matrix of unit vectors: the similarities of a batch of queries
+    with the whole corpus are a single matrix product.
+
+    Row `i` is the embedding of the text `text_ids[i]`, which is the title, the description or a comment
+    (`kinds[i]`) of the bug `bug_ids[i]`. The rows are sorted by bug: the texts of the bug `bugs[j]` are the rows
+    `offsets[j]:offsets[j + 1]`.
+
+    Every bug is also represented by the unit centroid of its texts (`centroids`). A search scores the centroids first,
+    then only the texts of the best candidate bugs, instead of all the texts.
+
+    The attributes a search can filter on are precomputed as one boolean mask over `bugs` per status, importance,
+    project and tag: a filter is a few vectorized ANDs and ORs, and only the bugs it selects are scored.
+
+    When built with the contents of the texts, `lexical` is the BM25 index of the texts of the same bugs.
+    """
+
+    def __init__(
+        self, text_ids: np.ndarray, bug_ids: np.ndarray, kinds: np.ndarray, vectors: np.ndarray,
+        attributes: Iterable[BugAttributes] = ()
+    ):
+        if np.any(bug_ids[1:] < bug_ids[:-1]):
+            order = np.argsort(bug_ids, kind="stable")
+            text_ids, bug_ids, kinds, vectors = text_ids[order], bug_ids[order], kinds[order], vectors[order]
+        self.text_ids = text_ids
+        self.bug_ids = bug_ids
+        self.kinds = kinds
+        # The matrix is not copied again when its rows are already sorted by bug: it is normalized in place
+        vectors = vectors.astype(np.float32, copy=False)
+        self.vectors = normalize(vectors, out=vectors)
+        # The rows sorted by text id, to find the row of a text
+        self.text_order = np.argsort(self.text_ids)
+        self.sorted_text_ids = self.text_ids[self.text_order]
+        self.bugs, starts = np.unique(self.bug_ids, return_index=True)
+        self.offsets = np.append(starts, len(self.bug_ids))
+        if len(self.bugs):
+            centroids = np.add.reduceat(self.vectors, starts, axis=0)
+            self.centroids = normalize(centroids, out=centroids)
+        else:
+            self.centroids = np.empty((0, self.vectors.shape[1]), dtype=np.float32)
+        self._index_attributes(attributes)
+        self.lexical: LexicalIndex | None = None
+
+    def _index_attributes(self, attributes: Iterable[BugAttributes]) -> None:
+        attributes_by_bug_id = {row[0]: row for row in attributes}
+        rows = [attributes_by_bug_id.get(int(bug_id)) for bug_id in self.bugs]
+        self.masks: Dict[str, Dict[str, np.ndarray]] = {
+            "status": value_masks(([row[1]] if row and row[1] else [] for row in rows), len(rows)),
+            "importance": value_masks(([row[2]] if row and row[2] else [] for row in rows), len(rows)),
+            "project": value_masks(([row[3]] if row and row[3] else [] for row in rows), len(rows)),
+            "tag": value_masks(((row[4] or []) if row else [] for row in rows), len(rows)),
+        }
+        self.dates_created = np.array(
+            [to_datetime64(row[5] if row else None) for row in rows], dtype="datetime64[s]")
+
+    @classmethod
+    def build(
+        cls, text_ids: np.ndarray, vectors: np.ndarray, owners: Sequence[Tuple[int, int, BugTextKind]],
+        attributes: Iterable[BugAttributes] = (), contents: Iterable[Tuple[int, str]] | None = None
+    ) -> "EmbeddingsIndex":
+        """
+        Index the `vectors` of the texts `text_ids` (row `i` is the embedding of `text_ids[i]`) that belong to a bug,
+        according to the (text id, bug id, kind) `owners`, and the search `attributes` of the bugs. If given, the (text
+        id, content) `contents` of the texts are indexed by `lexical`.
+
+        The index takes ownership of `vectors`, normalized in place. It is not copied if all its texts belong to a bug
+        and its rows are sorted by bug (see `EmbeddingsService.load_vectors`).
+        """
+        owner_text_ids, owner_bug_ids, owner_kinds = owner_arrays(owners)
+        owner_order = np.argsort(owner_text_ids)
+        sorted_owner_text_ids = owner_text_ids[owner_order]
+        positions = np.minimum(np.searchsorted(sorted_owner_text_ids, text_ids), max(len(owner_text_ids) - 1, 0))
+        owned = sorted_owner_text_ids[positions] == text_ids if len(owner_text_ids) else np.zeros(len(text_ids), bool)
+        if not owned.all():
+            text_ids, vectors, positions = text_ids[owned], vectors[owned], positions[owned]
+        owner_rows = owner_order[positions]
+        index = cls(text_ids, owner_bug_ids[owner_rows], owner_kinds[owner_rows], vectors, attributes)
+        if contents is not None:
+            index.lexical = LexicalIndex.build(contents, owners, index.bugs)
+        return index
+
+    def text_rows(self, text_ids: Sequence[int]) -> np.ndarray:
+        """The rows of the given texts, -1 for the texts without an embedding."""
+        text_ids = np.asarray(text_ids, dtype=np.int64)
+        if not len(self):
+            return np.full(len(text_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_text_ids, text_ids), len(self) - 1)
+        return np.where(self.sorted_text_ids[positions] == text_ids, self.text_order[positions], -1)
+
+    def __len__(self) -> int:
+        return len(self.text_ids)
+
+    def mask(self, bug_filter: BugFilter) -> np.ndarray | None:
+        """The mask of the `bugs` matching `bug_filter`, or None if it matches all of them."""
+        mask = None
+        for attribute, values in (
+            ("status", bug_filter.statuses),
+            ("importance", bug_filter.importances),
+            ("project", bug_filter.projects),
+            ("tag", bug_filter.tags),
+        ):
+            if not values:
+                continue
+            masks = self.masks[attribute]
+            matches = np.zeros(len(self.bugs), dtype=bool)
+            for value in values:
+                value_mask = masks.get(value.lower())
+                if value_mask is not None:
+                    matches |= value_mask
+            mask = matches if mask is None else mask & matches
+        # The bugs without a creation date never match a date range
+        if bug_filter.created_after is not None:
+            matches = self.dates_created >= to_datetime64(bug_filter.created_after)
+            mask = matches if mask is None else mask & matches
+        if bug_filter.created_before is not None:
+            matches = self.dates_created < to_datetime64(bug_filter.created_before)
+            mask = matches if mask is None else mask & matches
+        return mask
+
+    def search(
+        self, query: np.ndarray, limit: int, min_score: float | None = None, exhaustive: bool = False,
+        bug_filter: BugFilter | None = None
+    ) -> List[Tuple[int, int, float]]:
+        """
+        The (bug id, id of the best text, score) of the `limit` bugs most similar to `query`, best first. A bug scores as
+        its best text, and the bugs scoring less than `min_score` or not matching `bug_filter` are skipped.
+
+        Unless `exhaustive` is set, only the texts of the bugs whose centroid is among the best
+        `CANDIDATES_PER_RESULT * limit` (at least `MIN_CANDIDATES`) are scored.
+        """
+        return self.search_many(np.atleast_2d(query), limit, min_score, exhaustive, bug_filter)[0]
+
+    def search_many(
+        self, queries: np.ndarray, limit: int, min_score: float | None = None, exhaustive: bool = False,
+        bug_filter: BugFilter | None = None
+    ) -> List[List[Tuple[int, int, float]]]:
+        """`search` for each of the queries (one per row), scoring them all at once."""
+        queries = normalize(np.atleast_2d(queries).astype(np.float32, copy=False))
+        candidates = max(CANDIDATES_PER_RESULT * limit, MIN_CANDIDATES)
+        mask = self.mask(bug_filter) if bug_filter is not None else None
+        # The filter is applied before scoring: the bugs it excludes are never scored
+        allowed = np.flatnonzero(mask) if mask is not None else None
+        if exhaustive or len(self.bugs if allowed is None else allowed) <= candidates:
+            if allowed is None:
+                bugs = np.arange(len(self.bugs))
+                rows = np.arange(len(self))
+                vectors = self.vectors
+            else:
+                bugs = allowed
+                rows = self._rows(bugs)
+                vectors = self.vectors[rows]
+            all_scores = queries @ vectors.T if len(rows) else np.empty((len(queries), 0))
+            return [self._top_bugs(bugs, rows, scores, limit, min_score) for scores in all_scores]
+
+        centroids = self.centroids if allowed is None else self.centroids[allowed]
+        all_bug_scores = queries @ centroids.T
+        results = []
+        for query, bug_scores in zip(queries, all_bug_scores):
+            bugs = np.argpartition(-bug_scores, candidates - 1)[:candidates]
+            if allowed is not None:
+                bugs = allowed[bugs]
+            rows = self._rows(bugs)
+            results.append(self._top_bugs(bugs, rows, self.vectors[rows] @ query, limit, min_score))
+        return results
+
+    def lexical_search(
+        self, query: str, limit: int, bug_filter: BugFilter | None = None
+    ) -> List[Tuple[int, int, float]]:
+        """
+        The (bug id, id of the best text, BM25 score) of the `limit` bugs best matching the terms of `query`, best
+        first. The bugs not matching `bug_filter` are skipped.
+        """
+        if self.lexical is None:
+            return []
+        mask = self.mask(bug_filter) if bug_filter is not None else None
+        return [
+            (int(self.bugs[bug]), text_id, score)
+            for bug, text_id, score in self.lexical.search(query, limit, mask)
+        ]
+
+    def _rows(self, bugs: np.ndarray) -> np.ndarray:
+        """The rows of the texts of the bugs at the given positions of `bugs`, bug after bug."""
+        starts = self.offsets[bugs]
+        lengths = self.offsets[bugs + 1] - starts
+        # For every row, its start plus its rank within its bug
+        return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+    def _top_bugs(
+        self, bugs: np.ndarray, rows: np.ndarray, scores: np.ndarray, limit: int, min_score: float | None
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Select the best bugs among `bugs`, given the `scores` of their `rows` (as returned by `_rows`).
+        """
+        if not len(bugs):
+            return []
+        lengths = self.offsets[bugs + 1] - self.offsets[bugs]
+        starts = np.cumsum(lengths) - lengths
+        # The texts of a bug are contiguous: a bug scores as its best text
+        bug_scores = np.maximum.reduceat(scores, starts)
+        selected = np.arange(len(bugs)) if min_score is None else np.flatnonzero(bug_scores >= min_score)
+        limit = min(limit, len(selected))
+        if limit == 0:
+            return []
+        best = selected[np.argpartition(-bug_scores[selected], limit - 1)[:limit]]
+        best = best[np.argsort(-bug_scores[best], kind="stable")]
+        # Only look for the best text of the returned bugs
+        best_rows = [
+            rows[start + np.argmax(scores[start:start + length])]
+            for start, length in zip(starts[best], lengths[best])
+        ]
+        return [
+            (int(self.bug_ids[row]), int(self.text_ids[row]), float(score))
+            for row, score in zip(best_rows, bug_scores[best])
+        ]
+
+    def text_scores(self, query: np.ndarray, text_ids: Iterable[int]) -> Dict[int, float]:
+        """The scores of the given texts only. The texts without an embedding yet score 0."""
+        query = normalize(np.asarray(query, dtype=np.float32))
+        text_ids = list(text_ids)
+        rows = self.text_rows(text_ids)
+        scores = np.zeros(len(text_ids), dtype=np.float32)
+        indexed = rows >= 0
+        if indexed.any():
+            scores[indexed] = self.vectors[rows[indexed]] @ query
+        return {text_id: float(score) for text_id, score in zip(text_ids, scores)}
+
+    def best_comments(self, query: np.ndarray, bug_id: int, limit: int) -> List[Tuple[int, float]]:
+        """
+        The (text id, score) of the `limit` comments of the bug most similar to `query`, best first. Only the rows of
+        the bug are scored. The comments without an embedding yet are skipped.
+        """
+        position = int(np.searchsorted(self.bugs, bug_id))
+        if limit <= 0 or position == len(self.bugs) or self.bugs[position] != bug_id:
+            return []
+        rows = np.arange(self.offsets[position], self.offsets[position + 1])
+        rows = rows[self.kinds[rows] == BugTextKind.COMMENT]
+        scores = self.vectors[rows] @ normalize(np.asarray(query, dtype=np.float32))
+        limit = min(limit, len(rows))
+        if limit == 0:
+            return []
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(self.text_ids[rows[i]]), float(scores[i])) for i in best]
+
+    def bug_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The ids of the bugs and, for each of them, the unit mean of the embeddings of its title and description.
+        """
+        rows = self.kinds != BugTextKind.COMMENT
+        bug_ids, inverse = np.unique(self.bug_ids[rows], return_inverse=True)
+        vectors = np.zeros((len(bug_ids), self.vectors.shape[1]), dtype=np.float32)
+        np.add.at(vectors, inverse, self.vectors[rows])
+        return bug_ids, normalize(vectors)
+
+    def near_duplicates(
+        self, min_score: float, limit: int, block_size: int = NEAR_DUPLICATES_BLOCK_SIZE
+    ) -> List[Tuple[int, int, float]]:
+        """
+        The (bug id, other bug id, score) of the `limit` most similar pairs of bugs scoring at least `min_score`, best
+        first.
+        """
+        return near_duplicates(*self.bug_vectors(), min_score, limit, block_size)
+
+
+def near_duplicates(
+    bug_ids: np.ndarray, vectors: np.ndarray, min_score: float, limit: int,
+    block_size: int = NEAR_DUPLICATES_BLOCK_SIZE
+) -> List[Tuple[int, int, float]]:
+    """
+    The (bug id, other bug id, score) of the `limit` most similar pairs of the bugs `bug_ids`, represented by the unit
+    `vectors`, scoring at least `min_score`, best first. The bugs are compared `block_size` at a time, so that at most
+    `block_size` rows of the similarity matrix are in memory.
+
+    At most `limit` pairs per row of a block are kept, and once `limit` pairs are found, only the pairs beating the
+    worst of them: the pairs kept stay bounded by `block_size * limit` whatever `min_score`.
+    """
+    pairs_bugs, pairs_others, pairs_scores = [], [], []
+    threshold = min_score
+    for start in range(0, len(bug_ids), block_size):
+        stop = min(start + block_size, len(bug_ids))
+        scores = vectors[start:stop] @ vectors[start:].T
+        # Only compare a bug with the ones after it: every pair is scored once
+        scores[np.tril_indices(stop - start, m=scores.shape[1])] = -np.inf
+        size = min(limit, scores.shape[1])
+        if size == 0:
+            continue
+        # The score of the `size`-th best pair of every row
+        row_thresholds = np.partition(scores, scores.shape[1] - size, axis=1)[:, scores.shape[1] - size]
+        rows, columns = np.nonzero(scores >= np.maximum(row_thresholds, threshold)[:, np.newaxis])
+        pairs_bugs.append(bug_ids[start + rows])
+        pairs_others.append(bug_ids[start + columns])
+        pairs_scores.append(scores[rows, columns])
+        if sum(map(len, pairs_scores)) > limit:
+            # Only keep the best `limit` pairs found so far
+            pairs_bugs, pairs_others, pairs_scores = _best_pairs(
+                pairs_bugs, pairs_others, pairs_scores, limit)
+            threshold = max(min_score, float(pairs_scores[0][-1]))
+    best_bugs, best_others, best_scores = _best_pairs(
+        pairs_bugs, pairs_others, pairs_scores, limit)
+    return [
+        (int(bug_id), int(other_bug_id), float(score))
+        for bug_id, other_bug_id, score in zip(best_bugs[0], best_others[0], best_scores[0])
+    ]
+
+
+def _best_pairs(bugs: List[np.ndarray], others: List[np.ndarray], scores: List[np.ndarray], limit: int):
+    if not scores:
+        return [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float32)]
+    bugs, others, scores = np.concatenate(
+        bugs), np.concatenate(others), np.concatenate(scores)
+    best = np.argsort(-scores, kind="stable")[:limit]
+    return [bugs[best]], [others[best]], [scores[best]]
+
+
+def top_neighbours(
+    vectors: np.ndarray, rows: np.ndarray, size: int, block_size: int = NEIGHBOURS_BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each of the `rows` of the unit `vectors`, the rows of its `size` most similar other vectors and their scores,
+    best first, as two arrays of `len(rows)` rows. The `rows` are compared with all the vectors `block_size` at a time.
+    """
+    size = max(min(size, len(vectors) - 1), 0)
+    neighbours = np.empty((len(rows), size), dtype=np.int64)
+    scores = np.empty((len(rows), size), dtype=np.float32)
+    if size == 0:
+        return neighbours, scores
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        block_scores = vectors[block] @ vectors.T
+        # A bug is not its own neighbour
+        block_scores[np.arange(len(block)), block] = -np.inf
+        best = np.argpartition(-block_scores, size - 1, axis=1)[:, :size]
+        best_scores = np.take_along_axis(block_scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        neighbours[start:start + len(block)] = np.take_along_axis(best, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(best_scores, order, axis=1)
+    return neighbours, scores
+
+
+def max_scores(vectors: np.ndarray, rows: np.ndarray, block_size: int = NEIGHBOURS_BLOCK_SIZE) -> np.ndarray:
+    """For each of the unit `vectors`, its best score with the `rows` of `vectors`, `block_size` rows at a time."""
+    best = np.full(len(vectors), -np.inf, dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        np.maximum(best, (vectors[rows[start:start + block_size]] @ vectors.T).max(axis=0), out=best)
+    return best
@@ -1,21 +1,30 @@
+import logging
 import uuid
 from datetime import datetime
 from typing import List, Optional
 
-from temporalio.client import Client
+from temporalio.service import RPCError
 
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.db.github import LaunchpadToGithubWorkRepository
 from spaghettihub.common.db.last_update import LastUpdateRepository
+from spaghettihub.common.db.notifications import (NotificationListener,
+                                                  Subscription)
 from spaghettihub.common.db.merge_proposals import MergeProposalsRepository
 from spaghettihub.common.models.base import ListResult
 from spaghettihub.common.models.github import LaunchpadToGithubWork
 from spaghettihub.common.models.last_update import LastUpdate
 from spaghettihub.common.models.merge_proposals import MergeProposal
 from spaghettihub.common.services.base import Service
+from spaghettihub.common.workflows.client import TemporalClientProvider
 from spaghettihub.common.workflows.constants import TASK_QUEUE_NAME
-from spaghettihub.common.workflows.launchpad_to_github.params import \
-    TemporalLaunchpadToGithubParams
+from spaghettihub.common.workflows.launchpad_to_github.params import (
+    TemporalLaunchpadToGithubBatchParams, TemporalLaunchpadToGithubParams)
+
+logger = logging.getLogger(__name__)
+
+# Conversions of a batch run at the same time
+BATCH_MAX_CONCURRENCY = 5
 
 
 class LaunchpadToGithubWorkService(Service):
@@ -23,41 +32,111 @@ class LaunchpadToGithubWorkService(Service):
     def __init__(
             self,
             connection_provider: ConnectionProvider,
-        launchpad_to_github_work_repository: LaunchpadToGithubWorkRepository
+        launchpad_to_github_work_repository: LaunchpadToGithubWorkRepository,
+        temporal_client_provider: TemporalClientProvider | None = None,
+        notification_listener: NotificationListener | None = None
     ):
         super().__init__(connection_provider)
         self.launchpad_to_github_work_repository = launchpad_to_github_work_repository
+        self.temporal_client_provider = temporal_client_provider
+        self.notification_listener = notification_listener
 
     async def create(self, launchpad_url: str) -> LaunchpadToGithubWork:
-        request_uuid = str(uuid.uuid4())
-        work = await self.launchpad_to_github_work_repository.create(
+        """
+        Store the request. The conversion has to be started with `start_workflow` once the transaction is committed.
+        """
+        return await self.launchpad_to_github_work_repository.create(
             LaunchpadToGithubWork(
-                id=await self.launchpad_to_github_work_repository.get_next_id(),
                 requested_at=datetime.utcnow(),
                 updated_at=datetime.utcnow(),
                 status="NEW",
-                request_uuid=request_uuid,
+                request_uuid=str(uuid.uuid4()),
                 launchpad_url=launchpad_url
             )
         )
 
-        client = await Client.connect("localhost:7233")
+    async def create_batch(self, launchpad_urls: List[str]) -> List[LaunchpadToGithubWork]:
+        """
+        Store one request for each url, all tagged with the same batch uuid. The conversions have to be started with
+        `start_batch_workflow` once the transaction is committed.
+        """
+        now = datetime.utcnow()
+        batch_uuid = str(uuid.uuid4())
+        return await self.launchpad_to_github_work_repository.create_many([
+            LaunchpadToGithubWork(
+                requested_at=now,
+                updated_at=now,
+                status="NEW",
+                request_uuid=str(uuid.uuid4()),
+                launchpad_url=launchpad_url,
+                batch_uuid=batch_uuid
+            )
+            for launchpad_url in launchpad_urls
+        ])
+
+    async def start_workflow(self, work: LaunchpadToGithubWork) -> None:
+        try:
+            try:
+                await self._start_workflow(work)
+            except RPCError:
+                # The shared connection might be broken: connect again and retry once.
+                self.temporal_client_provider.reset()
+                await self._start_workflow(work)
+        except Exception:
+            logger.exception(
+                f"Could not start the workflow for {work.request_uuid}")
+            await self.finish(work.request_uuid, github_url=None, status="FAILED")
 
+    async def _start_workflow(self, work: LaunchpadToGithubWork) -> None:
+        client = await self.temporal_client_provider.get_client()
         await client.start_workflow(
             "launchpad-to-github-workflow",
             TemporalLaunchpadToGithubParams(
-                request_uuid=request_uuid,
-                merge_proposal_link=launchpad_url
+                request_uuid=work.request_uuid,
+                merge_proposal_link=work.launchpad_url
             ),
-            id="launchpad-to-github-workflow-" + request_uuid,
+            id="launchpad-to-github-workflow-" + work.request_uuid,
             task_queue=TASK_QUEUE_NAME,
         )
 
-        return work
+    async def start_batch_workflow(self, works: List[LaunchpadToGithubWork]) -> None:
+        try:
+            try:
+                await self._start_batch_workflow(works)
+            except RPCError:
+                self.temporal_client_provider.reset()
+                await self._start_batch_workflow(works)
+        except Exception:
+            logger.exception(
+                f"Could not start the workflow for the batch {works[0].batch_uuid}")
+            for work in works:
+                await self.finish(work.request_uuid, github_url=None, status="FAILED")
+
+    async def _start_batch_workflow(self, works: List[LaunchpadToGithubWork]) -> None:
+        client = await self.temporal_client_provider.get_client()
+        await client.start_workflow(
+            "launchpad-to-github-batch-workflow",
+            TemporalLaunchpadToGithubBatchParams(
+                batch_uuid=works[0].batch_uuid,
+                requests=[
+                    TemporalLaunchpadToGithubParams(
+                        request_uuid=work.request_uuid,
+                        merge_proposal_link=work.launchpad_url
+                    )
+                    for work in works
+                ],
+                max_concurrency=BATCH_MAX_CONCURRENCY
+            ),
+            id="launchpad-to-github-batch-workflow-" + works[0].batch_uuid,
+            task_queue=TASK_QUEUE_NAME,
+        )
 
     async def get(self, request_uuid: str) -> Optional[LaunchpadToGithubWork]:
         return await self.launchpad_to_github_work_repository.find_by_request_uuid(request_uuid)
 
+    async def get_batch(self, batch_uuid: str) -> List[LaunchpadToGithubWork]:
+        return await self.launchpad_to_github_work_repository.find_by_batch_uuid(batch_uuid)
+
     async def finish(self, request_uuid: str, github_url: str, status: str) -> LaunchpadToGithubWork:
         work = await self.get(request_uuid)
         now = datetime.utcnow()
@@ -65,4 +144,13 @@ class LaunchpadToGithubWorkService(Service):
         work.updated_at = now
         work.status = status
         work.github_url = github_url
-        return await self.launchpad_to_github_work_repository.update(work)
+        work = await self.launchpad_to_github_work_repository.update(work)
+        await self.launchpad_to_github_work_repository.notify(work)
+        return work
+
+    async def subscribe(self, uuid: str) -> Subscription:
+        """
+        Receive the status changes of a request, or of all the requests of a batch, as JSON payloads. The
+        subscription has to be closed by the caller.
+        """
+        return await self.notification_listener.subscribe(uuid)
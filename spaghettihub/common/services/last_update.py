@@ -9,6 +9,7 @@ from spaghettihub.common.services.base import Service
 
 class LastUpdateService(Service):
 
+    # The row tracking the bugs. Other crawlers keep their own watermark in a different row.
     ROW_ID = 1
 
     def __init__(
@@ -19,13 +20,15 @@ class LastUpdateService(Service):
         super().__init__(connection_provider)
         self.last_update_repository = last_update_repository
 
-    async def get_last_update(self) -> Optional[LastUpdate]:
-        return await self.last_update_repository.find_by_id(self.ROW_ID)
+    async def get_last_update(self, row_id: int = ROW_ID) -> Optional[LastUpdate]:
+        return await self.last_update_repository.find_by_id(row_id)
 
-    async def set_last_update(self, time: datetime) -> None:
-        last_update = await self.get_last_update()
+    async def set_last_update(self, time: datetime, row_id: int = ROW_ID) -> None:
+        last_update = await self.get_last_update(row_id)
         if not last_update:
-            return await self.last_update_repository.create(
-                LastUpdate(id=self.ROW_ID, last_updated=time)
+            await self.last_update_repository.create(
+                LastUpdate(id=row_id, last_updated=time)
             )
+            return
         last_update.last_updated = time
+        await self.last_update_repository.update(last_update)
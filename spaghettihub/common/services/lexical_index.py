@@ -0,0 +1,161 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Only the rarest terms of a longer query are scored, so that the cost of a query is bounded
+MAX_QUERY_TERMS = 32
+# Constant of the reciprocal rank fusion: a result ranked `r` (from 1) by a ranking adds 1 / (RRF_K + r) to its score
+RRF_K = 60
+
+# Words, numbers and identifiers (i.e. "lp", "2012345", "python3", "maas_ui")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(content: str) -> List[str]:
+    return TOKEN_PATTERN.findall(content.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index of the texts of the bugs of an `EmbeddingsIndex`, to find the exact terms (error messages,
+    package names, bug numbers) that the embeddings miss.
+
+    The postings of every term are stored contiguously (`postings_offsets`), with the BM25 weight of the term in each
+    text already computed: scoring a query is a gather and a sum of the postings of its terms. As in the embeddings
+    index, the texts are sorted by bug and a bug scores as its best text.
+    """
+
+    def __init__(
+        self, bugs: np.ndarray, text_ids: np.ndarray, text_bugs: np.ndarray, terms: Dict[str, int],
+        postings_offsets: np.ndarray, postings_texts: np.ndarray, postings_weights: np.ndarray
+    ):
+        # `text_bugs[i]` is the position in `bugs` of the bug of `text_ids[i]`
+        self.bugs = bugs
+        self.text_ids = text_ids
+        self.text_bugs = text_bugs
+        self.terms = terms
+        self.postings_offsets = postings_offsets
+        self.postings_texts = postings_texts
+        self.postings_weights = postings_weights
+        self.idfs = self._idfs()
+        present, starts = np.unique(text_bugs, return_index=True)
+        self.present_bugs = present
+        self.starts = starts
+
+    def _idfs(self) -> np.ndarray:
+        document_frequencies = np.diff(self.postings_offsets)
+        return np.log1p((len(self.text_ids) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+
+    @classmethod
+    def build(
+        cls, contents: Iterable[Tuple[int, str]], owners: Iterable[Tuple[int, int, object]], bugs: np.ndarray
+    ) -> "LexicalIndex":
+        """
+        Index the (text id, content) `contents` of the texts of `bugs`, according to the (text id, bug id, kind)
+        `owners`. The texts of other bugs are skipped.
+        """
+        bug_positions = {int(bug_id): position for position, bug_id in enumerate(bugs)}
+        owner_positions = {}
+        for text_id, bug_id, _ in owners:
+            position = bug_positions.get(bug_id)
+            if position is not None:
+                owner_positions[text_id] = position
+
+        documents = []
+        for text_id, content in contents:
+            position = owner_positions.get(text_id)
+            if position is not None:
+                documents.append((position, text_id, Counter(tokenize(content))))
+        documents.sort(key=lambda document: document[0])
+
+        terms: Dict[str, int] = {}
+        posting_terms, posting_texts, posting_frequencies = [], [], []
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for row, (_, _, frequencies) in enumerate(documents):
+            lengths[row] = sum(frequencies.values())
+            for term, frequency in frequencies.items():
+                posting_terms.append(terms.setdefault(term, len(terms)))
+                posting_texts.append(row)
+                posting_frequencies.append(frequency)
+
+        posting_terms = np.array(posting_terms, dtype=np.int64)
+        order = np.argsort(posting_terms, kind="stable")
+        postings_texts = np.array(posting_texts, dtype=np.int32)[order]
+        frequencies = np.array(posting_frequencies, dtype=np.float32)[order]
+        average_length = lengths.mean() if len(lengths) else 1.0
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths[postings_texts] / max(average_length, 1.0))
+        postings_weights = frequencies * (BM25_K1 + 1) / (frequencies + norms)
+        postings_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(posting_terms, minlength=len(terms))))).astype(np.int64)
+
+        return cls(
+            bugs,
+            np.array([text_id for _, text_id, _ in documents], dtype=np.int64),
+            np.array([position for position, _, _ in documents], dtype=np.int64),
+            terms,
+            postings_offsets,
+            postings_texts,
+            postings_weights.astype(np.float32),
+        )
+
+    def __len__(self) -> int:
+        return len(self.text_ids)
+
+    def query_terms(self, query: str) -> List[int]:
+        """The ids of the indexed terms of `query`, at most `MAX_QUERY_TERMS` of them, the rarest first."""
+        term_ids = {self.terms[term] for term in tokenize(query) if term in self.terms}
+        return sorted(term_ids, key=lambda term_id: -self.idfs[term_id])[:MAX_QUERY_TERMS]
+
+    def search(self, query: str, limit: int, mask: np.ndarray | None = None) -> List[Tuple[int, int, float]]:
+        """
+        The (position in `bugs`, id of the best text, BM25 score) of the `limit` best bugs for `query`, best first.
+        Only the bugs selected by `mask` (over `bugs`) are returned, and only the bugs containing a term of the query.
+        """
+        term_ids = self.query_terms(query)
+        if not term_ids or not len(self):
+            return []
+        postings = [np.arange(self.postings_offsets[term_id], self.postings_offsets[term_id + 1])
+                    for term_id in term_ids]
+        texts = np.concatenate([self.postings_texts[rows] for rows in postings])
+        weights = np.concatenate([self.postings_weights[rows] * self.idfs[term_id]
+                                  for term_id, rows in zip(term_ids, postings)])
+        text_scores = np.bincount(texts, weights=weights, minlength=len(self))
+        # The texts of a bug are contiguous: a bug scores as its best text
+        bug_scores = np.maximum.reduceat(text_scores, self.starts)
+        selected = bug_scores > 0
+        if mask is not None:
+            selected &= mask[self.present_bugs]
+        selected = np.flatnonzero(selected)
+        limit = min(limit, len(selected))
+        if limit == 0:
+            return []
+        best = selected[np.argpartition(-bug_scores[selected], limit - 1)[:limit]]
+        best = best[np.argsort(-bug_scores[best], kind="stable")]
+        ends = np.append(self.starts[1:], len(self))
+        return [
+            (int(self.present_bugs[bug]),
+             int(self.text_ids[self.starts[bug] + np.argmax(text_scores[self.starts[bug]:ends[bug]])]),
+             float(bug_scores[bug]))
+            for bug in best
+        ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple]], limit: int, k: int = RRF_K) -> List[Tuple]:
+    """
+    Fuse `rankings` of (key, ...) results, best first: a result scores the sum of 1 / (k + rank) over the rankings it
+    appears in. Return the (result, fused score) of the `limit` best results, the result coming from the first ranking
+    it appears in.
+    """
+    scores: Dict[object, float] = {}
+    results: Dict[object, Tuple] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            scores[result[0]] = scores.get(result[0], 0.0) + 1.0 / (k + rank)
+            results.setdefault(result[0], result)
+    best = sorted(scores, key=lambda key: -scores[key])[:limit]
+    return [(results[key], scores[key]) for key in best]
@@ -29,7 +29,6 @@ class MergeProposalsService(Service):
                      web_link: str):
         await self.merge_proposals_repository.create(
             MergeProposal(
-                id=await self.merge_proposals_repository.get_next_id(),
                 commit_message=commit_message,
                 date_merged=date_merged,
                 source_git_path=source_git_path,
@@ -39,5 +38,11 @@ class MergeProposalsService(Service):
             )
         )
 
+    async def create_many(self, merge_proposals: List[MergeProposal]) -> List[MergeProposal]:
+        return await self.merge_proposals_repository.create_many(merge_proposals)
+
+    async def create_many_ignore_existing(self, merge_proposals: List[MergeProposal]) -> None:
+        await self.merge_proposals_repository.create_many_ignore_existing(merge_proposals)
+
     async def find_merge_proposals_contain_message(self, message: str, page: int, size: int) -> ListResult[MergeProposal]:
         return await self.merge_proposals_repository.find_by_commit_message_match(message, page, size)
@@ -2,7 +2,7 @@ from typing import List
 
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.db.texts import TextsRepository
-from spaghettihub.common.models.texts import MyText
+from spaghettihub.common.models.texts import MyText, TextRow
 from spaghettihub.common.services.base import Service
 
 
@@ -16,11 +16,22 @@ class TextsService(Service):
 
     async def create(self, text: str) -> MyText:
         return await self.texts_repository.create(
-            MyText(id=await self.texts_repository.get_next_id(), content=text)
+            MyText(content=text)
+        )
+
+    async def create_many(self, texts: List[str]) -> List[TextRow]:
+        return await self.texts_repository.create_many(
+            [TextRow(None, text) for text in texts]
         )
 
     async def delete(self, id: int) -> None:
         return await self.texts_repository.delete(id)
 
-    async def find_texts_without_embeddings(self) -> List[MyText]:
+    async def delete_many(self, ids: List[int]) -> None:
+        return await self.texts_repository.delete_many(ids)
+
+    async def find_texts_without_embeddings(self) -> List[TextRow]:
         return await self.texts_repository.find_texts_without_embeddings()
+
+    async def find_by_project(self, project: str) -> List[TextRow]:
+        return await self.texts_repository.find_by_project(project)
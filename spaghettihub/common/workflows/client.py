@@ -0,0 +1,27 @@
+import asyncio
+
+from temporalio.client import Client
+
+from spaghettihub.common.workflows.constants import TEMPORAL_TARGET_HOST
+
+
+class TemporalClientProvider:
+    """
+    Process-wide temporal client. The connection is opened on first use and then shared, so that a request does not
+    pay for a new gRPC channel. Call `reset` after a connection failure to connect again on the next use.
+    """
+
+    def __init__(self, target_host: str = TEMPORAL_TARGET_HOST):
+        self.target_host = target_host
+        self._client: Client | None = None
+        self._lock = asyncio.Lock()
+
+    async def get_client(self) -> Client:
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client = await Client.connect(self.target_host)
+        return self._client
+
+    def reset(self) -> None:
+        self._client = None
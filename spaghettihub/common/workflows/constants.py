@@ -1 +1,8 @@
 TASK_QUEUE_NAME = "launchpad-to-github-task-queue"
+TEMPORAL_TARGET_HOST = "localhost:7233"
+# Working directories of the Launchpad to GitHub conversions, one per request
+WORK_DIR = "/home/ubuntu/.spaghettihub/"
+# The bare mirror of the MAAS repository shared by the conversions
+MIRROR_DIR = "/home/ubuntu/.spaghettihub-mirror/"
+# On-disk cache of the Launchpad merge proposals and of their diffs
+LAUNCHPAD_CACHE_DIR = "/home/ubuntu/.spaghettihub-launchpad-cache/"
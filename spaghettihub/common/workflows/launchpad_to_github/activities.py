@@ -1,5 +1,3 @@
-import os
-import subprocess
 import tempfile
 from dataclasses import dataclass
 from pathlib import Path
@@ -10,12 +8,18 @@ from temporalio import activity
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.services.collection import ServiceCollection
 from spaghettihub.common.workflows.base import ActivityBase
+from spaghettihub.common.workflows.launchpad_to_github.cache import \
+    LaunchpadCache
 from spaghettihub.common.workflows.launchpad_to_github.params import (
     ActivityCreateGithubBranchForPullRequestParams,
     ActivityCreateGithubPullRequestParams, ActivityUpdateRequestParams)
+from spaghettihub.common.workflows.launchpad_to_github.workspace import \
+    WorkspaceManager
 from spaghettihub.server.base.db.database import Database
 
 CACHEDIR = "./cache"
+# Maximum number of connections the activities open to each host
+HTTP_CONNECTIONS_PER_HOST = 10
 
 
 class LaunchpadToGithubActivity(ActivityBase):
@@ -23,102 +27,96 @@ class LaunchpadToGithubActivity(ActivityBase):
     def __init__(self, db: Database, gh_token: str):
         super().__init__(db)
         self.gh_token = gh_token
+        self.workspace = WorkspaceManager(heartbeat=activity.heartbeat)
+        self.launchpad_cache = LaunchpadCache()
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created on first use, as the session has to be bound to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=HTTP_CONNECTIONS_PER_HOST)
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def _get_launchpad_resource(self, api_link: str) -> dict:
+        cached = self.launchpad_cache.get_resource(api_link)
+        headers = {"If-None-Match": cached.etag} if cached else {}
+        async with self._get_session().get(api_link, headers=headers) as response:
+            if cached and response.status == 304:
+                return cached.content
+            if not 200 <= int(response.status) < 300:
+                raise RuntimeError(f"Status: {response.status}")
+            content = await response.json()
+            if etag := response.headers.get("ETag"):
+                self.launchpad_cache.put_resource(api_link, etag, content)
+            return content
 
     @activity.defn(name="retrieve-merge-proposal-diff-from-launchpad")
     async def retrieve_merge_proposal_diff_from_launchpad(self, merge_proposal_link: str) -> str:
         api_link = merge_proposal_link.replace(
             "https://code.launchpad.net/", "https://api.launchpad.net/devel/")
-        async with aiohttp.ClientSession() as session:
-            async with session.get(api_link) as response:
-                if not 200 <= int(response.status) < 300:
-                    raise RuntimeError(f"Status: {response.status}")
-                merge_proposal_details = await response.json()
-                preview_diff_link = merge_proposal_details["preview_diff_link"]
-                preview_diff_link = preview_diff_link + "/+files/preview.diff"
-                activity.heartbeat()
-
-            async with session.get(preview_diff_link) as response:
-                if not 200 <= int(response.status) < 300:
-                    raise RuntimeError(f"Status: {response.status}")
-                diff = await response.text()
-                return diff
+        merge_proposal_details = await self._get_launchpad_resource(api_link)
+        preview_diff_link = merge_proposal_details["preview_diff_link"]
+        preview_diff_link = preview_diff_link + "/+files/preview.diff"
+        activity.heartbeat()
+
+        if (diff := self.launchpad_cache.get_diff(preview_diff_link)) is not None:
+            return diff
+        async with self._get_session().get(preview_diff_link) as response:
+            if not 200 <= int(response.status) < 300:
+                raise RuntimeError(f"Status: {response.status}")
+            diff = await response.text()
+        self.launchpad_cache.put_diff(preview_diff_link, diff)
+        return diff
 
     @activity.defn(name="update-github-master-branch")
     async def update_github_master_branch(self, target_dir: str) -> None:
-        if not os.path.exists("/tmp/maas-mirror"):
-            command = ("git clone git@github.com:SpaghettiHub/maas.git /tmp/maas-mirror && "
-                       "cd /tmp/maas-mirror && "
-                       "git remote add lp https://git.launchpad.net/maas && "
-                       "git remote update"
-                       )
-            subprocess.run(command, shell=True)
-            activity.heartbeat()
-
-        update_command = ("cd /tmp/maas-mirror && "
-                          "git fetch lp && "
-                          "git fetch origin && "
-                          "git merge lp/master --no-ff --no-edit && "
-                          "git push origin master"
-                          )
-        subprocess.run(update_command, shell=True)
+        await self.workspace.update_github_master()
 
     @activity.defn(name="update-github-fork-master-branch")
     async def update_github_fork_master_branch(self, target_dir: str) -> None:
-        if not os.path.exists("/tmp/maas-mirror-fork"):
-            command = ("git clone git@github.com:r00tabot/maas.git /tmp/maas-mirror-fork && "
-                       "cd /tmp/maas-mirror-fork && "
-                       "git remote add mirror git@github.com:SpaghettiHub/maas.git && "
-                       "git remote update"
-                       )
-            subprocess.run(command, shell=True)
-            activity.heartbeat()
-
-        update_command = ("cd /tmp/maas-mirror-fork && "
-                          "git fetch mirror && "
-                          "git fetch origin && "
-                          "git merge mirror/master --no-ff --no-edit && "
-                          "git push origin master"
-                          )
-        subprocess.run(update_command, shell=True)
+        await self.workspace.update_fork_master()
 
     @activity.defn(name="create-github-branch-for-pull-request")
     async def create_github_branch_for_pull_request(self, params: ActivityCreateGithubBranchForPullRequestParams) -> str:
-        command = f"mkdir {params.target_dir} && cp -r /tmp/maas-mirror-fork {params.target_dir}"
-        subprocess.run(command, shell=True)
-        activity.heartbeat()
-
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            temp_dir = Path(tmpdirname)
-            diff_file = temp_dir / "patch.diff"
-            diff_file.write_text(params.diff)
-            command = (f"cd {params.target_dir}maas-mirror-fork && "
-                       f"git checkout master && git branch {params.request_uuid} && git checkout {params.request_uuid} && "
-                       f"git apply {str(diff_file)} && "
-                       f"git add * && git commit -m 'enjoy this from r00ta' && git push origin {params.request_uuid}")
-            subprocess.run(command, shell=True)
+        await self.workspace.create_worktree(params.request_uuid, params.target_dir)
+        try:
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                diff_file = Path(tmpdirname) / "patch.diff"
+                diff_file.write_text(params.diff)
+                await self.workspace.commit_diff(params.target_dir, diff_file, "enjoy this from r00ta")
+            await self.workspace.push(params.request_uuid, params.target_dir)
+        finally:
+            await self.workspace.remove_worktree(params.request_uuid, params.target_dir)
 
     @activity.defn(name="create-github-pull-request")
     async def create_github_pull_request(self, params: ActivityCreateGithubPullRequestParams) -> str:
-        async with aiohttp.ClientSession() as session:
-            json_body = {
-                "title": f"Launchpad MP {params.merge_proposal_id}",
-                "body": "This is autogenerated by maas.r00ta.com. Enjoy!",
-                "head": f"r00tabot:{params.request_uuid}",
-                "base": "master"
-            }
-            headers = {
-                "Accept": "application/vnd.github+json",
-                "Authorization": f"Bearer {self.gh_token}",
-                "X-GitHub-Api-Version": "2022-11-28"
-            }
-            async with session.post("https://api.github.com/repos/SpaghettiHub/maas/pulls",
-                                    json=json_body,
-                                    headers=headers
-                                    ) as response:
-                if not 200 <= int(response.status) < 300:
-                    raise RuntimeError(f"Status: {response.status}")
-                pull_request_response = await response.json()
-                return pull_request_response["html_url"]
+        session = self._get_session()
+        json_body = {
+            "title": f"Launchpad MP {params.merge_proposal_id}",
+            "body": "This is autogenerated by maas.r00ta.com. Enjoy!",
+            "head": f"r00tabot:{params.request_uuid}",
+            "base": "master"
+        }
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {self.gh_token}",
+            "X-GitHub-Api-Version": "2022-11-28"
+        }
+        async with session.post("https://api.github.com/repos/SpaghettiHub/maas/pulls",
+                                json=json_body,
+                                headers=headers
+                                ) as response:
+            if not 200 <= int(response.status) < 300:
+                raise RuntimeError(f"Status: {response.status}")
+            pull_request_response = await response.json()
+            return pull_request_response["html_url"]
 
     @activity.defn(name="complete-request")
     async def complete_request(self, params: ActivityUpdateRequestParams) -> None:
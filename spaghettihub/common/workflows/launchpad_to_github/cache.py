@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from spaghettihub.common.workflows.constants import LAUNCHPAD_CACHE_DIR
+
+
+@dataclass
+class CachedResource:
+    etag: str
+    content: dict
+
+
+class LaunchpadCache:
+    """
+    On-disk cache of the Launchpad responses. The files are named after the hash of the url they were downloaded from.
+
+    A preview diff link identifies a single revision of the diff of a merge proposal and never changes, so the diffs
+    are cached forever. The merge proposals are stored with their ETag, to be revalidated with a conditional request.
+    """
+
+    def __init__(self, cache_dir: str = LAUNCHPAD_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+
+    def _path(self, url: str, suffix: str) -> Path:
+        return self.cache_dir / (hashlib.sha256(url.encode()).hexdigest() + suffix)
+
+    def _write(self, path: Path, content: str) -> None:
+        # Write aside and rename, so that concurrent activities never read a partial file
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def get_diff(self, preview_diff_link: str) -> str | None:
+        path = self._path(preview_diff_link, ".diff")
+        return path.read_text() if path.exists() else None
+
+    def put_diff(self, preview_diff_link: str, diff: str) -> None:
+        self._write(self._path(preview_diff_link, ".diff"), diff)
+
+    def get_resource(self, api_link: str) -> CachedResource | None:
+        path = self._path(api_link, ".json")
+        if not path.exists():
+            return None
+        return CachedResource(**json.loads(path.read_text()))
+
+    def put_resource(self, api_link: str, etag: str, content: dict) -> None:
+        self._write(self._path(api_link, ".json"), json.dumps(
+            {"etag": etag, "content": content}))
@@ -1,10 +1,21 @@
 from dataclasses import dataclass
+from typing import List
 
 
 @dataclass
 class TemporalLaunchpadToGithubParams:
     merge_proposal_link: str
     request_uuid: str
+    # False when the master branches have already been updated, i.e. by the batch workflow
+    update_mirrors: bool = True
+
+
+@dataclass
+class TemporalLaunchpadToGithubBatchParams:
+    batch_uuid: str
+    requests: List[TemporalLaunchpadToGithubParams]
+    # Maximum number of conversions of the batch run at the same time
+    max_concurrency: int = 5
 
 
 @dataclass
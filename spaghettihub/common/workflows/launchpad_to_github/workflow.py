@@ -1,21 +1,75 @@
+import asyncio
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import timedelta
 from typing import Any, List
 
 from temporalio import workflow
 from temporalio.common import RetryPolicy
 
-from spaghettihub.common.workflows.constants import TASK_QUEUE_NAME
-from spaghettihub.common.workflows.launchpad_to_github.params import \
-    TemporalLaunchpadToGithubParams
+from spaghettihub.common.workflows.constants import TASK_QUEUE_NAME, WORK_DIR
+from spaghettihub.common.workflows.launchpad_to_github.params import (
+    TemporalLaunchpadToGithubBatchParams, TemporalLaunchpadToGithubParams)
 
 with workflow.unsafe.imports_passed_through():
     from spaghettihub.common.workflows.launchpad_to_github.activities import (
         ActivityCreateGithubBranchForPullRequestParams,
         ActivityCreateGithubPullRequestParams, ActivityUpdateRequestParams)
 
-WORK_DIR = "/home/ubuntu/.spaghettihub/"
+# The git activities can wait for the locks of the mirror behind the other conversions. They heartbeat meanwhile, so
+# that a dead worker is still detected after the heartbeat timeout, and only the waits beyond this timeout fail
+GIT_ACTIVITY_TIMEOUT = timedelta(minutes=15)
+# A conversion runs up to three git activities
+CONVERSION_TIMEOUT = timedelta(minutes=50)
+
+
+async def update_master_branches(target_dir: str) -> None:
+    await workflow.execute_activity(
+        "update-github-master-branch",
+        target_dir,
+        start_to_close_timeout=GIT_ACTIVITY_TIMEOUT,
+        heartbeat_timeout=timedelta(seconds=60)
+    )
+
+    await workflow.execute_activity(
+        "update-github-fork-master-branch",
+        target_dir,
+        start_to_close_timeout=GIT_ACTIVITY_TIMEOUT,
+        heartbeat_timeout=timedelta(seconds=60)
+    )
+
+
+@workflow.defn(name="launchpad-to-github-batch-workflow", sandboxed=False)
+class TemporalLaunchpadToGithubBatchWorkflow:
+    """
+    Convert all the merge proposals of a batch: the master branches are updated once for the whole batch, then at most
+    `max_concurrency` conversions run at the same time.
+    """
+
+    @workflow.run
+    async def run(self, params: TemporalLaunchpadToGithubBatchParams) -> None:
+        update_mirrors = False
+        try:
+            await update_master_branches(WORK_DIR)
+        except Exception:
+            # Let every conversion try again on its own
+            workflow.logger.exception(
+                f"Could not update the master branches for the batch {params.batch_uuid}")
+            update_mirrors = True
+
+        semaphore = asyncio.Semaphore(params.max_concurrency)
+
+        async def convert(request: TemporalLaunchpadToGithubParams) -> None:
+            async with semaphore:
+                await workflow.execute_child_workflow(
+                    "launchpad-to-github-workflow",
+                    replace(request, update_mirrors=update_mirrors),
+                    id="launchpad-to-github-workflow-" + request.request_uuid,
+                    task_queue=TASK_QUEUE_NAME,
+                )
+
+        # A failed conversion is marked as such by its own workflow and must not stop the others
+        await asyncio.gather(*(convert(request) for request in params.requests), return_exceptions=True)
 
 
 @workflow.defn(name="launchpad-to-github-workflow", sandboxed=False)
@@ -30,7 +84,7 @@ class TemporalLaunchpadToGithubWorkflow:
                 id="internal-launchpad-to-github-workflow" + params.request_uuid,
                 task_queue=TASK_QUEUE_NAME,
                 retry_policy=RetryPolicy(maximum_attempts=1),
-                execution_timeout=timedelta(seconds=120)
+                execution_timeout=CONVERSION_TIMEOUT
             )
         except Exception:
             return await workflow.execute_activity(
@@ -61,19 +115,8 @@ class TemporalInternalLaunchpadToGithubWorkflow:
         )
 
         request_dir = WORK_DIR + params.request_uuid + "/"
-        await workflow.execute_activity(
-            "update-github-master-branch",
-            request_dir,
-            start_to_close_timeout=timedelta(seconds=60),
-            heartbeat_timeout=timedelta(seconds=60)
-        )
-
-        await workflow.execute_activity(
-            "update-github-fork-master-branch",
-            request_dir,
-            start_to_close_timeout=timedelta(seconds=60),
-            heartbeat_timeout=timedelta(seconds=60)
-        )
+        if params.update_mirrors:
+            await update_master_branches(request_dir)
 
         await workflow.execute_activity(
             "create-github-branch-for-pull-request",
@@ -82,7 +125,7 @@ class TemporalInternalLaunchpadToGithubWorkflow:
                 target_dir=request_dir,
                 diff=diff
             ),
-            start_to_close_timeout=timedelta(seconds=60),
+            start_to_close_timeout=GIT_ACTIVITY_TIMEOUT,
             heartbeat_timeout=timedelta(seconds=60)
         )
 
@@ -0,0 +1,203 @@
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Callable, Sequence
+
+from spaghettihub.common.workflows.constants import MIRROR_DIR, WORK_DIR
+
+logger = logging.getLogger(__name__)
+
+GITHUB_REMOTE = ("github", "git@github.com:SpaghettiHub/maas.git")
+FORK_REMOTE = ("fork", "git@github.com:r00tabot/maas.git")
+LAUNCHPAD_REMOTE = ("lp", "https://git.launchpad.net/maas")
+
+# The master branches are synced at most once in this interval, however many conversions are requested
+MIRROR_REFRESH_INTERVAL = 300
+# Request directories left behind (i.e. by a crashed worker) are removed after this time
+WORKTREE_TTL = 24 * 60 * 60
+# Seconds between two heartbeats while a command is running
+HEARTBEAT_INTERVAL = 10
+
+
+@asynccontextmanager
+async def heartbeating(heartbeat: Callable[[], None]) -> AsyncIterator[None]:
+    """Call `heartbeat` every `HEARTBEAT_INTERVAL` seconds until the block completes."""
+    async def keep_alive():
+        while True:
+            heartbeat()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    keep_alive_task = asyncio.create_task(keep_alive())
+    try:
+        yield
+    finally:
+        keep_alive_task.cancel()
+
+
+async def run_command(args: Sequence[str], cwd: Path, heartbeat: Callable[[], None]) -> None:
+    """
+    Run a command without blocking the event loop, logging its output and heartbeating until it completes. Raise
+    `RuntimeError` if it fails.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    try:
+        async with heartbeating(heartbeat):
+            async for line in process.stdout:
+                logger.info(f"[{args[0]} {args[1]}] {line.decode(errors='replace').rstrip()}")
+            return_code = await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if return_code != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {return_code}")
+
+
+class FileLock:
+    """Exclusive lock shared by the tasks of this process and by the other worker processes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def hold(self, heartbeat: Callable[[], None] = lambda: None) -> AsyncIterator[None]:
+        """Hold the lock for the duration of the block, heartbeating while waiting for it (i.e. behind a long sync)."""
+        async with heartbeating(heartbeat):
+            await self._lock.acquire()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Closing the file releases the lock
+            with open(self.path, "w") as lock_file:
+                async with heartbeating(heartbeat):
+                    await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+                yield
+        finally:
+            self._lock.release()
+
+
+class WorkspaceManager:
+    """
+    Keeps one bare mirror of the MAAS repository, with the GitHub, fork and Launchpad remotes, and gives every
+    conversion a lightweight `git worktree` of it instead of a full copy of the repository.
+
+    The operations on the shared repository are serialized by `repository_lock`, and the merges of the master branches
+    by `sync_lock` (always taken before `repository_lock`). The request worktrees are not shared, so the conversions
+    run in parallel.
+    """
+
+    def __init__(self, mirror_dir: str = MIRROR_DIR, work_dir: str = WORK_DIR,
+                 heartbeat: Callable[[], None] = lambda: None):
+        self.mirror_dir = Path(mirror_dir)
+        self.work_dir = Path(work_dir)
+        self.heartbeat = heartbeat
+        self.repository = self.mirror_dir / "maas.git"
+        # Persistent worktree used to merge the master branches
+        self.sync_worktree = self.mirror_dir / "sync"
+        self.repository_lock = FileLock(self.mirror_dir / "repository.lock")
+        self.sync_lock = FileLock(self.mirror_dir / "sync.lock")
+
+    async def _git(self, *args: str, cwd: Path | None = None) -> None:
+        await run_command(["git", *args], cwd or self.repository, self.heartbeat)
+
+    async def ensure_mirror(self) -> None:
+        async with self.repository_lock.hold(self.heartbeat):
+            if self.repository.exists():
+                return
+            # Build the mirror aside, so that a failure does not leave a half initialized repository behind
+            staging = self.mirror_dir / "maas.git.new"
+            shutil.rmtree(staging, ignore_errors=True)
+            await self._git("init", "--bare", str(staging), cwd=self.mirror_dir)
+            for name, url in (GITHUB_REMOTE, FORK_REMOTE, LAUNCHPAD_REMOTE):
+                await self._git("remote", "add", name, url, cwd=staging)
+                await self._git("fetch", name, "master", cwd=staging)
+            staging.rename(self.repository)
+            shutil.rmtree(self.sync_worktree, ignore_errors=True)
+            await self._git("worktree", "add", "--detach",
+                            str(self.sync_worktree), f"{GITHUB_REMOTE[0]}/master")
+
+    def _is_fresh(self, stamp: str) -> bool:
+        stamp_file = self.mirror_dir / f"{stamp}.stamp"
+        return stamp_file.exists() and time.time() - stamp_file.stat().st_mtime < MIRROR_REFRESH_INTERVAL
+
+    def _touch(self, stamp: str) -> None:
+        (self.mirror_dir / f"{stamp}.stamp").touch()
+
+    async def _fetch(self, remote: str) -> None:
+        async with self.repository_lock.hold(self.heartbeat):
+            await self._git("fetch", remote, "master")
+
+    async def _sync_master(self, source_remote: str, target_remote: str) -> None:
+        await self.ensure_mirror()
+        async with self.sync_lock.hold(self.heartbeat):
+            # Another conversion might have synced the branch while waiting for the lock
+            if self._is_fresh(target_remote):
+                return
+            await self._fetch(source_remote)
+            await self._fetch(target_remote)
+            # Discard whatever a failed merge left behind
+            await self._git("reset", "--hard", cwd=self.sync_worktree)
+            await self._git("checkout", "--detach", f"{target_remote}/master",
+                            cwd=self.sync_worktree)
+            await self._git("merge", f"{source_remote}/master", "--no-ff", "--no-edit",
+                            cwd=self.sync_worktree)
+            async with self.repository_lock.hold(self.heartbeat):
+                await self._git("push", target_remote, "HEAD:master", cwd=self.sync_worktree)
+            self._touch(target_remote)
+
+    async def update_github_master(self) -> None:
+        """Merge the Launchpad master into the GitHub mirror master."""
+        await self._sync_master(LAUNCHPAD_REMOTE[0], GITHUB_REMOTE[0])
+
+    async def update_fork_master(self) -> None:
+        """Merge the GitHub mirror master into the fork master."""
+        await self._sync_master(GITHUB_REMOTE[0], FORK_REMOTE[0])
+
+    async def create_worktree(self, branch: str, target_dir: str) -> Path:
+        """Check out a new `branch`, starting from the fork master, in `target_dir`."""
+        await self.ensure_mirror()
+        await self.gc()
+        # A previous attempt of the same request might have left its worktree behind
+        await self.remove_worktree(branch, target_dir)
+        async with self.repository_lock.hold(self.heartbeat):
+            await self._git("worktree", "add", "-b", branch,
+                            target_dir, f"{FORK_REMOTE[0]}/master")
+        return Path(target_dir)
+
+    async def commit_diff(self, target_dir: str, diff_file: Path, message: str) -> None:
+        worktree = Path(target_dir)
+        await self._git("apply", str(diff_file), cwd=worktree)
+        await self._git("add", "-A", cwd=worktree)
+        await self._git("commit", "-m", message, cwd=worktree)
+
+    async def push(self, branch: str, target_dir: str) -> None:
+        async with self.repository_lock.hold(self.heartbeat):
+            await self._git("push", "--force", FORK_REMOTE[0], branch, cwd=Path(target_dir))
+
+    async def remove_worktree(self, branch: str, target_dir: str) -> None:
+        async with self.repository_lock.hold(self.heartbeat):
+            if os.path.exists(target_dir):
+                shutil.rmtree(target_dir)
+            await self._git("worktree", "prune")
+            try:
+                await self._git("branch", "-D", branch)
+            except RuntimeError:
+                # The branch was never created
+                pass
+
+    async def gc(self) -> None:
+        """Remove the request directories older than `WORKTREE_TTL`."""
+        if not self.work_dir.exists():
+            return
+        now = time.time()
+        for path in self.work_dir.iterdir():
+            # The request directories are named after their branch
+            if path.is_dir() and now - path.stat().st_mtime > WORKTREE_TTL:
+                await self.remove_worktree(path.name, str(path))
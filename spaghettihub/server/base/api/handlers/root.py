@@ -1,14 +1,8 @@
-from pathlib import Path
-
 from fastapi import Request
 from fastapi.responses import RedirectResponse
-from starlette.templating import Jinja2Templates
 
 from spaghettihub.server.base.api.base import Handler, handler
 
-templates_path = Path(__file__).resolve().parent.parent / 'templates'
-templates = Jinja2Templates(directory=str(templates_path))
-
 
 class RootHandler(Handler):
     """Root API handler."""
@@ -1,11 +1,51 @@
+import logging
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 
+from spaghettihub.common.db.instrumentation import QueryProfiler
 from spaghettihub.server.settings import DatabaseConfig
 
+logger = logging.getLogger(__name__)
+
 
 class Database:
-    def __init__(self, config: DatabaseConfig, echo: bool = False):
+    def __init__(self, config: DatabaseConfig, echo: bool = False, profile: bool = False):
         self.config = config
         self.engine = create_async_engine(
-            config.dsn, echo=echo, isolation_level="REPEATABLE READ"
+            config.dsn,
+            echo=echo,
+            isolation_level=config.isolation_level,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_pre_ping=config.pool_pre_ping,
+            connect_args={
+                "prepared_statement_cache_size": config.statement_cache_size
+            },
+        )
+        self.profiler: QueryProfiler | None = None
+        if profile:
+            self.profiler = QueryProfiler()
+            self.profiler.attach(self.engine)
+
+
+async def check_pool_size(config: DatabaseConfig, workers: int) -> None:
+    """Warn if the pools of `workers` processes can open more connections than postgres accepts."""
+    engine = create_async_engine(config.dsn, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            max_connections = int((await conn.execute(text("SHOW max_connections"))).scalar())
+            reserved = int((await conn.execute(text("SHOW superuser_reserved_connections"))).scalar())
+    except Exception as error:
+        logger.warning(f"Could not read max_connections, the pool size is not checked: {error}")
+        return
+    finally:
+        await engine.dispose()
+    if config.max_connections(workers) > max_connections - reserved:
+        logger.warning(
+            f"{workers} workers can open up to {config.max_connections(workers)} connections (pool size "
+            f"{config.pool_size} + max overflow {config.max_overflow} each), but postgres accepts "
+            f"{max_connections - reserved}: lower SPAGHETTIHUB_DB_POOL_SIZE and SPAGHETTIHUB_DB_MAX_OVERFLOW, or raise "
+            f"max_connections"
         )
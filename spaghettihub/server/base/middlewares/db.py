@@ -1,41 +1,40 @@
-import time
-from contextlib import asynccontextmanager
-from typing import Any, AsyncIterator, Awaitable, Callable
-
-from fastapi import Request, Response
-from sqlalchemy import event
-from sqlalchemy.ext.asyncio import AsyncConnection
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
-
-from spaghettihub.common.db.base import ConnectionProvider
-from spaghettihub.common.services.collection import ServiceCollection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from spaghettihub.common.db.base import LazyConnection
 from spaghettihub.server.base.db.database import Database
 
+# Requests with these methods get a cheaper READ COMMITTED, read only transaction.
+READ_ONLY_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
 
-class TransactionMiddleware(BaseHTTPMiddleware):
+class TransactionMiddleware:
     """Run a request in a transaction, handling commit/rollback.
 
-    This makes the database connection available as `request.state.conn`.
+    This makes the database connection available as `request.state.conn`. The connection is taken from the pool only
+    if the request executes a statement, and the transaction is committed before the response is sent.
     """
 
     def __init__(self, app: ASGIApp, db: Database):
-        super().__init__(app)
+        self.app = app
         self.db = db
 
-    @asynccontextmanager
-    async def get_connection(self) -> AsyncIterator[AsyncConnection]:
-        """Return the connection in a transaction context manager."""
-        async with self.db.engine.connect() as conn:
-            async with conn.begin():
-                yield conn
-
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: Callable[[Request], Awaitable[Response]],
-    ) -> Response:
-        async with self.get_connection() as conn:
-            request.state.conn = conn
-            response = await call_next(request)
-        return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        conn = LazyConnection(
+            self.db.engine, read_only=scope["method"] in READ_ONLY_METHODS)
+        scope.setdefault("state", {})["conn"] = conn
+
+        async def send_after_commit(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                await conn.close(commit=True)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_after_commit)
+        except BaseException:
+            await conn.close(commit=False)
+            raise
+        await conn.close(commit=True)
@@ -1,17 +1,29 @@
 import argparse
+import asyncio
 import logging
+import multiprocessing
+import os
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
 from starlette.middleware.sessions import SessionMiddleware
 from transformers import AutoModel, AutoTokenizer
 
+from spaghettihub.common.db.base import ConnectionProvider
+from spaghettihub.common.db.github import (
+    LAUNCHPAD_TO_GITHUB_WORK_CHANNEL,
+    launchpad_to_github_work_notification_keys)
+from spaghettihub.common.db.notifications import NotificationListener
+from spaghettihub.common.services.collection import ServiceCollection
 from spaghettihub.common.services.embeddings import EmbeddingsCache
+from spaghettihub.common.workflows.client import TemporalClientProvider
 from spaghettihub.server.base.api.handlers import APIBase
-from spaghettihub.server.base.db.database import Database
+from spaghettihub.server.base.db.database import Database, check_pool_size
 from spaghettihub.server.base.middlewares.db import TransactionMiddleware
-from spaghettihub.server.settings import Config, read_config
+from spaghettihub.server.settings import ENV_PREFIX, Config, read_config
 from spaghettihub.server.v1.api.handlers import APIv1
+from spaghettihub.server.v1.api.templating import precompile_templates
 from spaghettihub.server.v1.middlewares.services import ServicesV1Middleware
 
 
@@ -51,19 +63,38 @@ def make_arg_parser():
                         type=str,
                         required=True,
                         help="Set the session secret")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=1,
+                        help="Number of worker processes. Every worker loads its own model and embeddings cache, and "
+                             "has its own database pool")
     return parser
 
 
 def create_app(config: Config) -> FastAPI:
     """Create the FastAPI application."""
 
-    db = Database(config.db, echo=config.debug_queries)
+    db = Database(config.db, echo=config.debug_queries, profile=config.profile_queries)
+    # Shared by all the requests, connected on first use.
+    temporal_client_provider = TemporalClientProvider()
+    # One connection of the pool listens for the status changes of the conversions, on behalf of all the requests
+    # waiting for them.
+    notification_listener = NotificationListener(
+        db.engine, LAUNCHPAD_TO_GITHUB_WORK_CHANNEL, keys=launchpad_to_github_work_notification_keys)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        temporal_client_provider.reset()
+        await notification_listener.close()
+        await db.engine.dispose()
 
     app = FastAPI(
         title="Spaghetti Hub",
         name="My Spaghetti Hub tools",
         # The SwaggerUI page is provided by the APICommon router.
         docs_url=None,
+        lifespan=lifespan,
     )
 
     # The order here is important: the exception middleware must be the first one being executed (i.e. it must be the last
@@ -72,7 +103,12 @@ def create_app(config: Config) -> FastAPI:
         model=AutoModel.from_pretrained("BAAI/bge-large-en-v1.5"),
         tokenizer=AutoTokenizer.from_pretrained("BAAI/bge-large-en-v1.5")
     )
-    app.add_middleware(ServicesV1Middleware, embeddings_cache=embeddings_cache)
+    connection_provider = ConnectionProvider()
+    services = ServiceCollection.produce(
+        connection_provider, embeddings_cache=embeddings_cache, temporal_client_provider=temporal_client_provider,
+        notification_listener=notification_listener)
+    app.add_middleware(ServicesV1Middleware,
+                       connection_provider=connection_provider, services=services)
     app.add_middleware(TransactionMiddleware, db=db)
     app.add_middleware(
         SessionMiddleware,
@@ -82,19 +118,24 @@ def create_app(config: Config) -> FastAPI:
 
     APIBase.register(app.router)
     APIv1.register(app.router)
+    precompile_templates()
     return app
 
 
+def create_app_from_env() -> FastAPI:
+    """Application factory for the worker processes, that get their configuration from the environment."""
+    return create_app(config=read_config())
+
+
 def run():
     parser = make_arg_parser()
     args = parser.parse_args()
 
-    app_config = read_config(secret=args.secret)
     logging.basicConfig(
         level=logging.INFO
     )
-    server_config = uvicorn.Config(
-        create_app(config=app_config),
+    asyncio.run(check_pool_size(read_config().db, args.workers))
+    server_args = dict(
         loop="asyncio",
         proxy_headers=True,
         host=args.host,
@@ -103,5 +144,25 @@ def run():
         ssl_certfile=args.ssl_certfile,
         ssl_ca_certs=args.ssl_ca_certs
     )
+
+    if args.workers > 1:
+        # The workers are spawned, not forked: hand them the secret through the environment and split the cores among
+        # them so that the model inference of a worker does not starve the others.
+        os.environ[ENV_PREFIX + "SECRET"] = args.secret
+        os.environ.setdefault("OMP_NUM_THREADS", str(
+            max(1, multiprocessing.cpu_count() // args.workers)))
+        uvicorn.run(
+            "spaghettihub.server.main:create_app_from_env",
+            factory=True,
+            workers=args.workers,
+            **server_args
+        )
+        return
+
+    app_config = read_config(secret=args.secret)
+    server_config = uvicorn.Config(
+        create_app(config=app_config),
+        **server_args
+    )
     server = uvicorn.Server(server_config)
     server.run()
@@ -1,7 +1,10 @@
+import os
 from dataclasses import dataclass
 
 from sqlalchemy import URL
 
+ENV_PREFIX = "SPAGHETTIHUB_"
+
 
 @dataclass
 class DatabaseConfig:
@@ -10,6 +13,20 @@ class DatabaseConfig:
     username: str | None = None
     password: str | None = None
     port: int | None = None
+    # Connections kept open by each process, and how many more can be opened when they are all checked out. Every
+    # server worker has its own pool: `workers * (pool_size + max_overflow)` (see `max_connections`), plus the
+    # connections of the temporal worker and of the scripts, must stay below the max_connections of postgres minus its
+    # superuser_reserved_connections, or the requests fail with "too many clients" under load
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = False
+    # Number of asyncpg prepared statements cached on each connection
+    statement_cache_size: int = 100
+    isolation_level: str = "REPEATABLE READ"
+
+    def max_connections(self, workers: int = 1) -> int:
+        """The most connections `workers` processes can open."""
+        return workers * (self.pool_size + self.max_overflow)
 
     @property
     def dsn(self) -> URL:
@@ -28,19 +45,40 @@ class Config:
     db: DatabaseConfig | None
     secret: str | None = None
     debug_queries: bool = False
+    # Log the compile and execute time of every statement
+    profile_queries: bool = False
     debug: bool = False
 
 
+def _env(name: str, default: str | None = None) -> str | None:
+    return os.environ.get(ENV_PREFIX + name, default)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = _env(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
 def read_config(secret: str | None = None) -> Config:
+    """
+    Read the configuration from the `SPAGHETTIHUB_*` environment variables, falling back to the development defaults.
+    """
     return Config(
-        # TODO: do not hardcode this
         DatabaseConfig(
-            "spaghettihub",
-            "localhost",
-            "spaghettihub",
-            "spaghettihub",
-            5432
+            _env("DB_NAME", "spaghettihub"),
+            _env("DB_HOST", "localhost"),
+            _env("DB_USERNAME", "spaghettihub"),
+            _env("DB_PASSWORD", "spaghettihub"),
+            int(_env("DB_PORT", "5432")),
+            pool_size=int(_env("DB_POOL_SIZE", "5")),
+            max_overflow=int(_env("DB_MAX_OVERFLOW", "10")),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", False),
+            statement_cache_size=int(_env("DB_STATEMENT_CACHE_SIZE", "100")),
+            isolation_level=_env("DB_ISOLATION_LEVEL", "REPEATABLE READ"),
         ),
-        secret=secret,
-        debug_queries=False,
-        debug=False)
+        secret=secret if secret is not None else _env("SECRET"),
+        debug_queries=_env_bool("DEBUG_QUERIES", False),
+        profile_queries=_env_bool("PROFILE_QUERIES", False),
+        debug=_env_bool("DEBUG", False))
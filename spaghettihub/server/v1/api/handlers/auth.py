@@ -1,17 +1,12 @@
-from pathlib import Path
-
 from fastapi import Depends, Form, HTTPException
 from starlette import status
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
-from starlette.templating import Jinja2Templates
 
 from spaghettihub.common.services.collection import ServiceCollection
 from spaghettihub.server.base.api.base import Handler, handler
 from spaghettihub.server.v1.api import services
-
-templates_path = Path(__file__).resolve().parent.parent / 'templates'
-templates = Jinja2Templates(directory=str(templates_path))
+from spaghettihub.server.v1.api.templating import page_cache, templates
 
 
 class AuthHandler(Handler):
@@ -32,9 +27,7 @@ class AuthHandler(Handler):
         """
         Serve the search page.
         """
-        return templates.TemplateResponse(
-            "login.html", {"request": request}
-        )
+        return page_cache.render(request, "login.html")
 
     @handler(
         path="/login",
@@ -1,20 +1,29 @@
-from pathlib import Path
+from typing import AsyncIterator
 
-from fastapi import Depends, Request
-from starlette.templating import Jinja2Templates
+from fastapi import Depends, HTTPException, Request
+from starlette import status
+from starlette.responses import StreamingResponse
 
 from spaghettihub.common.services.collection import ServiceCollection
 from spaghettihub.server.base.api.base import Handler, handler
-from spaghettihub.server.v1.api import services
+from spaghettihub.server.v1.api import authenticated, services
 from spaghettihub.server.v1.api.models.requests.base import PaginationParams
-from spaghettihub.server.v1.api.models.requests.bugs import BugsSearchParam
+from spaghettihub.server.v1.api.models.requests.bugs import (
+    DEFAULT_COMMENTS_PAGE_SIZE, DEFAULT_MAX_COMMENTS,
+    BugCommentsPaginationParams, BugsSearchApiParam, BugsSearchFields,
+    BugsSearchMode, BugsSearchParam, FindDuplicatesRequest,
+    NearDuplicatesParam)
 from spaghettihub.server.v1.api.models.requests.merge_proposals import \
     MergeProposalMessageMatch
+from spaghettihub.server.v1.api.models.responses.bugs import (
+    BugNeighboursListResponse, BugSearchResultResponse,
+    BugSearchResultsListResponse, BugsIndexResponse,
+    DuplicatesListResponse,
+    DuplicatesResponse, NearDuplicateBugsListResponse,
+    NearDuplicateBugsResponse, SimilarBugResponse)
 from spaghettihub.server.v1.api.models.responses.merge_proposals import (
     MergeProposalResponse, MergeProposalsListResponse)
-
-templates_path = Path(__file__).resolve().parent.parent / 'templates'
-templates = Jinja2Templates(directory=str(templates_path))
+from spaghettihub.server.v1.api.templating import page_cache, templates
 
 
 class BugsHandler(Handler):
@@ -33,12 +42,7 @@ class BugsHandler(Handler):
         """
         Serve the search page.
         """
-        return templates.TemplateResponse(
-            "bugs.html", {"request": request,
-                          "user": request.session.get("username", None),
-                          "size": 5,
-                          "query": ""}
-        )
+        return page_cache.render(request, "bugs.html", {"size": 5, "query": ""})
 
     @handler(
         path="/bugs:search",
@@ -54,11 +58,227 @@ class BugsHandler(Handler):
         pagination_params: PaginationParams = Depends(),
         search: BugsSearchParam = Depends(),
     ):
-        bugs = await services.embeddings_service.find_similar_issues(search.query, pagination_params.size)
+        # The other comments of the results are loaded on demand, from get_bug_comments
+        bugs = await services.embeddings_service.find_similar_issues(
+            search.query, pagination_params.size, bug_filter=search.to_filter(),
+            hybrid=search.mode == BugsSearchMode.HYBRID, max_comments=DEFAULT_MAX_COMMENTS
+        )
         return templates.TemplateResponse(
             "bugs.html", {"request": request,
                           "user": request.session.get("username", None),
                           "results": bugs,
                           "query": search.query,
-                          "size": pagination_params.size}
+                          "size": pagination_params.size,
+                          "mode": search.mode.value,
+                          "status": search.status,
+                          "importance": search.importance,
+                          "project": search.project,
+                          "tag": search.tag,
+                          "created_after": search.created_after or "",
+                          "created_before": search.created_before or "",
+                          "comments_page_size": DEFAULT_COMMENTS_PAGE_SIZE}
+        )
+
+    @handler(
+        path="/bugs-json:search",
+        methods=["GET"],
+        tags=TAGS,
+        responses={
+            200: {
+                "model": BugSearchResultsListResponse,
+            }
+        },
+        response_model_exclude_none=True,
+        status_code=200,
+    )
+    async def find_similar_bugs(
+        self,
+        services: ServiceCollection = Depends(services),
+        pagination_params: PaginationParams = Depends(),
+        search: BugsSearchApiParam = Depends(),
+    ):
+        """
+        Semantic search of the bugs, as JSON. The results are streamed as they are loaded, best first.
+        """
+        # The search itself runs before the response is started, so that its errors get their own status code: only
+        # the loading of the bugs found is streamed
+        embedding, results = await services.embeddings_service.search_similar_issues(
+            search.query,
+            pagination_params.size,
+            min_score=search.min_score,
+            bug_filter=search.to_filter(),
+            hybrid=search.mode == BugsSearchMode.HYBRID,
         )
+        bugs = services.embeddings_service.load_similar_issues(
+            embedding, results, max_comments=search.max_comments
+        )
+        full = search.fields == BugsSearchFields.FULL
+
+        async def content() -> AsyncIterator[str]:
+            yield '{"kind":"' + BugSearchResultsListResponse(items=[]).kind + '","items":['
+            separator = ""
+            async for bug in bugs:
+                yield separator + BugSearchResultResponse.from_model(bug, full).json(exclude_none=True)
+                separator = ","
+            yield "]}"
+
+        return StreamingResponse(content(), media_type="application/json")
+
+    @handler(
+        path="/bugs:find_duplicates",
+        methods=["POST"],
+        tags=TAGS,
+        responses={
+            200: {
+                "model": DuplicatesListResponse,
+            }
+        },
+        response_model_exclude_none=True,
+        status_code=200,
+        dependencies=[Depends(authenticated)]
+    )
+    async def find_duplicates(
+        self,
+        duplicates_request: FindDuplicatesRequest,
+        services: ServiceCollection = Depends(services),
+    ) -> DuplicatesListResponse:
+        """
+        The bugs most similar to each of the queries (i.e. the texts of new bugs), scored in a single pass.
+        """
+        duplicates = await services.embeddings_service.find_duplicates(
+            duplicates_request.queries, duplicates_request.size, duplicates_request.min_score
+        )
+        return DuplicatesListResponse(
+            items=[
+                DuplicatesResponse(
+                    query=query,
+                    items=[SimilarBugResponse.from_model(
+                        entity=bug) for bug in bugs]
+                )
+                for query, bugs in zip(duplicates_request.queries, duplicates)
+            ]
+        )
+
+    @handler(
+        path="/bugs:near_duplicates",
+        methods=["GET"],
+        tags=TAGS,
+        responses={
+            200: {
+                "model": NearDuplicateBugsListResponse,
+            }
+        },
+        response_model_exclude_none=True,
+        status_code=200,
+        dependencies=[Depends(authenticated)]
+    )
+    async def find_near_duplicates(
+        self,
+        services: ServiceCollection = Depends(services),
+        near_duplicates_param: NearDuplicatesParam = Depends(),
+    ) -> NearDuplicateBugsListResponse:
+        """
+        Report of the most similar pairs of bugs in the whole corpus. Every call compares all the bugs with each other.
+        """
+        pairs = await services.embeddings_service.find_near_duplicates(
+            near_duplicates_param.min_score, near_duplicates_param.size
+        )
+        return NearDuplicateBugsListResponse(
+            items=[NearDuplicateBugsResponse.from_model(
+                entity=pair) for pair in pairs]
+        )
+
+    @handler(
+        path="/bugs/{bug_id}/similar",
+        methods=["GET"],
+        tags=TAGS,
+        responses={
+            200: {
+                "model": BugNeighboursListResponse,
+            }
+        },
+        response_model_exclude_none=True,
+        status_code=200,
+    )
+    async def get_similar_bugs(
+        self,
+        bug_id: int,
+        services: ServiceCollection = Depends(services),
+    ) -> BugNeighboursListResponse:
+        """
+        The bugs most similar to a bug, best first, as last computed by the neighbours job.
+        """
+        neighbours = await services.bug_neighbours_service.get_neighbours(bug_id)
+        if not neighbours and await services.bugs_service.find_bug_by_id(bug_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Bug {bug_id} not found.",
+            )
+        return BugNeighboursListResponse(
+            items=[SimilarBugResponse(id=neighbour.neighbour_id, score=neighbour.score) for neighbour in neighbours]
+        )
+
+    @handler(
+        path="/bugs/{bug_id}/comments",
+        methods=["GET"],
+        tags=TAGS,
+        response_model_exclude_none=True,
+        status_code=200,
+    )
+    async def get_bug_comments(
+        self,
+        bug_id: int,
+        request: Request,
+        services: ServiceCollection = Depends(services),
+        pagination_params: BugCommentsPaginationParams = Depends(),
+    ):
+        """
+        A page of the comments of a bug, in the order they were posted, as an HTML fragment. The search page only
+        renders the best scored comments of every result, and loads the others from here on demand.
+        """
+        comments = await services.bugs_service.get_bug_comments_page(
+            bug_id, pagination_params.size, pagination_params.page)
+        if not comments.total and await services.bugs_service.find_bug_by_id(bug_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Bug {bug_id} not found.",
+            )
+        has_next_page = pagination_params.page * pagination_params.size < comments.total
+        return templates.TemplateResponse(
+            "bug_comments.html", {"request": request,
+                                  "bug_id": bug_id,
+                                  "comments": comments.items,
+                                  "first_number": (pagination_params.page - 1) * pagination_params.size + 1,
+                                  "next_page": pagination_params.page + 1 if has_next_page else None,
+                                  "size": pagination_params.size}
+        )
+
+    @handler(
+        path="/bugs/indexes/{project}:refresh",
+        methods=["POST"],
+        tags=TAGS,
+        responses={
+            200: {
+                "model": BugsIndexResponse,
+            }
+        },
+        response_model_exclude_none=True,
+        status_code=200,
+        dependencies=[Depends(authenticated)]
+    )
+    async def refresh_bugs_index(
+        self,
+        project: str,
+        services: ServiceCollection = Depends(services),
+    ) -> BugsIndexResponse:
+        """
+        Reload the index of the bugs of a project, i.e. once a crawl stored new bugs or embeddings. The indexes of the
+        other projects are not reloaded.
+        """
+        if project not in await services.bugs_service.find_projects():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Project {project} not found.",
+            )
+        index = await services.embeddings_service.refresh_index(project)
+        return BugsIndexResponse.from_model(project, index)
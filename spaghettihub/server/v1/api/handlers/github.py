@@ -1,14 +1,71 @@
-from pathlib import Path
+import json
+import time
+from typing import AsyncIterator, List
 
-from fastapi import Depends, Form, Request
-from starlette.templating import Jinja2Templates
+from fastapi import BackgroundTasks, Depends, Form, HTTPException, Request
+from starlette import status
+from starlette.responses import StreamingResponse
 
+from spaghettihub.common.db.notifications import Subscription
+from spaghettihub.common.models.github import LaunchpadToGithubWork
 from spaghettihub.common.services.collection import ServiceCollection
 from spaghettihub.server.base.api.base import Handler, handler
 from spaghettihub.server.v1.api import authenticated, services
+from spaghettihub.server.v1.api.templating import templates
 
-templates_path = Path(__file__).resolve().parent.parent / 'templates'
-templates = Jinja2Templates(directory=str(templates_path))
+
+# Maximum number of merge proposals submitted at once
+MAX_BATCH_SIZE = 50
+# Seconds between two keep-alive comments on an event stream
+EVENTS_KEEP_ALIVE_INTERVAL = 15
+# An event stream is closed after this many seconds, the browser connects again
+EVENTS_STREAM_DURATION = 300
+
+
+def _status_event(work: LaunchpadToGithubWork) -> str:
+    return _event(work.json(include={"request_uuid", "batch_uuid", "status", "github_url"}))
+
+
+def _event(data: str) -> str:
+    return f"event: status\ndata: {data}\n\n"
+
+
+def _status_page_context(status_page: str, works: List[LaunchpadToGithubWork]) -> dict:
+    """
+    While any of the works is running, the page subscribes to the status events, and reloads `status_page` when one of
+    the statuses differs from the rendered one.
+    """
+    if all(work.status != "NEW" for work in works):
+        return {"status_page": None}
+    return {"status_page": status_page, "statuses": {work.request_uuid: work.status for work in works}}
+
+
+def _stream_status_events(subscription: Subscription, works: List[LaunchpadToGithubWork]) -> StreamingResponse:
+    """
+    Stream the current status of the works, then their changes until they are all completed.
+    """
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            for work in works:
+                yield _status_event(work)
+            pending = {work.request_uuid for work in works if work.status == "NEW"}
+            deadline = time.monotonic() + EVENTS_STREAM_DURATION
+            while pending and time.monotonic() < deadline:
+                payload = await subscription.get(timeout=EVENTS_KEEP_ALIVE_INTERVAL)
+                if payload is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                pending.discard(json.loads(payload)["request_uuid"])
+                yield _event(payload)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 class LaunchpadToGithubWorkHandler(Handler):
@@ -44,15 +101,20 @@ class LaunchpadToGithubWorkHandler(Handler):
     async def create_launchpad_to_github_work(
             self,
             request: Request,
+            background_tasks: BackgroundTasks,
             launchpad_url: str = Form(),
             services: ServiceCollection = Depends(services)
     ):
         work = await services.launchpad_to_github_work_service.create(launchpad_url)
+        # Runs once the response is sent, so after the transaction is committed: the workflow can always find the
+        # request and the connection is not held while talking to temporal.
+        background_tasks.add_task(
+            services.launchpad_to_github_work_service.start_workflow, work)
         return templates.TemplateResponse(
             "launchpad_to_github.html",
             {"request": request,
              "work": work,
-             "refresh_page": "/v1/launchpad_to_github/" + work.request_uuid,
+             **_status_page_context("/v1/launchpad_to_github/" + work.request_uuid, [work]),
              "launchpad_url": work.launchpad_url
              }
         )
@@ -76,7 +138,134 @@ class LaunchpadToGithubWorkHandler(Handler):
             "launchpad_to_github.html",
             {"request": request,
              "work": work,
-             "refresh_page": "/v1/launchpad_to_github/" + work.request_uuid if work.status == "NEW" else None,
+             **_status_page_context("/v1/launchpad_to_github/" + work.request_uuid, [work]),
              "launchpad_url": work.launchpad_url
              }
         )
+
+    @handler(
+        path="/launchpad_to_github/{work_id}/events",
+        methods=["GET"],
+        tags=TAGS,
+        response_model_exclude_none=True,
+        status_code=200,
+        dependencies=[Depends(authenticated)]
+    )
+    async def get_launchpad_to_github_work_events(
+            self,
+            work_id: str,
+            services: ServiceCollection = Depends(services)
+    ):
+        """
+        Server-Sent Events stream of the status of a request.
+        """
+        subscription = await services.launchpad_to_github_work_service.subscribe(work_id)
+        try:
+            work = await services.launchpad_to_github_work_service.get(work_id)
+        except BaseException:
+            subscription.close()
+            raise
+        if work is None:
+            subscription.close()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found.",
+            )
+        return _stream_status_events(subscription, [work])
+
+    @handler(
+        path="/launchpad_to_github:batch",
+        methods=["POST"],
+        tags=TAGS,
+        response_model_exclude_none=True,
+        status_code=202,
+        dependencies=[Depends(authenticated)]
+    )
+    async def create_launchpad_to_github_batch(
+            self,
+            request: Request,
+            background_tasks: BackgroundTasks,
+            launchpad_urls: str = Form(),
+            services: ServiceCollection = Depends(services)
+    ):
+        """
+        Convert many merge proposals at once. `launchpad_urls` holds one url per line.
+        """
+        # Keep the order of submission, dropping blank lines and duplicates
+        urls = list(dict.fromkeys(
+            url.strip() for url in launchpad_urls.splitlines() if url.strip()))
+        if not urls or len(urls) > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Submit between 1 and {MAX_BATCH_SIZE} merge proposals.",
+            )
+        works = await services.launchpad_to_github_work_service.create_batch(urls)
+        background_tasks.add_task(
+            services.launchpad_to_github_work_service.start_batch_workflow, works)
+        return templates.TemplateResponse(
+            "launchpad_to_github_batch.html",
+            {"request": request,
+             "user": request.session.get("username", None),
+             "works": works,
+             **_status_page_context("/v1/launchpad_to_github/batches/" + works[0].batch_uuid, works)
+             }
+        )
+
+    @handler(
+        path="/launchpad_to_github/batches/{batch_id}",
+        methods=["GET"],
+        tags=TAGS,
+        response_model_exclude_none=True,
+        status_code=200,
+        dependencies=[Depends(authenticated)]
+    )
+    async def get_launchpad_to_github_batch(
+            self,
+            request: Request,
+            batch_id: str,
+            services: ServiceCollection = Depends(services)
+    ):
+        works = await services.launchpad_to_github_work_service.get_batch(batch_id)
+        if not works:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Batch not found.",
+            )
+        return templates.TemplateResponse(
+            "launchpad_to_github_batch.html",
+            {"request": request,
+             "user": request.session.get("username", None),
+             "works": works,
+             **_status_page_context("/v1/launchpad_to_github/batches/" + batch_id, works)
+             }
+        )
+
+    @handler(
+        path="/launchpad_to_github/batches/{batch_id}/events",
+        methods=["GET"],
+        tags=TAGS,
+        response_model_exclude_none=True,
+        status_code=200,
+        dependencies=[Depends(authenticated)]
+    )
+    async def get_launchpad_to_github_batch_events(
+            self,
+            batch_id: str,
+            services: ServiceCollection = Depends(services)
+    ):
+        """
+        Server-Sent Events stream of the status of the requests of a batch.
+        """
+        subscription = await services.launchpad_to_github_work_service.subscribe(batch_id)
+        try:
+            works = await services.launchpad_to_github_work_service.get_batch(batch_id)
+        except BaseException:
+            subscription.close()
+            raise
+        if not works:
+            subscription.close()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Batch not found.",
+            )
+        return _stream_status_events(subscription, works)
@@ -1,7 +1,4 @@
-from pathlib import Path
-
 from fastapi import Depends, Request
-from starlette.templating import Jinja2Templates
 
 from spaghettihub.common.services.collection import ServiceCollection
 from spaghettihub.server.base.api.base import Handler, handler
@@ -11,9 +8,7 @@ from spaghettihub.server.v1.api.models.requests.merge_proposals import \
     MergeProposalMessageMatch
 from spaghettihub.server.v1.api.models.responses.merge_proposals import (
     MergeProposalResponse, MergeProposalsListResponse)
-
-templates_path = Path(__file__).resolve().parent.parent / 'templates'
-templates = Jinja2Templates(directory=str(templates_path))
+from spaghettihub.server.v1.api.templating import page_cache, templates
 
 
 class MergeProposalsHandler(Handler):
@@ -32,11 +27,7 @@ class MergeProposalsHandler(Handler):
         """
         Serve the search page.
         """
-        return templates.TemplateResponse(
-            "merge_proposals.html", {
-                "request": request, "user": request.session.get("username", None), "size": 5,
-                "query": ""}
-        )
+        return page_cache.render(request, "merge_proposals.html", {"size": 5, "query": ""})
 
     @handler(
         path="/merge_proposals:search",
@@ -1,6 +1,90 @@
+from datetime import date, datetime, time, timedelta, timezone
+from enum import Enum
+from typing import List, Literal
+
 from fastapi import Query
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from spaghettihub.common.models.bugs import BugFilter
+from spaghettihub.server.v1.api.models.requests.base import PaginationParams
+
+DEFAULT_MAX_COMMENTS = 3
+MAX_COMMENTS = 50
+DEFAULT_COMMENTS_PAGE_SIZE = 20
+MAX_COMMENTS_PAGE_SIZE = 100
+DEFAULT_NEAR_DUPLICATES = 20
+MAX_NEAR_DUPLICATES = 100
+MIN_NEAR_DUPLICATES_SCORE = 0.5
+
+
+class BugsSearchMode(str, Enum):
+    # Semantic search of the embeddings
+    VECTOR = "vector"
+    # Fusion of the semantic search and of a BM25 search of the terms of the query
+    HYBRID = "hybrid"
 
 
 class BugsSearchParam(BaseModel):
     query: str = Field(Query())
+    mode: BugsSearchMode = Field(Query(default=BugsSearchMode.VECTOR))
+    # A bug matches a list if it matches any of its values (i.e. ?status=New&status=Triaged)
+    status: List[str] = Field(Query(default=[]))
+    importance: List[str] = Field(Query(default=[]))
+    project: List[str] = Field(Query(default=[]))
+    tag: List[str] = Field(Query(default=[]))
+    # Inclusive. YYYY-MM-DD, or empty as submitted by the search form when the date is not set
+    created_after: date | Literal[""] | None = Field(Query(default=None))
+    created_before: date | Literal[""] | None = Field(Query(default=None))
+
+    @field_validator("status", "importance", "project", "tag")
+    @classmethod
+    def drop_empty_values(cls, values: List[str]) -> List[str]:
+        return [value for value in values if value]
+
+    def to_filter(self) -> BugFilter:
+        return BugFilter(
+            statuses=self.status or None,
+            importances=self.importance or None,
+            projects=self.project or None,
+            tags=self.tag or None,
+            created_after=datetime.combine(self.created_after, time.min, timezone.utc)
+            if self.created_after else None,
+            # The filter excludes its upper bound: stop at the end of the day
+            created_before=datetime.combine(self.created_before + timedelta(days=1), time.min, timezone.utc)
+            if self.created_before else None,
+        )
+
+
+class BugsSearchFields(str, Enum):
+    # Only the ids, links and scores
+    IDS = "ids"
+    # The texts of the bugs as well
+    FULL = "full"
+
+
+class BugsSearchApiParam(BugsSearchParam):
+    fields: BugsSearchFields = Field(Query(default=BugsSearchFields.FULL))
+    min_score: float | None = Field(Query(default=None, ge=-1, le=1))
+    max_comments: int = Field(Query(default=DEFAULT_MAX_COMMENTS, ge=0, le=MAX_COMMENTS))
+
+
+class BugCommentsPaginationParams(PaginationParams):
+    """Pagination of the comments of a bug: smaller pages, as every comment can be long."""
+
+    size: int = Field(Query(default=DEFAULT_COMMENTS_PAGE_SIZE, ge=1, le=MAX_COMMENTS_PAGE_SIZE))
+
+
+MAX_DUPLICATES_QUERIES = 100
+MAX_DUPLICATES_PER_QUERY = 50
+
+
+class FindDuplicatesRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=MAX_DUPLICATES_QUERIES)
+    size: int = Field(default=5, ge=1, le=MAX_DUPLICATES_PER_QUERY)
+    min_score: float | None = Field(default=None, ge=-1, le=1)
+
+
+class NearDuplicatesParam(BaseModel):
+    # The report compares every bug with all the others: a low score would keep most of the pairs of every block
+    min_score: float = Field(Query(default=0.95, ge=MIN_NEAR_DUPLICATES_SCORE, le=1))
+    size: int = Field(Query(default=DEFAULT_NEAR_DUPLICATES, ge=1, le=MAX_NEAR_DUPLICATES))
@@ -0,0 +1,115 @@
+from typing import List
+
+from spaghettihub.common.models.bugs import (BugCommentWithScore,
+                                             BugWithCommentsAndScores,
+                                             NearDuplicateBugs, SimilarBug)
+from spaghettihub.common.services.embeddings_index import EmbeddingsIndex
+from spaghettihub.server.v1.api.models.responses.base import BaseResponse
+
+
+class BugCommentSearchResultResponse(BaseResponse):
+    kind: str = "BugCommentSearchResult"
+    id: int
+    score: float
+    content: str | None = None
+
+    @staticmethod
+    def from_model(entity: BugCommentWithScore, full: bool) -> "BugCommentSearchResultResponse":
+        return BugCommentSearchResultResponse(
+            id=entity.bug_comment.id,
+            score=entity.score,
+            content=entity.bug_comment.text.ref.content if full else None
+        )
+
+
+class BugSearchResultResponse(BaseResponse):
+    kind: str = "BugSearchResult"
+    id: int
+    web_link: str
+    score: float
+    title_score: float
+    description_score: float
+    title: str | None = None
+    description: str | None = None
+    comments: List[BugCommentSearchResultResponse]
+    # The number of comments of the bug, the others are served by /bugs/{id}/comments
+    comments_count: int | None = None
+
+    @staticmethod
+    def from_model(entity: BugWithCommentsAndScores, full: bool) -> "BugSearchResultResponse":
+        return BugSearchResultResponse(
+            id=entity.bug.id,
+            web_link=entity.bug.web_link,
+            score=entity.score,
+            title_score=entity.title_score,
+            description_score=entity.description_score,
+            title=entity.bug.title.ref.content if full else None,
+            description=entity.bug.description.ref.content if full else None,
+            comments=[
+                BugCommentSearchResultResponse.from_model(comment, full)
+                for comment in entity.comments
+            ],
+            comments_count=entity.comments_count,
+        )
+
+
+class BugSearchResultsListResponse(BaseResponse):
+    kind: str = "BugSearchResultsList"
+    items: List[BugSearchResultResponse]
+
+
+class SimilarBugResponse(BaseResponse):
+    kind: str = "SimilarBug"
+    id: int
+    score: float
+
+    @staticmethod
+    def from_model(entity: SimilarBug) -> "SimilarBugResponse":
+        return SimilarBugResponse(id=entity.bug_id, score=entity.score)
+
+
+class DuplicatesResponse(BaseResponse):
+    kind: str = "Duplicates"
+    query: str
+    items: List[SimilarBugResponse]
+
+
+class DuplicatesListResponse(BaseResponse):
+    kind: str = "DuplicatesList"
+    items: List[DuplicatesResponse]
+
+
+class NearDuplicateBugsResponse(BaseResponse):
+    kind: str = "NearDuplicateBugs"
+    id: int
+    other_id: int
+    score: float
+
+    @staticmethod
+    def from_model(entity: NearDuplicateBugs) -> "NearDuplicateBugsResponse":
+        return NearDuplicateBugsResponse(id=entity.bug_id, other_id=entity.other_bug_id, score=entity.score)
+
+
+class NearDuplicateBugsListResponse(BaseResponse):
+    kind: str = "NearDuplicateBugsList"
+    items: List[NearDuplicateBugsResponse]
+
+
+class BugsIndexResponse(BaseResponse):
+    kind: str = "BugsIndex"
+    project: str
+    bugs: int
+    texts: int
+
+    @staticmethod
+    def from_model(project: str, index: EmbeddingsIndex) -> "BugsIndexResponse":
+        return BugsIndexResponse(
+            project=project,
+            bugs=len(index.bugs),
+            texts=len(index)
+        )
+
+
+class BugNeighboursListResponse(BaseResponse):
+    kind: str = "BugNeighboursList"
+    items: List[SimilarBugResponse]
@@ -0,0 +1,69 @@
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Hashable, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+from starlette.templating import Jinja2Templates
+
+templates_path = Path(__file__).resolve().parent / 'templates'
+
+# Shared by all the handlers. The templates do not change while the server runs, so they are never checked for
+# updates, and their compiled code is cached on disk for the next start.
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader(str(templates_path)),
+        autoescape=True,
+        auto_reload=False,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+)
+
+
+def precompile_templates() -> None:
+    """Compile all the templates, so that the first requests do not pay for it."""
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.get_template(name)
+
+
+class PageCache:
+    """
+    Cache of the pages rendered for anonymous users, which only depend on the template and on its context. A page is
+    rendered once, and served with an ETag so that the browser can revalidate it and get a 304 instead.
+    """
+
+    def __init__(self):
+        self._pages: Dict[Tuple[str, Tuple[Tuple[str, Hashable], ...]], Tuple[bytes, str]] = {}
+
+    def _render(self, request: Request, name: str, context: Dict[str, Any]) -> Tuple[bytes, str]:
+        key = (name, tuple(sorted(context.items())))
+        page = self._pages.get(key)
+        if page is None:
+            content = templates.get_template(name).render(
+                {"request": request, "user": None, **context}).encode()
+            page = (content, '"' + hashlib.sha1(content).hexdigest() + '"')
+            self._pages[key] = page
+        return page
+
+    def render(self, request: Request, name: str, context: Dict[str, Any] | None = None) -> Response:
+        context = context or {}
+        if user := request.session.get("username", None):
+            return templates.TemplateResponse(
+                name, {"request": request, "user": user, **context},
+                headers={"Cache-Control": "private, no-store"})
+
+        content, etag = self._render(request, name, context)
+        headers = {
+            "ETag": etag,
+            # The browser revalidates the page on every use, the same url renders differently once logged in
+            "Cache-Control": "no-cache",
+            "Vary": "Cookie",
+        }
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return HTMLResponse(content, headers=headers)
+
+
+page_cache = PageCache()
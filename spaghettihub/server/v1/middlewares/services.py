@@ -1,37 +1,27 @@
-import time
-from contextlib import asynccontextmanager
-from typing import Any, AsyncIterator, Awaitable, Callable
-
-from fastapi import Request, Response
-from sqlalchemy import event
-from sqlalchemy.ext.asyncio import AsyncConnection
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from spaghettihub.common.db.base import ConnectionProvider
 from spaghettihub.common.services.collection import ServiceCollection
-from spaghettihub.common.services.embeddings import EmbeddingsCache
-from spaghettihub.server.base.db.database import Database
 
 
-class ServicesV1Middleware(BaseHTTPMiddleware):
-    """Run a request in a transaction, handling commit/rollback.
+class ServicesV1Middleware:
+    """Make the services available as `request.state.services`.
 
-    This makes the database connection available as `request.state.conn`.
+    The services are built once and shared by all the requests: only the connection set up by the
+    `TransactionMiddleware` is bound to the request context.
     """
 
-    def __init__(self, app: ASGIApp, embeddings_cache: EmbeddingsCache):
-        super().__init__(app)
-        self.embeddings_cache = embeddings_cache
+    def __init__(self, app: ASGIApp, connection_provider: ConnectionProvider, services: ServiceCollection):
+        self.app = app
+        self.connection_provider = connection_provider
+        self.services = services
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: Callable[[Request], Awaitable[Response]],
-    ) -> Response:
-        connection_provider = ConnectionProvider(
-            current_connection=request.state.conn)
-        request.state.services = ServiceCollection.produce(
-            connection_provider, embeddings_cache=self.embeddings_cache)
-        response = await call_next(request)
-        return response
+        state = scope.setdefault("state", {})
+        state["services"] = self.services
+        with self.connection_provider.bind(state["conn"]):
+            await self.app(scope, receive, send)
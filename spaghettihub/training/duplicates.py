@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from transformers import AutoModel, AutoTokenizer
+
+from spaghettihub.common.db.base import ConnectionProvider
+from spaghettihub.common.services.collection import ServiceCollection
+from spaghettihub.common.services.embeddings import EmbeddingsCache
+from spaghettihub.server.settings import read_config
+
+
+async def async_main():
+    parser = argparse.ArgumentParser(
+        description="Find the bugs duplicating the texts read from stdin (one per line), or report the most similar "
+                    "pairs of bugs.",
+    )
+    parser.add_argument(
+        "-n", "--size", type=int, default=5, help="Number of bugs per text, or of pairs in the report"
+    )
+    parser.add_argument(
+        "-s", "--min-score", type=float, default=None, help="Minimum similarity"
+    )
+    parser.add_argument(
+        "--report", action="store_true", help="Report the most similar pairs of bugs of the whole corpus"
+    )
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="Compare the results with the ones of the exhaustive search, that scores all the texts"
+    )
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        read_config().db.dsn
+    )
+    embeddings_cache = EmbeddingsCache(
+        model=AutoModel.from_pretrained("BAAI/bge-large-en-v1.5"),
+        tokenizer=AutoTokenizer.from_pretrained("BAAI/bge-large-en-v1.5")
+    )
+    async with engine.connect() as conn:
+        async with conn.begin():
+            services = ServiceCollection.produce(
+                ConnectionProvider(current_connection=conn), embeddings_cache=embeddings_cache)
+            if args.report:
+                pairs = await services.embeddings_service.find_near_duplicates(
+                    args.min_score if args.min_score is not None else 0.95, args.size
+                )
+                for pair in pairs:
+                    print(pair.json())
+            else:
+                queries = [line.strip() for line in sys.stdin if line.strip()]
+                duplicates = await services.embeddings_service.find_duplicates(
+                    queries, args.size, args.min_score
+                )
+                if not args.compare:
+                    for query, bugs in zip(queries, duplicates):
+                        print(json.dumps({"query": query, "bugs": [bug.dict() for bug in bugs]}))
+                else:
+                    exhaustive_duplicates = await services.embeddings_service.find_duplicates(
+                        queries, args.size, args.min_score, exhaustive=True
+                    )
+                    recalls = []
+                    for query, bugs, exhaustive_bugs in zip(queries, duplicates, exhaustive_duplicates):
+                        expected = {bug.bug_id for bug in exhaustive_bugs}
+                        found = {bug.bug_id for bug in bugs}
+                        recall = len(expected & found) / len(expected) if expected else 1.0
+                        recalls.append(recall)
+                        print(json.dumps({"query": query, "recall": recall,
+                                          "missing": sorted(expected - found)}))
+                    if recalls:
+                        print(json.dumps({"mean_recall": sum(recalls) / len(recalls)}))
+    await engine.dispose()
+
+
+def main():
+    asyncio.run(async_main())
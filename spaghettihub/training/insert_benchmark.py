@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from spaghettihub.common.db.base import ConnectionProvider
+from spaghettihub.common.db.embeddings import EmbeddingsRepository
+from spaghettihub.common.db.texts import TextsRepository
+from spaghettihub.common.models.embeddings import EmbeddingRow
+from spaghettihub.common.models.texts import TextRow
+from spaghettihub.server.settings import read_config
+
+METHODS = ("create_many", "upsert_many", "copy_many")
+BATCH_SIZES = (1, 100, 10_000)
+
+
+async def measure(engine, method: str, batch_size: int, vectors: np.ndarray) -> float:
+    """The embeddings stored per second by `method`, `batch_size` at a time. Everything is rolled back."""
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        connection_provider = ConnectionProvider(current_connection=conn)
+        texts = await TextsRepository(connection_provider).create_many(
+            [TextRow(None, f"benchmark text {i}") for i in range(len(vectors))]
+        )
+        embeddings = [EmbeddingRow(None, text.id, vector.tobytes()) for text, vector in zip(texts, vectors)]
+        store = getattr(EmbeddingsRepository(connection_provider), method)
+        start = time.perf_counter()
+        for i in range(0, len(embeddings), batch_size):
+            await store(embeddings[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        await transaction.rollback()
+    return len(embeddings) / elapsed
+
+
+async def async_main():
+    parser = argparse.ArgumentParser(
+        description="Measure the embeddings stored per second by create_many (executemany), upsert_many (INSERT ... ON "
+                    "CONFLICT) and copy_many (binary COPY), for every batch size. Everything is rolled back.",
+    )
+    parser.add_argument(
+        "-n", "--rows", type=int, default=10_000, help="Number of embeddings stored by every measure"
+    )
+    parser.add_argument(
+        "-b", "--batch-size", type=int, action="append",
+        help=f"Only measure these batch sizes (default: {', '.join(map(str, BATCH_SIZES))})"
+    )
+    parser.add_argument(
+        "-d", "--dimensions", type=int, default=1024, help="Dimensions of the fake embeddings"
+    )
+    parser.add_argument(
+        "-m", "--method", choices=METHODS, action="append", help="Only measure these methods"
+    )
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        read_config().db.dsn
+    )
+    vectors = np.random.default_rng(0).standard_normal((args.rows, args.dimensions)).astype(np.float32)
+    methods = args.method or METHODS
+    batch_sizes = args.batch_size or BATCH_SIZES
+    rates: Dict[Tuple[str, int], float] = {}
+    for method in methods:
+        for batch_size in batch_sizes:
+            rates[method, batch_size] = await measure(engine, method, batch_size, vectors)
+    await engine.dispose()
+
+    print(f"{'rows/s':<12}" + "".join(f"{f'batch {batch_size}':>14}" for batch_size in batch_sizes))
+    for method in methods:
+        print(f"{method:<12}" + "".join(f"{rates[method, batch_size]:>14.0f}" for batch_size in batch_sizes))
+
+
+def main():
+    asyncio.run(async_main())
@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import aiohttp
+import numpy as np
+
+
+async def run_client(session: aiohttp.ClientSession, url: str, requests: int, latencies: List[float],
+                     errors: List[int]) -> None:
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+                    continue
+        except aiohttp.ClientError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def async_main():
+    parser = argparse.ArgumentParser(
+        description="Send the same request from concurrent clients to a running server, and report the throughput and "
+                    "the latencies. Use it to size the workers and the database pool (see DEVELOPMENT.md).",
+    )
+    parser.add_argument(
+        "-u", "--url", default="http://localhost:8000/v1/bugs-json:search?query=deployment%20fails&size=5&fields=ids",
+        help="The URL to request"
+    )
+    parser.add_argument(
+        "-c", "--concurrency", type=int, default=20, help="Number of concurrent clients"
+    )
+    parser.add_argument(
+        "-n", "--requests", type=int, default=50, help="Number of requests sent by every client"
+    )
+    args = parser.parse_args()
+
+    latencies: List[float] = []
+    errors: List[int] = []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_client(session, args.url, args.requests, latencies, errors) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    # 0 stands for the requests that got no response
+    report = {
+        "requests": args.concurrency * args.requests,
+        "errors": {str(status): errors.count(status) for status in sorted(set(errors))},
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        report.update(p50_ms=round(p50, 1), p95_ms=round(p95, 1), p99_ms=round(p99, 1))
+    print(json.dumps(report))
+
+
+def main():
+    asyncio.run(async_main())
@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from spaghettihub.common.db.base import ConnectionProvider
+from spaghettihub.common.services.collection import ServiceCollection
+from spaghettihub.common.services.embeddings import EmbeddingsCache
+from spaghettihub.server.settings import read_config
+
+
+async def async_main():
+    parser = argparse.ArgumentParser(
+        description="Compute the most similar bugs of the bugs whose texts changed, and of the bugs they could be "
+                    "similar to.",
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="Compute the most similar bugs of every bug"
+    )
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        read_config().db.dsn
+    )
+    # The embeddings are already computed: neither the model nor the lexical index are needed
+    embeddings_cache = EmbeddingsCache(tokenizer=None, model=None, lexical=False)
+    async with engine.connect() as conn:
+        async with conn.begin():
+            services = ServiceCollection.produce(
+                ConnectionProvider(current_connection=conn), embeddings_cache=embeddings_cache)
+            if args.all:
+                refreshed = await services.bug_neighbours_service.refresh_all()
+            else:
+                refreshed = await services.bug_neighbours_service.refresh_stale()
+            print(f"Refreshed the neighbours of {refreshed} bugs")
+    await engine.dispose()
+
+
+def main():
+    asyncio.run(async_main())
@@ -0,0 +1,51 @@
+import argparse
+import timeit
+from typing import Callable
+
+from spaghettihub.common.db.base import ConnectionProvider, LazyConnection
+from spaghettihub.common.services.collection import ServiceCollection
+from spaghettihub.common.services.embeddings import EmbeddingsCache
+
+
+def measure(function: Callable[[], object], number: int, repeat: int) -> float:
+    """The best time of a call to `function`, in microseconds."""
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the per request overhead of the services: building a ServiceCollection (as done per "
+                    "request before the collection was shared), binding the connection of the request, and reading "
+                    "it from a repository. No database is needed.",
+    )
+    parser.add_argument(
+        "-n", "--number", type=int, default=100_000, help="Number of calls per measure"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="Number of measures, the best one is reported"
+    )
+    args = parser.parse_args()
+
+    connection_provider = ConnectionProvider()
+    embeddings_cache = EmbeddingsCache(tokenizer=None, model=None, lexical=False)
+    # Never connects: only the context variable is exercised
+    connection = LazyConnection(engine=None)
+
+    def produce():
+        ServiceCollection.produce(connection_provider, embeddings_cache=embeddings_cache)
+
+    def bind():
+        with connection_provider.bind(connection):
+            pass
+
+    timings = {
+        "ServiceCollection.produce": measure(produce, args.number, args.repeat),
+        "ConnectionProvider.bind": measure(bind, args.number, args.repeat),
+    }
+    with connection_provider.bind(connection):
+        timings["get_current_connection"] = measure(
+            connection_provider.get_current_connection, args.number, args.repeat
+        )
+
+    for name, microseconds in timings.items():
+        print(f"{name:<28}{microseconds:>10.2f} us")
@@ -4,18 +4,19 @@ import asyncio
 from temporalio.client import Client
 from temporalio.worker import Worker
 
-from spaghettihub.common.workflows.constants import TASK_QUEUE_NAME
+from spaghettihub.common.workflows.constants import (TASK_QUEUE_NAME,
+                                                     TEMPORAL_TARGET_HOST)
 from spaghettihub.common.workflows.launchpad_to_github.activities import \
     LaunchpadToGithubActivity
 from spaghettihub.common.workflows.launchpad_to_github.workflow import (
     TemporalInternalLaunchpadToGithubWorkflow,
-    TemporalLaunchpadToGithubWorkflow)
+    TemporalLaunchpadToGithubBatchWorkflow, TemporalLaunchpadToGithubWorkflow)
 from spaghettihub.server.base.db.database import Database
 from spaghettihub.server.settings import read_config
 
 
-async def main(gh_token: str):
-    client = await Client.connect("localhost:7233")
+async def main(gh_token: str, max_concurrent_activities: int):
+    client = await Client.connect(TEMPORAL_TARGET_HOST)
 
     db = Database(config=read_config().db)
 
@@ -24,7 +25,8 @@ async def main(gh_token: str):
         client,
         task_queue=TASK_QUEUE_NAME,
         workflows=[TemporalLaunchpadToGithubWorkflow,
-                   TemporalInternalLaunchpadToGithubWorkflow],
+                   TemporalInternalLaunchpadToGithubWorkflow,
+                   TemporalLaunchpadToGithubBatchWorkflow],
         activities=[
             launchpad_to_github_activity.retrieve_merge_proposal_diff_from_launchpad,
             launchpad_to_github_activity.update_github_master_branch,
@@ -33,8 +35,12 @@ async def main(gh_token: str):
             launchpad_to_github_activity.create_github_pull_request,
             launchpad_to_github_activity.complete_request
         ],
+        max_concurrent_activities=max_concurrent_activities,
     )
-    await worker.run()
+    try:
+        await worker.run()
+    finally:
+        await launchpad_to_github_activity.close()
 
 
 def run():
@@ -43,5 +49,9 @@ def run():
     parser.add_argument("--gh_token",
                         type=str,
                         help="The github token")
+    parser.add_argument("--max-concurrent-activities",
+                        type=int,
+                        default=10,
+                        help="Maximum number of activities (i.e. conversions steps) run in parallel")
     args = parser.parse_args()
-    asyncio.run(main(args.gh_token))
+    asyncio.run(main(args.gh_token, args.max_concurrent_activities))
@@ -0,0 +1,127 @@
+import asyncio
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from spaghettihub.common.workflows.launchpad_to_github import workspace
+from spaghettihub.common.workflows.launchpad_to_github.workspace import (
+    FileLock, WorkspaceManager)
+
+
+def git(*args: str, cwd: Path) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit_file(clone: Path, name: str, content: str) -> None:
+    (clone / name).write_text(content)
+    git("add", name, cwd=clone)
+    git("commit", "-m", f"Add {name}", cwd=clone)
+    git("push", "origin", "HEAD:master", cwd=clone)
+
+
+@pytest.fixture
+def remotes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> dict:
+    """Local bare repositories standing in for GitHub, the fork and Launchpad, with a clone of each."""
+    for variable in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(variable, "test")
+    for variable in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(variable, "test@example.com")
+    clones = {}
+    for name, attribute in (("github", "GITHUB_REMOTE"), ("fork", "FORK_REMOTE"), ("lp", "LAUNCHPAD_REMOTE")):
+        bare = tmp_path / "remotes" / f"{name}.git"
+        bare.mkdir(parents=True)
+        git("init", "--bare", "--initial-branch", "master", cwd=bare)
+        clone = tmp_path / "clones" / name
+        clone.mkdir(parents=True)
+        git("init", "--initial-branch", "master", cwd=clone)
+        git("remote", "add", "origin", str(bare), cwd=clone)
+        commit_file(clone, "README", "MAAS\n")
+        monkeypatch.setattr(workspace, attribute, (name, str(bare)))
+        clones[name] = clone
+    # The remotes share their first commit
+    for name in ("github", "fork"):
+        git("fetch", str(clones["lp"]), "master", cwd=clones[name])
+        git("reset", "--hard", "FETCH_HEAD", cwd=clones[name])
+        git("push", "--force", "origin", "HEAD:master", cwd=clones[name])
+    return clones
+
+
+@pytest.fixture
+def manager(tmp_path: Path, remotes: dict) -> WorkspaceManager:
+    return WorkspaceManager(mirror_dir=str(tmp_path / "mirror"), work_dir=str(tmp_path / "work"))
+
+
+def remote_file(clone: Path, branch: str, name: str) -> str:
+    git("fetch", "origin", branch, cwd=clone)
+    return git("show", f"FETCH_HEAD:{name}", cwd=clone)
+
+
+def test_ensure_mirror_creates_bare_repository_with_sync_worktree(manager: WorkspaceManager):
+    asyncio.run(manager.ensure_mirror())
+
+    assert git("rev-parse", "--is-bare-repository", cwd=manager.repository) == "true"
+    assert set(git("remote", cwd=manager.repository).split()) == {"github", "fork", "lp"}
+    assert (manager.sync_worktree / "README").read_text() == "MAAS\n"
+    assert not (manager.mirror_dir / "maas.git.new").exists()
+
+
+def test_sync_merges_launchpad_master_into_github_and_fork(manager: WorkspaceManager, remotes: dict):
+    commit_file(remotes["lp"], "lp.txt", "from launchpad\n")
+
+    async def sync():
+        await manager.update_github_master()
+        await manager.update_fork_master()
+
+    asyncio.run(sync())
+
+    assert remote_file(remotes["github"], "master", "lp.txt") == "from launchpad"
+    assert remote_file(remotes["fork"], "master", "lp.txt") == "from launchpad"
+
+
+def test_concurrent_conversions_push_their_own_branch(manager: WorkspaceManager, remotes: dict, tmp_path: Path):
+    branches = [f"request-{i}" for i in range(4)]
+
+    async def convert(branch: str) -> None:
+        target_dir = str(manager.work_dir / branch)
+        await manager.create_worktree(branch, target_dir)
+        diff_file = tmp_path / f"{branch}.diff"
+        diff_file.write_text(
+            f"--- /dev/null\n+++ b/{branch}.txt\n@@ -0,0 +1 @@\n+{branch}\n")
+        await manager.commit_diff(target_dir, diff_file, branch)
+        await manager.push(branch, target_dir)
+        await manager.remove_worktree(branch, target_dir)
+
+    async def convert_all():
+        await manager.ensure_mirror()
+        await asyncio.gather(*(convert(branch) for branch in branches))
+
+    asyncio.run(convert_all())
+
+    for branch in branches:
+        assert remote_file(remotes["fork"], branch, f"{branch}.txt") == branch
+        assert not (manager.work_dir / branch).exists()
+    # Only the sync worktree is left
+    assert git("worktree", "list", "--porcelain", cwd=manager.repository).count("worktree ") == 2
+
+
+def test_file_lock_heartbeats_while_waiting(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(workspace, "HEARTBEAT_INTERVAL", 0.01)
+    lock = FileLock(tmp_path / "test.lock")
+    heartbeats = []
+
+    async def hold_and_wait():
+        async with lock.hold():
+            waiter = asyncio.create_task(_hold(lock, lambda: heartbeats.append(1)))
+            await asyncio.sleep(0.2)
+            assert not waiter.done()
+        await waiter
+
+    asyncio.run(hold_and_wait())
+
+    assert len(heartbeats) > 5
+
+
+async def _hold(lock: FileLock, heartbeat) -> None:
+    async with lock.hold(heartbeat):
+        pass